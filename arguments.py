@@ -38,7 +38,7 @@ def get_surroagte_args(args=None):
     parser = ArgumentParser()
 
     parser.add_argument('--surrogate', type=str, 
-        choices=['gp', 'nn', 'bnn'], default='gp', 
+        choices=['gp', 'sgp', 'rff', 'nn', 'bnn', 'ensemble'], default='gp', 
         help='type of the surrogate model')
 
     args, _ = parser.parse_known_args(args)
@@ -52,7 +52,7 @@ def get_acquisition_args(args=None):
     parser = ArgumentParser()
 
     parser.add_argument('--acquisition', type=str,  
-        choices=['identity', 'pi', 'ei', 'ucb', 'ts'], default='identity', 
+        choices=['identity', 'pi', 'ei', 'eips', 'ehvi', 'ehvips', 'qparego', 'ucb', 'ts'], default='identity', 
         help='type of the acquisition function')
 
     args, _ = parser.parse_known_args(args)
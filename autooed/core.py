@@ -10,7 +10,7 @@ from autooed.problem import build_problem
 from autooed.mobo import get_algorithm
 
 
-def _build_optimizer(config):
+def _build_optimizer(config, state=None):
     '''
     Build optimizer based on the problem and experiment configurations.
 
@@ -18,6 +18,8 @@ def _build_optimizer(config):
     ----------
     config: dict
         Experiment configuration dict.
+    state: dict
+        Optimizer state saved from previous iterations.
 
     Returns
     -------
@@ -29,6 +31,8 @@ def _build_optimizer(config):
     problem = build_problem(prob_cfg['name'])
     algo = get_algorithm(algo_cfg['name'])
     optimizer = algo(problem, algo_cfg)
+    if state is not None:
+        optimizer.set_state(state)
     
     return optimizer
 
@@ -57,7 +61,7 @@ def _set_random_seed(config):
     return config
 
 
-def optimize(config, X, Y, X_busy=None, random=True, batch_size=None):
+def optimize(config, X, Y, X_busy=None, random=True, batch_size=None, state=None, cost=None):
     '''
     Optimize on existing designs and performance to propose next designs to evaluate.
 
@@ -73,6 +77,10 @@ def optimize(config, X, Y, X_busy=None, random=True, batch_size=None):
         Designs under evaluation.
     random: bool
         Whether to set random seeds before optimization.
+    state: dict
+        Optimizer state saved from previous iterations, updated in place after optimization.
+    cost: np.array
+        Evaluation cost (wall time in seconds) of the given designs, nan if unknown.
 
     Returns
     -------
@@ -83,12 +91,16 @@ def optimize(config, X, Y, X_busy=None, random=True, batch_size=None):
         config = _set_random_seed(config)
 
     # build optimizer
-    optimizer = _build_optimizer(config)
+    optimizer = _build_optimizer(config, state)
 
     # solve for best X_next
     if batch_size is None:
         batch_size = config['experiment']['batch_size']
-    X_next = optimizer.optimize(X, Y, X_busy, batch_size)
+    X_next = optimizer.optimize(X, Y, X_busy, batch_size, cost)
+
+    # save optimizer state for next iterations
+    if state is not None:
+        state.update(optimizer.get_state())
 
     return X_next
 
@@ -124,7 +136,7 @@ def predict(config, X, Y, X_next):
     return Y_next_mean, Y_next_std
 
 
-def optimize_predict(config, X, Y, X_busy=None, random=True, batch_size=None):
+def optimize_predict(config, X, Y, X_busy=None, random=True, batch_size=None, state=None, cost=None):
     '''
     Optimize on existing designs and performance to propose next designs to evaluate along with the predicted performance.
 
@@ -140,6 +152,10 @@ def optimize_predict(config, X, Y, X_busy=None, random=True, batch_size=None):
         Designs under evaluation.
     random: bool
         Whether to set random seeds before optimization.
+    state: dict
+        Optimizer state saved from previous iterations, updated in place after optimization.
+    cost: np.array
+        Evaluation cost (wall time in seconds) of the given designs, nan if unknown.
 
     Returns
     -------
@@ -152,15 +168,19 @@ def optimize_predict(config, X, Y, X_busy=None, random=True, batch_size=None):
         config = _set_random_seed(config)
 
     # build optimizer
-    optimizer = _build_optimizer(config)
+    optimizer = _build_optimizer(config, state)
 
     # solve for best X_next
     if batch_size is None:
         batch_size = config['experiment']['batch_size']
-    X_next = optimizer.optimize(X, Y, X_busy, batch_size)
+    X_next = optimizer.optimize(X, Y, X_busy, batch_size, cost)
 
     # predict performance of X_next
     Y_next_mean, Y_next_std = optimizer.predict(X, Y, X_next)
+
+    # save optimizer state for next iterations
+    if state is not None:
+        state.update(optimizer.get_state())
     
     return X_next, (Y_next_mean, Y_next_std)
 
@@ -1,7 +1,10 @@
 from autooed.mobo.acquisition.ei import ExpectedImprovement
+from autooed.mobo.acquisition.ehvi import ExpectedHypervolumeImprovement
 from autooed.mobo.acquisition.identity import Identity
 from autooed.mobo.acquisition.pi import ProbabilityOfImprovement
+from autooed.mobo.acquisition.qparego import qParEGO
 from autooed.mobo.acquisition.ts import ThompsonSampling
 from autooed.mobo.acquisition.ucb import UpperConfidenceBound
 
+from autooed.mobo.acquisition.cost import ExpectedImprovementPerSecond, ExpectedHypervolumeImprovementPerSecond
 from autooed.mobo.acquisition.penalize import LocalPenalization, LocalLipschitzPenalization, HardLocalPenalization
@@ -4,6 +4,8 @@ Acquisition functions that define the objectives for surrogate multi-objective p
 
 from abc import ABC, abstractmethod
 
+from autooed.utils.cache import EvaluationCache
+
 
 class Acquisition(ABC):
     '''
@@ -21,6 +23,9 @@ class Acquisition(ABC):
         self.surrogate_model = surrogate_model
         self.transformation = surrogate_model.transformation
         self.normalization = surrogate_model.normalization
+        self.n_obj = surrogate_model.n_obj # number of acquisition objectives
+        self.batch_size = 1 # number of designs jointly evaluated by each input of acquisition function
+        self.cache = EvaluationCache(surrogate_model.cache.max_size, surrogate_model.cache.max_memory_mb)
         self.fitted = False
 
     def fit(self, X, Y, dtype='raw'):
@@ -42,6 +47,7 @@ class Acquisition(ABC):
             X = self.transformation.do(X)
 
         self._fit(X, Y)
+        self.cache.clear()
         self.fitted = True
 
     @abstractmethod
@@ -86,8 +92,66 @@ class Acquisition(ABC):
 
         if dtype == 'raw':
             X = self.transformation.do(X)
-        
-        return self._evaluate(X, gradient, hessian)
+
+        out = self.cache.evaluate(lambda X: dict(zip(['F', 'dF', 'hF'], self._evaluate(X, gradient, hessian))), X, gradient, hessian)
+        return out['F'], out['dF'], out['hF']
+
+    def fit_cost(self, X, C, dtype='raw'):
+        '''
+        Fit the model of evaluation cost from measured costs, supported by cost-aware acquisition functions.
+
+        Parameters
+        ----------
+        X: np.array
+            Input design variables.
+        C: np.array
+            Measured evaluation cost (e.g., wall time in seconds) of the design variables, nan if unknown.
+        '''
+        pass
+
+    def set_batch_size(self, batch_size):
+        '''
+        Set the number of designs jointly proposed by each input of the acquisition function, supported by joint batch acquisition functions,
+        where each input concatenates the design variables of the whole batch.
+
+        Parameters
+        ----------
+        batch_size: int
+            Batch size.
+        '''
+        pass
+
+    def sample_batch(self, batch_size):
+        '''
+        Draw an independent posterior sample for each slot of the batch, supported by sampling-based acquisition functions.
+
+        Parameters
+        ----------
+        batch_size: int
+            Batch size.
+
+        Returns
+        -------
+        samples: list
+            List of posterior samples of each batch slot, None if batch sampling is not supported or not enabled.
+        '''
+        return None
+
+    def with_sample(self, sample):
+        '''
+        Get the acquisition function of a batch slot given its posterior sample from sample_batch().
+
+        Parameters
+        ----------
+        sample: object
+            Posterior sample of the batch slot.
+
+        Returns
+        -------
+        acquisition: autooed.mobo.acquisition.base.Acquisition
+            Fitted acquisition function of the batch slot.
+        '''
+        raise NotImplementedError(f'{type(self).__name__} does not support batch sampling')
 
     @abstractmethod
     def _evaluate(self, X, gradient, hessian):
@@ -0,0 +1,166 @@
+'''
+Cost-aware acquisition functions that normalize the improvement by the predicted evaluation cost.
+'''
+
+import numpy as np
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import RBF, ConstantKernel, WhiteKernel
+
+from autooed.utils.operand import expand
+from autooed.mobo.acquisition.ei import ExpectedImprovement
+from autooed.mobo.acquisition.ehvi import ExpectedHypervolumeImprovement
+
+
+class LogCostModel:
+    '''
+    Cheap Gaussian process model of the logarithm of evaluation cost (e.g., wall time in seconds),
+    whose posterior mean is used as the predicted log cost along with its derivatives.
+    '''
+    def __init__(self, n_var):
+        '''
+        Initialize a log cost model.
+
+        Parameters
+        ----------
+        n_var: int
+            Number of design variables.
+        '''
+        kernel = ConstantKernel(constant_value=1.0, constant_value_bounds=(1e-3, 1e3)) * \
+            RBF(length_scale=np.ones(n_var), length_scale_bounds=(np.sqrt(1e-3), np.sqrt(1e3))) + \
+            WhiteKernel(noise_level=1e-2, noise_level_bounds=(1e-6, 1e1)) # measured cost is noisy
+        self.gp = GaussianProcessRegressor(kernel=kernel)
+        self.c_mean, self.c_std = 0., 1.
+        self.fitted = False # fitted with enough data, otherwise constant cost is predicted
+
+    def fit(self, X, C):
+        '''
+        Fit the log cost model.
+
+        Parameters
+        ----------
+        X: np.array
+            Input design variables (normalized, continuous).
+        C: np.array
+            Measured evaluation cost, nan if unknown, shape (N,).
+        '''
+        valid_idx = np.where(np.isfinite(C) & (C > 0))[0]
+        if len(valid_idx) < 2:
+            self.c_mean, self.c_std = 0., 1.
+            self.fitted = False
+            return
+
+        X, C = X[valid_idx], np.log(C[valid_idx])
+        self.c_mean, self.c_std = np.mean(C), np.std(C)
+        if self.c_std == 0: self.c_std = 1.
+        self.gp.fit(X, (C - self.c_mean) / self.c_std)
+        self.fitted = True
+
+    def evaluate(self, X, gradient=False, hessian=False):
+        '''
+        Predict the log cost.
+
+        Parameters
+        ----------
+        X: np.array
+            Input design variables (normalized, continuous).
+        gradient: bool
+            Whether to calculate the gradient of the prediction.
+        hessian: bool
+            Whether to calculate the hessian of the prediction.
+
+        Returns
+        -------
+        c: np.array
+            Predicted log cost, shape (N,).
+        dc: np.array
+            Gradient of c, shape (N, n_var).
+        hc: np.array
+            Hessian of c, shape (N, n_var, n_var).
+        '''
+        n_sample, n_var = X.shape
+        if not self.fitted:
+            c = np.full(n_sample, self.c_mean)
+            dc = np.zeros((n_sample, n_var)) if gradient else None
+            hc = np.zeros((n_sample, n_var, n_var)) if hessian else None
+            return c, dc, hc
+
+        # the white noise kernel does not contribute to the cross covariance
+        K = self.gp.kernel_.k1(X, self.gp.X_train_) # K: shape (N, N_train)
+        c = self.c_mean + self.c_std * K.dot(self.gp.alpha_)
+
+        dc, hc = None, None
+        if gradient or hessian:
+            ell = self.gp.kernel_.k1.k2.length_scale
+            u = (self.gp.X_train_[None, :, :] - X[:, None, :]) / ell ** 2 # u: shape (N, N_train, n_var)
+            Ka = K * self.gp.alpha_ # Ka: shape (N, N_train)
+
+        if gradient:
+            dc = self.c_std * np.einsum('ij,ijk->ik', Ka, u)
+
+        if hessian:
+            hc = self.c_std * (np.einsum('ij,ijk,ijl->ikl', Ka, u, u) - Ka.sum(axis=1)[:, None, None] * np.diag(1. / ell ** 2))
+
+        return c, dc, hc
+
+
+class CostAwareAcquisition:
+    '''
+    Base class of cost-aware acquisition function, dividing the (negative) acquisition value of the parent acquisition function
+    by the evaluation cost predicted from measured costs [1]. Inherit this class together with a parent acquisition function,
+    e.g., class AcquisitionPerSecond(CostAwareAcquisition, Acquisition).
+
+    [1] J. Snoek, H. Larochelle, R. Adams. Practical Bayesian Optimization of Machine Learning Algorithms. NeurIPS 2012.
+    '''
+    def __init__(self, surrogate_model, **kwargs):
+        super().__init__(surrogate_model, **kwargs)
+        self.cost_model = LogCostModel(surrogate_model.n_var)
+
+    def fit_cost(self, X, C, dtype='raw'):
+        assert dtype in ['raw', 'continuous', 'normalized'], f'Undefined data type {dtype} in acquisition fitting'
+
+        if dtype == 'raw':
+            X = self.transformation.do(X)
+
+        if dtype == 'raw' or dtype == 'continuous':
+            X = self.normalization.do(x=X)
+
+        self.cost_model.fit(X, C)
+        self.cache.clear()
+
+    def _evaluate(self, X, gradient, hessian):
+        F, dF, hF = super()._evaluate(X, gradient or hessian, hessian)
+        if not self.cost_model.fitted:
+            return F, dF if gradient else None, hF
+
+        # F' = F / exp(c), where c is the predicted log cost
+        c, dc, hc = self.cost_model.evaluate(self.normalization.do(x=X), gradient or hessian, hessian)
+        inv_cost = expand(np.exp(-c)) # inv_cost: shape (N, 1)
+        F_cost = F * inv_cost
+
+        dF_cost, hF_cost = None, None
+        if gradient or hessian:
+            # dF' = (dF - F * dc) / exp(c)
+            dc = expand(dc, 1) # dc: shape (N, 1, n_var)
+            dF_cost = (dF - expand(F) * dc) * expand(inv_cost)
+
+        if hessian:
+            # hF' = (hF - dF * dc^T - dc * dF^T - F * hc + F * dc * dc^T) / exp(c)
+            dF_dc = expand(dF) * expand(dc, 2) # dF_dc: shape (N, n_obj, n_var, n_var)
+            hF_cost = (hF - dF_dc - dF_dc.transpose(0, 1, 3, 2) + expand(F, (-1, -2)) * (expand(dc, 2) * expand(dc) - expand(hc, 1))) * expand(inv_cost, (-1, -2))
+
+        if not gradient: dF_cost = None
+        return F_cost, dF_cost, hF_cost
+
+
+class ExpectedImprovementPerSecond(CostAwareAcquisition, ExpectedImprovement):
+    '''
+    Expected Improvement per Second.
+    '''
+    pass
+
+
+class ExpectedHypervolumeImprovementPerSecond(CostAwareAcquisition, ExpectedHypervolumeImprovement):
+    '''
+    Expected Hypervolume Improvement per Second.
+    '''
+    pass
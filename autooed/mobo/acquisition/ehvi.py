@@ -0,0 +1,190 @@
+'''
+Expected Hypervolume Improvement acquisition function.
+'''
+
+import numpy as np
+from scipy.stats import norm
+
+from autooed.utils.pareto import find_pareto_front
+from autooed.mobo.acquisition.base import Acquisition
+
+
+def calc_nondominated_boxes(pfront, ref_point):
+    '''
+    Decompose the non-dominated region, i.e., the region dominating the reference point but not dominated by the Pareto front,
+    into disjoint boxes by recursively slicing along the last objective.
+
+    Parameters
+    ----------
+    pfront: np.array
+        Pareto front (minimization), shape (n_pareto, n_obj).
+    ref_point: np.array
+        Reference point, shape (n_obj,).
+
+    Returns
+    -------
+    lower: np.array
+        Lower bounds of the boxes (could be -inf), shape (n_box, n_obj).
+    upper: np.array
+        Upper bounds of the boxes, shape (n_box, n_obj).
+    '''
+    n_obj = len(ref_point)
+    pfront = pfront[(pfront < ref_point).all(axis=1)]
+
+    if len(pfront) == 0:
+        return np.full((1, n_obj), -np.inf), ref_point[None, :].copy()
+
+    if n_obj == 1:
+        return np.array([[-np.inf]]), np.array([[np.min(pfront)]])
+
+    # slice along the last objective, where the slice between two consecutive levels is only dominated by the points below it
+    levels = np.concatenate([[-np.inf], np.unique(pfront[:, -1]), [ref_point[-1]]])
+    lowers, uppers = [], []
+    for level_lower, level_upper in zip(levels[:-1], levels[1:]):
+        sub_pfront = find_pareto_front(pfront[pfront[:, -1] <= level_lower, :-1])
+        sub_lower, sub_upper = calc_nondominated_boxes(sub_pfront.reshape(-1, n_obj - 1), ref_point[:-1])
+        lowers.append(np.hstack([sub_lower, np.full((len(sub_lower), 1), level_lower)]))
+        uppers.append(np.hstack([sub_upper, np.full((len(sub_upper), 1), level_upper)]))
+    lower, upper = np.vstack(lowers), np.vstack(uppers)
+
+    nonempty = (lower < upper).all(axis=1)
+    return lower[nonempty], upper[nonempty]
+
+
+class ExpectedHypervolumeImprovement(Acquisition):
+    '''
+    Expected Hypervolume Improvement (EHVI), a scalar acquisition function computed exactly under independent Gaussian predictions
+    of objectives from a box decomposition of the non-dominated region [1]. Intended for problems with 2 or 3 objectives.
+
+    [1] K. Yang, M. Emmerich, A. Deutz, T. Bäck. Efficient Computation of Expected Hypervolume Improvement Using Box Decomposition Algorithms.
+        Journal of Global Optimization 2019.
+    '''
+    def __init__(self, surrogate_model, ref_offset=0.1, **kwargs):
+        '''
+        Initialize the Expected Hypervolume Improvement acquisition function.
+
+        Parameters
+        ----------
+        surrogate_model: autooed.mobo.surrogate_model.base.SurrogateModel
+            The surrogate model (with uncertainty prediction).
+        ref_offset: float
+            Offset of the reference point from the worst objective values, relative to the range of objective values.
+        '''
+        super().__init__(surrogate_model)
+        self.n_obj = 1 # scalar acquisition
+        self.ref_offset = ref_offset
+        self.pfront, self.ref_point = None, None
+        self.lower, self.upper = None, None
+
+    def _fit(self, X, Y):
+        pfront = np.unique(find_pareto_front(Y), axis=0)
+        Y_min, Y_max = np.min(Y, axis=0), np.max(Y, axis=0)
+        ref_point = Y_max + self.ref_offset * (Y_max - Y_min)
+
+        # rebuild the box decomposition only when the Pareto front or the reference point changes
+        if self.pfront is not None and np.array_equal(pfront, self.pfront) and np.array_equal(ref_point, self.ref_point):
+            return
+        self.pfront, self.ref_point = pfront, ref_point
+        self.lower, self.upper = calc_nondominated_boxes(pfront, ref_point)
+
+    def _evaluate(self, X, gradient, hessian):
+        val = self.surrogate_model.evaluate(X, dtype='continuous', std=True, gradient=gradient or hessian, hessian=hessian)
+
+        # evaluate in chunks of design variables within the memory budget of the surrogate model
+        n_param = 2 * self.surrogate_model.n_obj
+        sample_memory = 8 * len(self.lower) * n_param * (16 + (n_param if hessian else 0))
+        chunk_size = max(1, int(self.surrogate_model.max_memory_mb * 2 ** 20 // sample_memory))
+
+        E, dE, hE = [], [], []
+        for start in range(0, len(X), chunk_size):
+            end = start + chunk_size
+            E_chunk, dE_chunk, hE_chunk = self._calc_ehvi(val['F'][start:end], val['S'][start:end], gradient or hessian, hessian)
+            E.append(E_chunk), dE.append(dE_chunk), hE.append(hE_chunk)
+
+        F = -np.concatenate(E)[:, None]
+
+        dF, hF = None, None
+        if gradient or hessian:
+            dE = np.concatenate(dE)
+            dY = np.concatenate([val['dF'], val['dS']], axis=1) # dY: shape (N, 2 * n_obj, n_var)
+
+        if gradient:
+            dF = -np.einsum('na,nav->nv', dE, dY)[:, None, :]
+
+        if hessian:
+            hE = np.concatenate(hE)
+            hY = np.concatenate([val['hF'], val['hS']], axis=1) # hY: shape (N, 2 * n_obj, n_var, n_var)
+            hF = -(np.einsum('nab,nav,nbw->nvw', hE, dY, dY, optimize=True) + np.einsum('na,navw->nvw', dE, hY, optimize=True))[:, None, :, :]
+
+        return F, dF, hF
+
+    def _calc_ehvi(self, y_mean, y_std, gradient, hessian):
+        '''
+        Calculate EHVI and its derivatives with respect to the predicted mean and std of objectives.
+        EHVI = sum_k prod_j g_kj, where g_kj = G(u_kj) - G(l_kj) and G(a) = E[max(a - y_j, 0)] is the expected improvement over a.
+
+        Parameters
+        ----------
+        y_mean: np.array
+            Predicted mean of objectives, shape (N, n_obj).
+        y_std: np.array
+            Predicted std of objectives, shape (N, n_obj).
+        gradient: bool
+            Whether to calculate the gradient.
+        hessian: bool
+            Whether to calculate the hessian.
+
+        Returns
+        -------
+        E: np.array
+            EHVI, shape (N,).
+        dE: np.array
+            Gradient of EHVI with respect to (y_mean, y_std), shape (N, 2 * n_obj).
+        hE: np.array
+            Hessian of EHVI with respect to (y_mean, y_std), shape (N, 2 * n_obj, 2 * n_obj).
+        '''
+        n_obj = y_mean.shape[1]
+        y_mean, y_std = y_mean[:, None, :], np.maximum(y_std, 1e-10)[:, None, :]
+
+        # terms at the upper and lower bounds of boxes, shape (N, n_box, n_obj), where terms at -inf vanish
+        def calc_terms(bound):
+            z = (bound[None, :, :] - y_mean) / y_std
+            finite = np.isfinite(z)
+            z = np.where(finite, z, 0.)
+            cdf_z, pdf_z = np.where(finite, norm.cdf(z), 0.), np.where(finite, norm.pdf(z), 0.)
+            return z, cdf_z, pdf_z, y_std * (z * cdf_z + pdf_z)
+
+        z_u, cdf_u, pdf_u, G_u = calc_terms(self.upper)
+        z_l, cdf_l, pdf_l, G_l = calc_terms(self.lower)
+
+        g = np.maximum(G_u - G_l, 0.) # g: shape (N, n_box, n_obj)
+        E = np.prod(g, axis=-1).sum(axis=-1)
+
+        dE, hE = None, None
+        if not (gradient or hessian):
+            return E, dE, hE
+
+        # derivatives of g with respect to mean and std, where dG/dmean = -cdf(z), dG/dstd = pdf(z)
+        dg = np.stack([-(cdf_u - cdf_l), pdf_u - pdf_l]) # dg: shape (2, N, n_box, n_obj)
+
+        # product of g over the other objectives, shape (N, n_box, n_obj)
+        g_others = np.stack([np.prod(np.delete(g, j, axis=-1), axis=-1) for j in range(n_obj)], axis=-1)
+        dE = np.einsum('pnkj,nkj->npj', dg, g_others).reshape(len(E), 2 * n_obj) # ordered as (mean of all objectives, std of all objectives)
+
+        if hessian:
+            # second derivatives of g, where d2G/dmean2 = pdf(z) / std, d2G/dstd2 = z^2 * pdf(z) / std, d2G/dmean/dstd = z * pdf(z) / std
+            hg = np.empty((2, 2) + g.shape)
+            hg[0, 0] = (pdf_u - pdf_l) / y_std
+            hg[1, 1] = (z_u ** 2 * pdf_u - z_l ** 2 * pdf_l) / y_std
+            hg[0, 1] = hg[1, 0] = (z_u * pdf_u - z_l * pdf_l) / y_std
+
+            hE = np.zeros((len(E), 2, n_obj, 2, n_obj))
+            for i in range(n_obj):
+                hE[:, :, i, :, i] = np.einsum('pqnk,nk->npq', hg[:, :, :, :, i], g_others[:, :, i])
+                for j in range(i + 1, n_obj):
+                    g_others_ij = np.prod(np.delete(g, [i, j], axis=-1), axis=-1) # g_others_ij: shape (N, n_box)
+                    hE[:, :, i, :, j] = np.einsum('pnk,qnk,nk->npq', dg[:, :, :, i], dg[:, :, :, j], g_others_ij)
+                    hE[:, :, j, :, i] = hE[:, :, i, :, j].transpose(0, 2, 1)
+            hE = hE.reshape(len(E), 2 * n_obj, 2 * n_obj)
+
+        return E, dE, hE
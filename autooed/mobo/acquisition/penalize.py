@@ -1,6 +1,6 @@
 import numpy as np
 from scipy.stats import norm
-from scipy.optimize import minimize
+from scipy.special import expit
 
 from autooed.utils.sampling import lhs
 from autooed.utils.operand import safe_divide
@@ -42,6 +42,14 @@ class PenalizedAcquisition(Acquisition):
     def fitted(self):
         return self.base_acq.fitted
 
+    @property
+    def n_obj(self):
+        return self.base_acq.n_obj
+
+    @property
+    def batch_size(self):
+        return self.base_acq.batch_size
+
     def evaluate(self, X, dtype='raw', gradient=False, hessian=False):
         '''
         Evaluate the acquisition values of the design variables.
@@ -75,56 +83,265 @@ class PenalizedAcquisition(Acquisition):
         return self._evaluate(X, gradient, hessian)
 
 
-def distance(X, X0):
+def hammer_function(X, X0, R, S, gradient=False, hessian=False):
+    '''
+    Define the exclusion zones, as the log penalty h = sum_j log Phi((||x - x0_j|| - R_j) / S_j),
+    where x and x0 are normalized, in accordance with the Lipschitz constants and the derivatives of acquisition functions.
+
+    Returns
+    -------
+    h: np.array
+        Log penalty, shape (N, n_obj).
+    dh: np.array
+        Gradient of h, shape (N, n_obj, n_var).
+    hh: np.array
+        Hessian of h, shape (N, n_obj, n_var, n_var).
+    '''
     X, X0 = np.atleast_2d(X), np.atleast_2d(X0)
-    return np.sqrt(np.square(X[:, None, :] - X0[None, :, :]).sum(axis=-1))
+    diff = X[:, None, :] - X0[None, :, :]
+    dist = np.sqrt(np.square(diff).sum(axis=-1)) # dist: shape (N, n_busy)
+    z = safe_divide(dist[:, :, None] - R, S) # z: shape (N, n_busy, n_obj)
+    h = norm.logcdf(z).sum(1)
+
+    dh, hh = None, None
+    if not (gradient or hessian):
+        return h, dh, hh
+
+    # d log Phi(z) / dz = phi(z) / Phi(z), and its derivative -phi(z) / Phi(z) * (z + phi(z) / Phi(z))
+    ratio = np.exp(norm.logpdf(z) - norm.logcdf(z))
+    e = safe_divide(diff, dist[:, :, None]) # gradient of distance, shape (N, n_busy, n_var)
+    dh_dist = safe_divide(ratio, S)
+    dh = np.einsum('nbo,nbv->nov', dh_dist, e)
+
+    if hessian:
+        # hessian of distance: (I - e @ e.T) / dist
+        hh_dist = safe_divide(-ratio * (z + ratio), S ** 2)
+        dh_dist_dist = safe_divide(dh_dist, dist[:, :, None])
+        hh = np.einsum('nbo,nbv,nbw->novw', hh_dist - dh_dist_dist, e, e) + \
+            dh_dist_dist.sum(1)[:, :, None, None] * np.eye(X.shape[1])
 
+    return h, dh, hh
 
-def hammer_function(X, X0, R, S):
+
+def hard_hammer_function(X, X0, R, S, gradient=False, hessian=False):
     '''
-    Define the exclusion zones
+    Define the hard exclusion zones, as the penalty g = (1 + w)^(-1/5) where w = prod_j (|R_j + S_j| * ||x - x0_j||)^5,
+    i.e., the -5 norm of (1 / prod_j ((R_j + S_j) * ||x - x0_j||), 1), where x and x0 are normalized.
+
+    Returns
+    -------
+    g: np.array
+        Penalty, shape (N, n_obj).
+    dg: np.array
+        Gradient of g, shape (N, n_obj, n_var).
+    hg: np.array
+        Hessian of g, shape (N, n_obj, n_var, n_var).
     '''
-    return norm.logcdf(safe_divide(distance(X, X0)[:, :, None] - R, S)).sum(1)
+    X, X0 = np.atleast_2d(X), np.atleast_2d(X0)
+    diff = X[:, None, :] - X0[None, :, :]
+    dist = np.sqrt(np.square(diff).sum(axis=-1)) # dist: shape (N, n_busy)
+    with np.errstate(divide='ignore'):
+        log_w = 5 * np.log(np.abs(R + S)[None, :, :] * dist[:, :, None]).sum(1) # log_w: shape (N, n_obj)
+    g = np.exp(-0.2 * np.logaddexp(log_w, 0))
 
+    dg, hg = None, None
+    if not (gradient or hessian):
+        return g, dg, hg
 
-def calc_dF_norm(X, surrogate_model):
-    val = surrogate_model.evaluate(X, dtype='continuous', std=False, gradient=True, hessian=False)
-    return -np.linalg.norm(val['dF'], axis=-1)
+    # dg = -g * rho * a, where rho = w / (1 + w) and a = sum_j (x - x0_j) / ||x - x0_j||^2 is the gradient of log(w) / 5
+    rho = expit(log_w)
+    inv_dist2 = safe_divide(1, dist ** 2)
+    a = np.einsum('nb,nbv->nv', inv_dist2, diff)
+    g_rho = g * rho
+    dg = -g_rho[:, :, None] * a[:, None, :]
 
+    if hessian:
+        # gradient of a: sum_j (I - 2 * e_j @ e_j.T) / ||x - x0_j||^2
+        e = safe_divide(diff, dist[:, :, None])
+        da = inv_dist2.sum(1)[:, None, None] * np.eye(X.shape[1]) - 2 * np.einsum('nb,nbv,nbw->nvw', inv_dist2, e, e)
+        hg = -g_rho[:, :, None, None] * ((5 - 6 * rho)[:, :, None, None] * (a[:, :, None] * a[:, None, :])[:, None] + da[:, None])
 
-def calc_dF_norm_per_obj(x, surrogate_model, i):
-    x = np.atleast_2d(x)
-    assert x.shape[0] == 1
-    return calc_dF_norm(x, surrogate_model).flatten()[i]
+    return g, dg, hg
 
 
-def estimate_lipschitz_constant(surrogate_model, n_sample=500):
+def penalize(F, dF, hF, P, dP, hP, gradient, hessian):
+    '''
+    Penalize the acquisition values by -softplus(-F) * P, where softplus(-F) maps the acquisition values (to be minimized) to positive values.
+
+    Parameters
+    ----------
+    F, dF, hF: np.array
+        Acquisition values and their gradients and hessians.
+    P, dP, hP: np.array
+        Penalty values and their gradients and hessians.
+    gradient: bool
+        Whether to calculate the gradient of the penalized acquisition.
+    hessian: bool
+        Whether to calculate the hessian of the penalized acquisition.
+
+    Returns
+    -------
+    F, dF, hF: np.array
+        Penalized acquisition values and their gradients and hessians.
+    '''
+    U = softplus(-F)
+    F_pen, dF_pen, hF_pen = -U * P, None, None
+
+    if gradient or hessian:
+        sig = expit(-F)
+        dU = -sig[:, :, None] * dF
+
+    if gradient:
+        dF_pen = -(dU * P[:, :, None] + U[:, :, None] * dP)
+
+    if hessian:
+        hU = (sig * (1 - sig))[:, :, None, None] * dF[:, :, :, None] * dF[:, :, None, :] - sig[:, :, None, None] * hF
+        hF_pen = -(hU * P[:, :, None, None] + dU[:, :, :, None] * dP[:, :, None, :] + dP[:, :, :, None] * dU[:, :, None, :] + \
+            U[:, :, None, None] * hP)
+
+    return F_pen, dF_pen, hF_pen
+
+
+def calc_dF_norm(X, surrogate_model, gradient=False, obj_indices=None):
+    '''
+    Calculate the negative norm of the gradient of all objectives predicted by a surrogate model, and optionally its gradient.
+
+    Parameters
+    ----------
+    X: np.array
+        Input design variables (normalized), shape (N, n_var).
+    surrogate_model: autooed.mobo.surrogate_model.base.SurrogateModel
+        The surrogate model.
+    gradient: bool
+        Whether to calculate the gradient of the negative norm.
+    obj_indices: np.array
+        Index of the only objective needed for each design variable, shape (N,), None if all objectives are needed.
+        Design variables are grouped by objective, such that each objective is evaluated only on its own design variables.
+
+    Returns
+    -------
+    dF_norm: np.array
+        Negative gradient norm, shape (N, n_obj), or shape (N,) if obj_indices is given.
+    d_dF_norm: np.array
+        Gradient of dF_norm, shape (N, n_obj, n_var), or shape (N, n_var) if obj_indices is given.
+    '''
+    if obj_indices is None:
+        val = surrogate_model.evaluate(X, dtype='normalized', std=False, gradient=True, hessian=gradient)
+        dF, hF = val['dF'], val['hF']
+    else:
+        dF = np.empty_like(X)
+        hF = np.empty((*X.shape, X.shape[1])) if gradient else None
+        for i in np.unique(obj_indices):
+            rows = obj_indices == i
+            val = surrogate_model.evaluate_objective(X[rows], i, dtype='normalized', gradient=True, hessian=gradient)
+            dF[rows] = val['dF']
+            if gradient: hF[rows] = val['hF']
+
+    dF_norm = -np.linalg.norm(dF, axis=-1)
+    if not gradient:
+        return dF_norm
+
+    # d||dF||/dx = hF @ dF / ||dF||
+    d_dF_norm = np.einsum('...vw,...w->...v', hF, safe_divide(dF, dF_norm[..., None]), optimize=True)
+    return dF_norm, d_dF_norm
+
+
+def maximize_dF_norm(surrogate_model, X0, obj_indices, bounds, n_iter=200, tol=1e-6):
+    '''
+    Maximize the gradient norm of the surrogate objectives from multiple starting points together by projected BFGS, where
+    each subproblem keeps its own inverse hessian approximation and line search, and each iteration is a single batched surrogate evaluation.
+
+    Parameters
+    ----------
+    surrogate_model: autooed.mobo.surrogate_model.base.SurrogateModel
+        The surrogate model.
+    X0: np.array
+        Starting points (normalized), shape (N, n_var).
+    obj_indices: np.array
+        Index of the objective to maximize from each starting point, shape (N,).
+    bounds: np.array
+        Lower and upper bounds of each starting point, shape (N, n_var, 2).
+    n_iter: int
+        Maximum number of iterations.
+    tol: float
+        Tolerance of the projected gradient and the step size for termination.
+
+    Returns
+    -------
+    dF_norm: np.array
+        Maximized gradient norm of each subproblem, shape (N,).
+    '''
+    n, n_var = X0.shape
+    lower_bounds, upper_bounds = bounds[:, :, 0], bounds[:, :, 1]
+
+    def func(active):
+        # minimize the negative gradient norm of the active subproblems
+        return calc_dF_norm(X_new[active], surrogate_model, gradient=True, obj_indices=obj_indices[active])
+
+    X, X_new = X0.copy(), X0.copy()
+    active = np.ones(n, dtype=bool)
+    F, G = func(active)
+    H = np.tile(np.eye(n_var), (n, 1, 1)) * (0.1 * np.mean(upper_bounds - lower_bounds, axis=1) / np.maximum(np.linalg.norm(G, axis=1), tol))[:, None, None]
+    t = np.ones(n)
+
+    for _ in range(n_iter):
+        # projected search direction, where variables at the bounds with gradients pointing outwards are fixed
+        free = ~(((X <= lower_bounds) & (G > 0)) | ((X >= upper_bounds) & (G < 0)))
+        D = -np.einsum('nvw,nw->nv', H, G * free) * free
+        descent = np.sum(D * G, axis=1) < 0
+        D[~descent] = -(G * free)[~descent]
+
+        active &= (np.linalg.norm(G * free, axis=1) > tol) & (t > tol)
+        if not np.any(active): break
+
+        X_new[active] = np.clip(X[active] + t[active, None] * D[active], lower_bounds[active], upper_bounds[active])
+        F_new, G_new = func(active)
+
+        # Armijo condition, otherwise backtrack
+        S = X_new[active] - X[active]
+        accepted = F_new <= F[active] + 1e-4 * np.sum(G[active] * S, axis=1)
+        t[active] = np.where(accepted, 1.0, 0.5 * t[active])
+
+        # BFGS update of inverse hessian approximations of the accepted subproblems
+        Y = G_new - G[active]
+        SY = np.sum(S * Y, axis=1)
+        idx = np.where(active)[0][accepted]
+        for i, s, y, sy in zip(idx, S[accepted], Y[accepted], SY[accepted]):
+            if sy > 1e-10:
+                V = np.eye(n_var) - np.outer(s, y) / sy
+                H[i] = V @ H[i] @ V.T + np.outer(s, s) / sy
+        X[idx], F[idx], G[idx] = X_new[idx], F_new[accepted], G_new[accepted]
+
+    return -F
+
+
+def estimate_lipschitz_constant(surrogate_model, n_sample=500, n_start=5):
     '''
     Estimate Lipschitz constant from a surrogate model
     
     Returns
     -------
-    L: float
+    L: np.array ~ (n_obj,)
     '''
     n_var, n_obj = surrogate_model.n_var, surrogate_model.n_obj
 
-    # find a good x0
+    # find good starting points of each objective
     X_sample = lhs(n_var, n_sample)
-    dF_norm_sample = calc_dF_norm(X_sample, surrogate_model)
+    dF_norm_sample = calc_dF_norm(X_sample, surrogate_model) # shape (n_sample, n_obj)
+    start_indices = np.argsort(dF_norm_sample, axis=0)[:n_start].T # shape (n_obj, n_start)
+    n_start = start_indices.shape[1]
 
-    # optimize for L for each objective
-    bounds = np.vstack([np.zeros(n_var), np.ones(n_var)]).T
-    L = np.zeros(n_obj)
-    for i in range(n_obj):
-        x0 = X_sample[np.argmin(dF_norm_sample[:, i])]
-        res = minimize(calc_dF_norm_per_obj, x0, method='L-BFGS-B', bounds=bounds, args=(surrogate_model, i))
-        L[i] = -float(res.fun)
-        if L[i] < 1e-7: L[i] = 10.0
+    # optimize for L of all objectives and starting points together
+    X0 = X_sample[start_indices.flatten()]
+    obj_indices = np.repeat(np.arange(n_obj), n_start)
+    bounds = np.tile(np.stack([np.zeros(n_var), np.ones(n_var)], axis=-1), (len(X0), 1, 1))
+    L = maximize_dF_norm(surrogate_model, X0, obj_indices, bounds).reshape(n_obj, n_start).max(axis=1)
+    L[L < 1e-7] = 10.0
 
     return L
 
 
-def estimate_local_lipschitz_constant(surrogate_model, X_busy, n_sample=500):
+def estimate_local_lipschitz_constant(surrogate_model, X_busy, n_sample=500, n_start=5):
     '''
     Estimate local Lipschitz constant from a surrogate model
     
@@ -134,22 +351,27 @@ def estimate_local_lipschitz_constant(surrogate_model, X_busy, n_sample=500):
     '''
     assert isinstance(surrogate_model, GaussianProcess)
     n_var, n_obj = surrogate_model.n_var, surrogate_model.n_obj
+    X_busy = surrogate_model.normalization.do(x=X_busy)
     n_busy = len(X_busy)
 
-    L = np.zeros((n_busy, n_obj))
-    for i in range(n_obj):
-        length_scale = surrogate_model.gps[i].kernel_.get_params()['k1__k2__length_scale']
-        lower_bounds = np.maximum(X_busy - 0.5 * length_scale, 0.0)
-        upper_bounds = np.minimum(X_busy + 0.5 * length_scale, 1.0)
-        
-        for j in range(n_busy):
-            bounds = np.vstack([lower_bounds[j], upper_bounds[j]]).T
-            X_sample = lower_bounds[j] + lhs(n_var, n_sample) * (upper_bounds[j] - lower_bounds[j])
-            dF_i_norm_sample = calc_dF_norm(X_sample, surrogate_model)[:, i]
-            x0 = X_sample[np.argmin(dF_i_norm_sample)]
-            res = minimize(calc_dF_norm_per_obj, x0, method='L-BFGS-B', bounds=bounds, args=(surrogate_model, i))
-            L[j][i] = -float(res.fun)
-            if L[j][i] < 1e-7: L[j][i] = 10.0
+    # local regions around busy points, shape (n_obj, n_busy, n_var)
+    length_scales = np.array([gp.kernel_.get_params()['k1__k2__length_scale'] * np.ones(n_var) for gp in surrogate_model.gps])
+    lower_bounds = np.maximum(X_busy[None, :, :] - 0.5 * length_scales[:, None, :], 0.0)
+    upper_bounds = np.minimum(X_busy[None, :, :] + 0.5 * length_scales[:, None, :], 1.0)
+
+    # find good starting points of each objective and busy point, with all samples evaluated together
+    X_sample = lower_bounds[:, :, None, :] + lhs(n_var, n_sample)[None, None, :, :] * (upper_bounds - lower_bounds)[:, :, None, :]
+    sample_obj_indices = np.repeat(np.arange(n_obj), n_busy * n_sample)
+    dF_norm_sample = calc_dF_norm(X_sample.reshape(-1, n_var), surrogate_model, obj_indices=sample_obj_indices).reshape(n_obj, n_busy, n_sample)
+    start_indices = np.argsort(dF_norm_sample, axis=-1)[:, :, :n_start] # shape (n_obj, n_busy, n_start)
+    n_start = start_indices.shape[-1]
+
+    # optimize for L of all objectives, busy points and starting points together
+    X0 = np.take_along_axis(X_sample, start_indices[:, :, :, None], axis=2).reshape(-1, n_var)
+    obj_indices = np.repeat(np.arange(n_obj), n_busy * n_start)
+    bounds = np.repeat(np.stack([lower_bounds, upper_bounds], axis=-1), n_start, axis=1).reshape(-1, n_var, 2)
+    L = maximize_dF_norm(surrogate_model, X0, obj_indices, bounds).reshape(n_obj, n_busy, n_start).max(axis=-1).T
+    L[L < 1e-7] = 10.0
 
     return L
 
@@ -175,16 +397,16 @@ class LocalPenalization(PenalizedAcquisition):
         space. This way gradients can be computed additively and are more
         stable.
         '''
-        F, dF, hF = self.base_acq.evaluate(X, dtype='continuous', gradient=gradient, hessian=hessian)
-
-        # F = np.log1p(np.exp(-F)) # softplus transform
-        F = softplus(-F)
-        F = -np.exp(np.log(F) + hammer_function(X, self.X_busy, self.R, self.S))
+        F, dF, hF = self.base_acq.evaluate(X, dtype='continuous', gradient=gradient or hessian, hessian=hessian)
+        X_norm, X_busy_norm = self.base_acq.normalization.do(x=X), self.base_acq.normalization.do(x=self.X_busy)
+        h, dh, hh = hammer_function(X_norm, X_busy_norm, self.R, self.S, gradient=gradient or hessian, hessian=hessian)
 
-        if gradient or hessian:
-            raise Exception('Gradient or hessian computation is not implemented yet in Local Penalization.')
+        # penalty exp(h) and its derivatives
+        P = np.exp(h)
+        dP = P[:, :, None] * dh if gradient or hessian else None
+        hP = P[:, :, None, None] * (dh[:, :, :, None] * dh[:, :, None, :] + hh) if hessian else None
 
-        return F, None, None
+        return penalize(F, dF, hF, P, dP, hP, gradient, hessian)
 
 
 class LocalLipschitzPenalization(LocalPenalization):
@@ -209,19 +431,7 @@ class HardLocalPenalization(PenalizedAcquisition):
         self.S = Y_busy_std / L
 
     def _evaluate(self, X, gradient, hessian):
-        F, dF, hF = self.base_acq.evaluate(X, dtype='continuous', gradient=gradient, hessian=hessian)
-
-        F = np.log1p(np.exp(-F)) # softplus transform
-
-        h_vals = 1 / ((self.R + self.S)[None, :, :] * distance(X, self.X_busy)[:, :, None]).prod(axis=1).T
-        clipped_h_vals = []
-        for i in range(h_vals.shape[0]):
-            clipped_h_vals.append(np.linalg.norm(np.vstack([h_vals[None, i], np.ones_like(h_vals[None, i])]), -5, axis=0))
-        clipped_h_vals = np.vstack(clipped_h_vals).T
-        
-        F *= -clipped_h_vals
-
-        if gradient or hessian:
-            raise Exception('Gradient or hessian computation is not implemented yet in Hard Local Penalization.')
-
-        return F, None, None
+        F, dF, hF = self.base_acq.evaluate(X, dtype='continuous', gradient=gradient or hessian, hessian=hessian)
+        X_norm, X_busy_norm = self.base_acq.normalization.do(x=X), self.base_acq.normalization.do(x=self.X_busy)
+        P, dP, hP = hard_hammer_function(X_norm, X_busy_norm, self.R, self.S, gradient=gradient or hessian, hessian=hessian)
+        return penalize(F, dF, hF, P, dP, hP, gradient, hessian)
@@ -48,17 +48,20 @@ class ProbabilityOfImprovement(Acquisition):
             dpdf_z_z = -z * pdf_z
             dpdf_z_y_mean = dpdf_z_z * dz_y_mean
             dpdf_z_y_std = dpdf_z_z * dz_y_std
-            hz_y_std = safe_divide(self.y_min - y_mean, y_std ** 3)
+            hz_y_std = 2 * safe_divide(self.y_min - y_mean, y_std ** 3)
+            hz_y_mean_y_std = safe_divide(1, y_std ** 2)
 
             hF_y_mean = -dpdf_z_y_mean * dz_y_mean
             hF_y_std = -dpdf_z_y_std * dz_y_std - pdf_z * hz_y_std
+            hF_y_mean_y_std = -dpdf_z_y_std * dz_y_mean - pdf_z * hz_y_mean_y_std
 
             dy_mean, dy_std = expand(dy_mean), expand(dy_std)
             dy_mean_T, dy_std_T = dy_mean.transpose(0, 1, 3, 2), dy_std.transpose(0, 1, 3, 2)
             dF_y_mean, dF_y_std = expand(dF_y_mean), expand(dF_y_std)
-            hF_y_mean, hF_y_std = expand(hF_y_mean, (-1, -2)), expand(hF_y_std, (-1, -2))
+            hF_y_mean, hF_y_std, hF_y_mean_y_std = expand(hF_y_mean, (-1, -2)), expand(hF_y_std, (-1, -2)), expand(hF_y_mean_y_std, (-1, -2))
 
             hF = dF_y_mean * hy_mean + dF_y_std * hy_std + \
-                hF_y_mean * dy_mean * dy_mean_T + hF_y_std * dy_std * dy_std_T
+                hF_y_mean * dy_mean * dy_mean_T + hF_y_std * dy_std * dy_std_T + \
+                hF_y_mean_y_std * (dy_mean * dy_std_T + dy_std * dy_mean_T)
 
         return F, dF, hF
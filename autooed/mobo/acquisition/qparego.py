@@ -0,0 +1,190 @@
+'''
+Monte-Carlo q-batch ParEGO acquisition function.
+'''
+
+import numpy as np
+import torch
+from scipy.stats import norm
+
+from autooed.mobo.acquisition.base import Acquisition
+from autooed.mobo.surrogate_model import GaussianProcess
+
+
+def batch_cholesky(C, jitter=1e-8, max_tries=4):
+    '''
+    Cholesky decomposition of a stack of covariance matrices in one batched call, where increasing jitter (relative to the mean variance)
+    is added to the diagonal until all matrices are numerically positive definite.
+
+    Parameters
+    ----------
+    C: np.array or torch.Tensor
+        Covariance matrices, shape (..., q, q).
+    jitter: float
+        Initial relative jitter added to the diagonal.
+    max_tries: int
+        Maximum number of tries with 10x larger jitter each time.
+
+    Returns
+    -------
+    L: np.array or torch.Tensor
+        Lower Cholesky factors, shape (..., q, q).
+    '''
+    if isinstance(C, torch.Tensor):
+        return _batch_cholesky_torch(C, jitter, max_tries)
+
+    q = C.shape[-1]
+    scale = np.maximum(np.trace(C, axis1=-2, axis2=-1) / q, 1e-12)[..., None, None]
+    eye = np.eye(q)
+    for i in range(max_tries):
+        try:
+            return np.linalg.cholesky(C + jitter * 10 ** i * scale * eye)
+        except np.linalg.LinAlgError:
+            continue
+
+    # project onto positive definite matrices by clipping eigenvalues as the last resort
+    w, v = np.linalg.eigh(C)
+    w = np.maximum(w, jitter * 10 ** max_tries * scale[..., 0])
+    return np.linalg.cholesky((v * w[..., None, :]) @ np.swapaxes(v, -1, -2))
+
+
+def _batch_cholesky_torch(C, jitter, max_tries):
+    '''
+    Differentiable version of batch_cholesky() on torch tensors.
+    '''
+    q = C.shape[-1]
+    scale = torch.clamp(torch.diagonal(C, dim1=-2, dim2=-1).mean(-1), min=1e-12)[..., None, None].detach()
+    eye = torch.eye(q, dtype=C.dtype)
+    for i in range(max_tries):
+        L, info = torch.linalg.cholesky_ex(C + jitter * 10 ** i * scale * eye)
+        if not torch.any(info > 0):
+            return L
+
+    w, v = torch.linalg.eigh(C)
+    w = torch.maximum(w, jitter * 10 ** max_tries * scale[..., 0])
+    return torch.linalg.cholesky((v * w[..., None, :]) @ v.transpose(-1, -2))
+
+
+class qParEGO(Acquisition):
+    '''
+    Monte-Carlo q-batch ParEGO (qParEGO), the joint expected improvement of a batch of q designs on a random augmented Chebyshev scalarization
+    of normalized objectives [1]. The expectation is estimated over the joint posterior of the Gaussian process with quasi-random base samples
+    fixed during each iteration, such that the acquisition value of a batch is deterministic and differentiable [2].
+    Derivatives are computed by torch autograd through the joint posterior and its Cholesky decomposition.
+
+    [1] S. Daulton, M. Balandat, E. Bakshy. Differentiable Expected Hypervolume Improvement for Parallel Multi-Objective Bayesian Optimization. NeurIPS 2020.
+    [2] M. Balandat, B. Karrer, D. Jiang, S. Daulton, B. Letham, A. Wilson, E. Bakshy. BoTorch: A Framework for Efficient Monte-Carlo Bayesian Optimization. NeurIPS 2020.
+    '''
+    def __init__(self, surrogate_model, n_mc_sample=128, rho=0.05, **kwargs):
+        '''
+        Initialize the qParEGO acquisition function.
+
+        Parameters
+        ----------
+        surrogate_model: autooed.mobo.surrogate_model.gp.GaussianProcess
+            The Gaussian process surrogate model.
+        n_mc_sample: int
+            Number of quasi-random Monte-Carlo samples of the joint posterior.
+        rho: float
+            Coefficient of the augmented term of the Chebyshev scalarization.
+        '''
+        super().__init__(surrogate_model)
+        assert isinstance(surrogate_model, GaussianProcess), 'qParEGO requires Gaussian Process as the surrogate model'
+        self.n_obj = 1 # scalar acquisition
+        self.n_mc_sample = n_mc_sample
+        self.rho = rho
+        self.weights, self.y_min, self.y_range, self.s_min = None, None, None, None
+        self.base_samples = None
+
+    def set_batch_size(self, batch_size):
+        if batch_size == self.batch_size: return
+        self.batch_size = batch_size
+        self.base_samples = None
+        self.cache.clear()
+
+    def _scalarize(self, Y):
+        '''
+        Augmented Chebyshev scalarization of objectives normalized by the range of observed objectives, shape (..., n_obj) -> (...).
+        '''
+        Y = (Y - self.y_min) / self.y_range * self.weights
+        return np.max(Y, axis=-1) + self.rho * np.sum(Y, axis=-1)
+
+    def _fit(self, X, Y):
+        # draw random weights of the scalarization for this iteration
+        self.weights = np.random.dirichlet(np.ones(Y.shape[1]))
+        self.y_min = np.min(Y, axis=0)
+        self.y_range = np.maximum(np.max(Y, axis=0) - self.y_min, 1e-10)
+        self.s_min = np.min(self._scalarize(Y))
+
+        # redraw base samples once per iteration
+        self.base_samples = None
+
+    def _get_base_samples(self):
+        '''
+        Get the quasi-random standard normal base samples fixed within the iteration, shape (n_mc_sample, n_obj, q).
+        '''
+        n_obj, q = self.surrogate_model.n_obj, self.batch_size
+        if self.base_samples is None:
+            sobol = torch.quasirandom.SobolEngine(n_obj * q, scramble=True, seed=np.random.randint(2 ** 31))
+            U = sobol.draw(self.n_mc_sample, dtype=torch.float64).numpy()
+            U = np.clip(U, 1e-10, 1 - 1e-10)
+            self.base_samples = norm.ppf(U).reshape(self.n_mc_sample, n_obj, q)
+        return self.base_samples
+
+    def _evaluate(self, X, gradient, hessian):
+        if gradient or hessian:
+            return self._evaluate_derivatives(X, gradient, hessian)
+
+        n_batch, q = len(X), self.batch_size
+        y_mean, y_cov = self.surrogate_model.evaluate_joint(X.reshape(n_batch, q, -1), dtype='continuous')
+
+        # y_mean: shape (N, q, n_obj), L: shape (N, n_obj, q, q), Z: shape (n_mc_sample, n_obj, q)
+        L = batch_cholesky(y_cov)
+        Z = self._get_base_samples()
+        Y_samples = y_mean[:, None] + np.einsum('nmqr,smr->nsqm', L, Z, optimize=True) # Y_samples: shape (N, n_mc_sample, q, n_obj)
+
+        # improvement of the best design in the batch, averaged over samples
+        S = self._scalarize(Y_samples) # S: shape (N, n_mc_sample, q)
+        improvement = np.maximum(self.s_min - np.min(S, axis=-1), 0).mean(axis=1)
+
+        F = -improvement[:, None]
+        return F, None, None
+
+    def _evaluate_derivatives(self, X, gradient, hessian):
+        '''
+        Evaluate the acquisition values and their derivatives (w.r.t. the normalized design variables) by differentiating
+        the same computation as _evaluate() through the joint posterior and the batched Cholesky decomposition with torch autograd.
+        '''
+        n_batch, q = len(X), self.batch_size
+        normalization = self.normalization
+        X_norm = normalization.do(x=X.reshape(n_batch * q, -1)).reshape(n_batch, -1)
+        X_norm = torch.tensor(X_norm, dtype=torch.float64, requires_grad=True)
+
+        # joint posterior in the original scale of objectives
+        y_mean, y_cov = self.surrogate_model._evaluate_joint_torch(X_norm.reshape(n_batch, q, -1))
+        y_loc, y_scale = torch.from_numpy(normalization.y_scaler.mean_), torch.from_numpy(normalization.y_scaler.scale_)
+        y_mean = y_mean * y_scale + y_loc
+        y_cov = y_cov * (y_scale ** 2)[:, None, None]
+
+        L = batch_cholesky(y_cov)
+        Z = torch.from_numpy(self._get_base_samples())
+        Y_samples = y_mean[:, None] + torch.einsum('nmqr,smr->nsqm', L, Z) # Y_samples: shape (N, n_mc_sample, q, n_obj)
+
+        Y_samples = (Y_samples - torch.from_numpy(self.y_min)) / torch.from_numpy(self.y_range) * torch.from_numpy(self.weights)
+        S = Y_samples.amax(dim=-1) + self.rho * Y_samples.sum(dim=-1) # S: shape (N, n_mc_sample, q)
+        improvement = torch.clamp(self.s_min - S.amin(dim=-1), min=0).mean(dim=1)
+
+        # each acquisition value only depends on its own input, such that derivatives of the sum give all gradients
+        F = -improvement
+        dF, = torch.autograd.grad(F.sum(), X_norm, create_graph=hessian)
+
+        hF = None
+        if hessian:
+            n_var = X_norm.shape[1]
+            hF = np.zeros((n_batch, 1, n_var, n_var))
+            for j in range(n_var):
+                if not dF.requires_grad: break # piecewise linear in the inputs, e.g., no improvement
+                hF[:, 0, j] = torch.autograd.grad(dF[:, j].sum(), X_norm, retain_graph=True)[0].numpy()
+
+        F = F.detach().numpy()[:, None]
+        dF = dF.detach().numpy()[:, None] if gradient else None
+        return F, dF, hF
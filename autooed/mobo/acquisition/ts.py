@@ -3,11 +3,13 @@ Thompson Sampling acquisition function.
 '''
 
 import numpy as np
-from numpy import linalg as LA
+from copy import copy
+from scipy.linalg import cholesky, cho_solve, solve_triangular
 from scipy.stats.distributions import chi2
 from scipy.stats import norm
 
 from autooed.utils.sampling import lhs
+from autooed.utils.cache import EvaluationCache
 from autooed.mobo.acquisition.base import Acquisition
 from autooed.mobo.surrogate_model import GaussianProcess
 
@@ -16,72 +18,120 @@ class ThompsonSampling(Acquisition):
     '''
     Thompson Sampling.
     '''
-    def __init__(self, surrogate_model, n_spectral_pts=100, mean_sample=False, **kwargs):
+    def __init__(self, surrogate_model, n_spectral_pts=100, mean_sample=False, batch_sample=False, **kwargs):
+        '''
+        Initialize the Thompson Sampling acquisition function.
+
+        Parameters
+        ----------
+        surrogate_model: autooed.mobo.surrogate_model.gp.GaussianProcess
+            The Gaussian process surrogate model.
+        n_spectral_pts: int
+            Number of spectral points (random Fourier features).
+        mean_sample: bool
+            Whether to use the posterior mean instead of a random posterior sample.
+        batch_sample: bool
+            Whether to draw an independent posterior sample for each slot of the batch.
+        '''
         super().__init__(surrogate_model)
         assert isinstance(surrogate_model, GaussianProcess), 'Thompson Sampling requires Gaussian Process as the surroagte model'
         self.M = n_spectral_pts
-        self.thetas, self.Ws, self.bs, self.sf2s = None, None, None, None
+        self.thetas, self.Ws, self.bs, self.sf2s, self.factors = None, None, None, None, None
+        self.theta_means, self.Ls, self.sn2s = None, None, None
+        assert not (mean_sample and batch_sample), 'mean_sample and batch_sample cannot be both enabled, as all batch slots would share the posterior mean'
         self.mean_sample = mean_sample
+        self.batch_sample = batch_sample
 
     def _fit(self, X, Y):
         X, Y = self.normalization.do(x=X, y=Y)
-
-        self.thetas, self.Ws, self.bs, self.sf2s = [], [], [], []
-        n_sample = X.shape[0]
         gps, n_var, nu = self.surrogate_model.gps, self.surrogate_model.n_var, self.surrogate_model.nu
 
-        for i, gp in enumerate(gps):
-            gp.fit(X, Y[:, i])
-
-            ell = np.exp(gp.kernel_.theta[1:-1])
-            sf2 = np.exp(2 * gp.kernel_.theta[0])
-            sn2 = np.exp(2 * gp.kernel_.theta[-1])
+        # reuse the kernel hyperparameters of the fitted surrogate model
+        thetas = np.array([gp.kernel_.theta for gp in gps]) # thetas: shape (n_obj, n_theta)
+        ells = np.exp(thetas[:, 1:-1]) # ells: shape (n_obj, n_var)
+        self.sf2s = np.exp(thetas[:, 0]) # sf2s: shape (n_obj,)
+        c2s = np.exp(thetas[:, -1]) # c2s: shape (n_obj,)
+        self.sn2s = np.full(len(gps), 1e-6) # small noise for numerical stability, as the kernel is noise-free
 
+        # sample spectral points of the kernels
+        Ws, bs = [], []
+        for ell in ells:
             sw1, sw2 = lhs(n_var, self.M), lhs(n_var, self.M)
             if nu > 0:
                 W = np.tile(1. / ell, (self.M, 1)) * norm.ppf(sw1) * np.sqrt(nu / chi2.ppf(sw2, df=nu))
             else:
-                W = np.random.uniform(size=(self.M, n_var)) * np.tile(1. / ell, (self.M, 1))
-            b = 2 * np.pi * lhs(1, self.M)
-            phi = np.sqrt(2. * sf2 / self.M) * np.cos(W @ X.T + np.tile(b, (1, n_sample)))
-            A = phi @ phi.T + sn2 * np.eye(self.M)
-            invcholA = LA.inv(LA.cholesky(A))
-            invA = invcholA.T @ invcholA
-            mu_theta = invA @ phi @ Y[:, i]
-            if self.mean_sample:
-                theta = mu_theta
-            else:
-                cov_theta = sn2 * invA
-                cov_theta = 0.5 * (cov_theta + cov_theta.T)
-                theta = mu_theta + LA.cholesky(cov_theta) @ np.random.standard_normal(self.M)
+                W = np.tile(1. / ell, (self.M, 1)) * norm.ppf(sw1)
+            Ws.append(W)
+            bs.append(2 * np.pi * lhs(1, self.M)[:, 0])
+
+        # kernel sf2 * k(x, x') + c2 is approximated by M random cosine features and a constant feature,
+        # where the constant feature has zero spectral point and zero phase
+        self.Ws = np.concatenate([np.array(Ws), np.zeros((len(gps), 1, n_var))], axis=1) # Ws: shape (n_obj, M + 1, n_var)
+        self.bs = np.concatenate([np.array(bs), np.zeros((len(gps), 1))], axis=1) # bs: shape (n_obj, M + 1)
+        self.factors = np.concatenate([np.tile(np.sqrt(2. * self.sf2s / self.M)[:, None], (1, self.M)), np.sqrt(c2s)[:, None]], axis=1) # factors: shape (n_obj, M + 1)
+
+        # random Fourier features of all objectives, phi: shape (n_obj, M + 1, N)
+        phi = self.factors[:, :, None] * np.cos(self.Ws @ X.T + self.bs[:, :, None])
+
+        # posterior of feature weights: mean A^-1 @ phi @ y, covariance sn2 * A^-1, where A = phi @ phi.T + sn2 * I
+        A = phi @ phi.transpose(0, 2, 1) + self.sn2s[:, None, None] * np.eye(self.M + 1)
+        self.Ls = np.array([cholesky(A_i, lower=True) for A_i in A]) # Ls: shape (n_obj, M + 1, M + 1)
+        self.theta_means = np.array([cho_solve((L, True), phi_i @ y) for L, phi_i, y in zip(self.Ls, phi, Y.T)]) # theta_means: shape (n_obj, M + 1)
 
-            self.thetas.append(theta.copy())
-            self.Ws.append(W.copy())
-            self.bs.append(b.copy())
-            self.sf2s.append(sf2)
+        self.thetas = self._sample(1)[0] # thetas: shape (n_obj, M + 1)
+
+    def _sample(self, n_sample):
+        '''
+        Draw posterior samples of the feature weights of all objectives in a vectorized pass.
+
+        Parameters
+        ----------
+        n_sample: int
+            Number of posterior samples.
+
+        Returns
+        -------
+        thetas: np.array
+            Posterior samples of feature weights, shape (n_sample, n_obj, M + 1).
+        '''
+        thetas = np.tile(self.theta_means, (n_sample, 1, 1))
+        if self.mean_sample:
+            return thetas
+
+        # covariance sn2 * A^-1 = (sqrt(sn2) * L^-T) @ (sqrt(sn2) * L^-T).T
+        Z = np.random.standard_normal((len(self.theta_means), self.M + 1, n_sample))
+        for i, (L, sn2) in enumerate(zip(self.Ls, self.sn2s)):
+            thetas[:, i] += np.sqrt(sn2) * solve_triangular(L.T, Z[i], lower=False).T
+        return thetas
+
+    def sample_batch(self, batch_size):
+        if not self.batch_sample: return None
+        return list(self._sample(batch_size)) # lightweight feature weights of shape (n_obj, M + 1) for each slot
+
+    def with_sample(self, sample):
+        acquisition = copy(self) # share the spectral points and the posterior
+        acquisition.thetas = sample
+        acquisition.cache = EvaluationCache(self.cache.max_size, self.cache.max_memory_mb)
+        return acquisition
 
     def _evaluate(self, X, gradient=False, hessian=False):
         X = self.normalization.do(x=X)
 
-        F, dF, hF = [], [], []
-        n_sample = X.shape[0] if len(X.shape) > 1 else 1
+        W_X_b = self.Ws @ X.T + self.bs[:, :, None] # W_X_b: shape (n_obj, M + 1, N)
+        theta_cos = self.factors[:, :, None] * self.thetas[:, :, None] * np.cos(W_X_b) # theta_cos: shape (n_obj, M + 1, N)
 
-        for theta, W, b, sf2 in zip(self.thetas, self.Ws, self.bs, self.sf2s):
-            factor = np.sqrt(2. * sf2 / self.M)
-            W_X_b = W @ X.T + np.tile(b, (1, n_sample))
-            F.append(factor * (theta @ np.cos(W_X_b)))
+        F = theta_cos.sum(axis=1).T # F: shape (N, n_obj)
 
-            if gradient:
-                dF.append(-factor * np.expand_dims(theta, 0) * np.sin(W_X_b).T @ W)
-            
-            if hessian:
-                hF.append(-factor * np.einsum('ij,jk->ikj', np.expand_dims(theta, 0) * np.cos(W_X_b).T, W) @ W)
-            
-        F = np.stack(F, axis=1)
-        dF = np.stack(dF, axis=1) if gradient else None
-        hF = np.stack(hF, axis=1) if hessian else None
+        dF, hF = None, None
+        if gradient:
+            theta_sin = self.factors[:, :, None] * self.thetas[:, :, None] * np.sin(W_X_b)
+            dF = -np.einsum('omn,omv->nov', theta_sin, self.Ws, optimize=True) # dF: shape (N, n_obj, n_var)
+        
+        if hessian:
+            hF = -np.einsum('omn,omv,omw->novw', theta_cos, self.Ws, self.Ws, optimize=True) # hF: shape (N, n_obj, n_var, n_var)
 
         F = self.normalization.undo(y=F)
         if gradient: dF = self.normalization.rescale(y=dF.transpose(0, 2, 1)).transpose(0, 2, 1)
+        if hessian: hF = self.normalization.rescale(y=hF.transpose(0, 2, 3, 1)).transpose(0, 3, 1, 2)
         
         return F, dF, hF
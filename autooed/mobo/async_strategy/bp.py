@@ -19,20 +19,21 @@ class BelieverPenalizer(AsyncStrategy):
         self.surrogate_model.fit(X, Y)
 
         # determine KB and LP indices
-        _, Y_busy_std = self.surrogate_model.predict(X_busy, std=True)
+        Y_busy, Y_busy_std = self.surrogate_model.predict(X_busy, std=True)
         Y_busy_std = self.surrogate_model.normalization.scale(y=Y_busy_std)
         KB_prob = np.maximum(1 - self.factor * Y_busy_std, 0.0)
         KB_idx = (np.random.uniform(size=Y_busy.shape) < KB_prob).all(axis=1)
         LP_idx = ~KB_idx
 
+        # condition surrogate models on believed data
+        if np.sum(KB_idx) > 0:
+            self.surrogate_model.fit_fantasy(X_busy[KB_idx], Y_busy[KB_idx])
+
         # aggregate believed data, redefine busy data
         X = np.vstack([X, X_busy[KB_idx]])
         Y = np.vstack([Y, Y_busy[KB_idx]])
         X_busy = X_busy[LP_idx] if np.sum(LP_idx) > 0 else None
 
-        # fit surrogate models based on believed data
-        self.surrogate_model.fit(X, Y)
-
         # fit penalized acquisition functions
         acquisition = init_async_acquisition(self.penalize_acq, self.acquisition)
         acquisition.fit(X, Y, X_busy)
@@ -1,6 +1,8 @@
 '''
 '''
 
+import numpy as np
+
 from autooed.mobo.async_strategy.base import AsyncStrategy
 
 
@@ -10,14 +12,14 @@ class KrigingBeliever(AsyncStrategy):
         # fit surrogate models based on true data
         self.surrogate_model.fit(X, Y)
 
-        # aggregate believed data
+        # condition surrogate models on believed data
         Y_busy = self.surrogate_model.predict(X_busy)
+        self.surrogate_model.fit_fantasy(X_busy, Y_busy)
+
+        # aggregate believed data
         X = np.vstack([X, X_busy])
         Y = np.vstack([Y, Y_busy])
 
-        # fit surrogate models based on believed data
-        self.surrogate_model.fit(X, Y)
-
         # fit acquisition functions
         self.acquisition.fit(X, Y)
 
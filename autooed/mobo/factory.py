@@ -12,8 +12,11 @@ def get_surrogate_model(name):
 
     surrogate_model_map = {
         'gp': GaussianProcess,
+        'sgp': SparseGaussianProcess,
+        'rff': RandomFourierFeature,
         'nn': NeuralNetwork,
         'bnn': BayesianNeuralNetwork,
+        'ensemble': DeepEnsemble,
     }
 
     if name in surrogate_model_map:
@@ -26,8 +29,12 @@ def get_acquisition(name):
 
     acquisition_map = {
         'ei': ExpectedImprovement,
+        'eips': ExpectedImprovementPerSecond,
+        'ehvi': ExpectedHypervolumeImprovement,
+        'ehvips': ExpectedHypervolumeImprovementPerSecond,
         'identity': Identity,
         'pi': ProbabilityOfImprovement,
+        'qparego': qParEGO,
         'ts': ThompsonSampling,
         'ucb': UpperConfidenceBound,
     }
@@ -9,6 +9,37 @@ surrogate_hyperparams = {
     'gp': {
         '__name__': 'Gaussian Process',
         'nu': dict(dtype=int, default=1, choices=[1, 3, 5, -1]),
+        'refit_interval': dict(dtype=int, default=1, constr=lambda x: x > 0),
+        'refit_tol': dict(dtype=float, default=0.1, constr=lambda x: x >= 0),
+        'n_restarts': dict(dtype=int, default=0, constr=lambda x: x >= 0),
+        'n_process': dict(dtype=int, default=cpu_count(), constr=lambda x: x > 0),
+        'max_memory_mb': dict(dtype=int, default=1024, constr=lambda x: x > 0),
+        'cache_size': dict(dtype=int, default=10000, constr=lambda x: x >= 0),
+        'cache_memory_mb': dict(dtype=int, default=64, constr=lambda x: x > 0),
+    },
+    'sgp': {
+        '__name__': 'Sparse Gaussian Process',
+        'nu': dict(dtype=int, default=1, choices=[1, 3, 5, -1]),
+        'n_inducing': dict(dtype=int, default=300, constr=lambda x: x > 0),
+        'noise': dict(dtype=float, default=1e-6, constr=lambda x: x > 0),
+        'n_restarts': dict(dtype=int, default=0, constr=lambda x: x >= 0),
+        'n_process': dict(dtype=int, default=cpu_count(), constr=lambda x: x > 0),
+        'max_memory_mb': dict(dtype=int, default=1024, constr=lambda x: x > 0),
+        'cache_size': dict(dtype=int, default=10000, constr=lambda x: x >= 0),
+        'cache_memory_mb': dict(dtype=int, default=64, constr=lambda x: x > 0),
+    },
+    'rff': {
+        '__name__': 'Random Fourier Features',
+        'nu': dict(dtype=int, default=1, choices=[1, 3, 5, -1]),
+        'n_feature': dict(dtype=int, default=500, constr=lambda x: x > 0),
+        'n_subsample': dict(dtype=int, default=500, constr=lambda x: x > 0),
+        'refit_interval': dict(dtype=int, default=1, constr=lambda x: x > 0),
+        'refit_tol': dict(dtype=float, default=0.1, constr=lambda x: x >= 0),
+        'n_restarts': dict(dtype=int, default=0, constr=lambda x: x >= 0),
+        'n_process': dict(dtype=int, default=cpu_count(), constr=lambda x: x > 0),
+        'max_memory_mb': dict(dtype=int, default=1024, constr=lambda x: x > 0),
+        'cache_size': dict(dtype=int, default=10000, constr=lambda x: x >= 0),
+        'cache_memory_mb': dict(dtype=int, default=64, constr=lambda x: x > 0),
     },
     'nn': {
         '__name__': 'Neural Network',
@@ -18,6 +49,14 @@ surrogate_hyperparams = {
         'lr': dict(dtype=float, default=1e-3, constr=lambda x: x > 0),
         'weight_decay': dict(dtype=float, default=1e-4, constr=lambda x: x > 0),
         'n_epoch': dict(dtype=int, default=100, constr=lambda x: x > 0),
+        'multi_head': dict(dtype=bool, default=False),
+        'batch_size': dict(dtype=int, default=256, constr=lambda x: x > 0),
+        'val_ratio': dict(dtype=float, default=0.0, constr=lambda x: x >= 0 and x < 1),
+        'patience': dict(dtype=int, default=10, constr=lambda x: x > 0),
+        'n_process': dict(dtype=int, default=cpu_count(), constr=lambda x: x > 0),
+        'max_memory_mb': dict(dtype=int, default=1024, constr=lambda x: x > 0),
+        'cache_size': dict(dtype=int, default=10000, constr=lambda x: x >= 0),
+        'cache_memory_mb': dict(dtype=int, default=64, constr=lambda x: x > 0),
     },
     'bnn': {
         '__name__': 'Bayesian Neural Network',
@@ -27,6 +66,31 @@ surrogate_hyperparams = {
         'lr': dict(dtype=float, default=1e-3, constr=lambda x: x > 0),
         'weight_decay': dict(dtype=float, default=1e-4, constr=lambda x: x > 0),
         'n_epoch': dict(dtype=int, default=100, constr=lambda x: x > 0),
+        'multi_head': dict(dtype=bool, default=False),
+        'batch_size': dict(dtype=int, default=256, constr=lambda x: x > 0),
+        'val_ratio': dict(dtype=float, default=0.0, constr=lambda x: x >= 0 and x < 1),
+        'patience': dict(dtype=int, default=10, constr=lambda x: x > 0),
+        'n_process': dict(dtype=int, default=cpu_count(), constr=lambda x: x > 0),
+        'max_memory_mb': dict(dtype=int, default=1024, constr=lambda x: x > 0),
+        'cache_size': dict(dtype=int, default=10000, constr=lambda x: x >= 0),
+        'cache_memory_mb': dict(dtype=int, default=64, constr=lambda x: x > 0),
+    },
+    'ensemble': {
+        '__name__': 'Deep Ensemble',
+        'n_member': dict(dtype=int, default=5, constr=lambda x: x > 1),
+        'hidden_size': dict(dtype=int, default=50, constr=lambda x: x > 0),
+        'hidden_layers': dict(dtype=int, default=3, constr=lambda x: x > 0),
+        'activation': dict(dtype=str, default='tanh', choices=['relu', 'tanh']),
+        'lr': dict(dtype=float, default=1e-3, constr=lambda x: x > 0),
+        'weight_decay': dict(dtype=float, default=1e-4, constr=lambda x: x > 0),
+        'n_epoch': dict(dtype=int, default=100, constr=lambda x: x > 0),
+        'batch_size': dict(dtype=int, default=256, constr=lambda x: x > 0),
+        'val_ratio': dict(dtype=float, default=0.0, constr=lambda x: x >= 0 and x < 1),
+        'patience': dict(dtype=int, default=10, constr=lambda x: x > 0),
+        'n_process': dict(dtype=int, default=cpu_count(), constr=lambda x: x > 0),
+        'max_memory_mb': dict(dtype=int, default=1024, constr=lambda x: x > 0),
+        'cache_size': dict(dtype=int, default=10000, constr=lambda x: x >= 0),
+        'cache_memory_mb': dict(dtype=int, default=64, constr=lambda x: x > 0),
     },
 }
 
@@ -35,16 +99,33 @@ acquisition_hyperparams = {
     'ei': {
         '__name__': 'Expected Improvement',
     },
+    'eips': {
+        '__name__': 'Expected Improvement per Second',
+    },
+    'ehvi': {
+        '__name__': 'Expected Hypervolume Improvement',
+        'ref_offset': dict(dtype=float, default=0.1, constr=lambda x: x >= 0),
+    },
+    'ehvips': {
+        '__name__': 'Expected Hypervolume Improvement per Second',
+        'ref_offset': dict(dtype=float, default=0.1, constr=lambda x: x >= 0),
+    },
     'identity': {
         '__name__': 'Identity',
     },
     'pi': {
         '__name__': 'Probability of Improvement',
     },
+    'qparego': {
+        '__name__': 'q-Batch ParEGO',
+        'n_mc_sample': dict(dtype=int, default=128, constr=lambda x: x > 0),
+        'rho': dict(dtype=float, default=0.05, constr=lambda x: x >= 0),
+    },
     'ts': {
         '__name__': 'Thompson Sampling',
         'n_spectral_pts': dict(dtype=int, default=100, constr=lambda x: x > 0),
         'mean_sample': dict(dtype=bool, default=False),
+        'batch_sample': dict(dtype=bool, default=False),
     },
     'ucb': {
         '__name__': 'Upper Confidence Bound',
@@ -66,6 +147,7 @@ solver_hyperparams = {
     },
     'parego': {
         '__name__': 'ParEGO',
+        'vectorized': dict(dtype=bool, default=True),
         'n_process': dict(dtype=int, default=cpu_count(), constr=lambda x: x > 0),
     },
     'discovery': {
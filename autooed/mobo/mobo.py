@@ -3,10 +3,22 @@ Main algorithm framework for Multi-Objective Bayesian Optimization.
 '''
 
 import numpy as np
+from multiprocess import cpu_count
 
 from autooed.mobo.factory import init_surrogate_model, init_acquisition, init_solver, init_selection
 from autooed.mobo.async_strategy.factory import init_async_strategy
 from autooed.utils.pareto import convert_minimization
+from autooed.utils.parallel import WorkerPool
+
+
+def solve_batch_slot(state, sample, seed):
+    '''
+    Solve the surrogate problem of a batch slot given its posterior sample, where the solver, data and acquisition function are shared.
+    '''
+    # NOTE: forked workers inherit the same numpy random state, so each slot is solved with its own seed drawn by the parent
+    np.random.seed(seed)
+    solver, X, Y, acquisition = state
+    return solver.solve(X, Y, 1, acquisition.with_sample(sample))
 
 
 class MOBO:
@@ -40,6 +52,8 @@ class MOBO:
         self.n_var, self.n_obj = problem.n_var, problem.n_obj
         self.obj_type = problem.obj_type
         self.bounds = np.array([problem.xl, problem.xu])
+        self.n_process = module_cfg.get('n_process', cpu_count())
+        self.pool = WorkerPool(self.n_process) # persistent across iterations for solving batch slots, the fitted acquisition function is shared once per iteration
 
         # data transformation between all domains and continuous
         self.transformation = self.problem.transformation # TODO: clean?
@@ -67,7 +81,7 @@ class MOBO:
         else:
             self.async_strategy = None
 
-    def optimize(self, X, Y, X_busy, batch_size):
+    def optimize(self, X, Y, X_busy, batch_size, cost=None):
         '''
         Optimize for the next batch of samples given the initial data.
 
@@ -81,6 +95,8 @@ class MOBO:
             Design variables currently being evaluated.
         batch_size: int
             Batch size.
+        cost: np.array
+            Evaluation cost (wall time in seconds) of the initial design variables, nan if unknown, used by cost-aware acquisition functions.
 
         Returns
         -------
@@ -91,11 +107,11 @@ class MOBO:
         Y = convert_minimization(Y, self.obj_type)
 
         if self.async_strategy is None or X_busy is None:
-            return self._optimize(X, Y, batch_size)
+            return self._optimize(X, Y, batch_size, cost)
         else:
-            return self._optimize_async(X, Y, X_busy, batch_size)
+            return self._optimize_async(X, Y, X_busy, batch_size, cost)
 
-    def _optimize(self, X, Y, batch_size):
+    def _optimize(self, X, Y, batch_size, cost=None):
         '''
         Synchronous optimization.
         '''
@@ -104,6 +120,17 @@ class MOBO:
 
         # fit acquisition functions
         self.acquisition.fit(X, Y)
+        self.acquisition.set_batch_size(batch_size)
+        if cost is not None:
+            self.acquisition.fit_cost(X, cost)
+
+        samples = self.acquisition.sample_batch(batch_size)
+        if samples is not None:
+            # solve surrogate problems of all batch slots in parallel, where only the posterior sample is sent per slot, then select one design from each
+            self.pool.set_state((self.solver, X, Y, self.acquisition))
+            seeds = np.random.randint(2 ** 31, size=batch_size)
+            results = self.pool.map(solve_batch_slot, [(sample, seed) for sample, seed in zip(samples, seeds)])
+            return np.vstack([self.selection.select(X_candidate, Y_candidate, X, Y, 1) for X_candidate, Y_candidate in results])
 
         # solve surrogate problem
         X_candidate, Y_candidate = self.solver.solve(X, Y, batch_size, self.acquisition)
@@ -113,13 +140,21 @@ class MOBO:
 
         return X_next
 
-    def _optimize_async(self, X, Y, X_busy, batch_size):
+    def _optimize_async(self, X, Y, X_busy, batch_size, cost=None):
         '''
         Asynchronous optimization.
         '''
+        # asynchronous strategies propose designs one by one, where joint batch acquisition degenerates to a single design
+        self.acquisition.set_batch_size(1)
+
         # fit surrogate models and acquisition functions based on the asynchronous strategy
+        X_eval = X
         X, Y, acquisition = self.async_strategy.fit(X, Y, X_busy)
 
+        # fit the cost model on evaluated data only
+        if cost is not None:
+            self.acquisition.fit_cost(X_eval, cost)
+
         # solve surrogate problem
         X_candidate, Y_candidate = self.solver.solve(X, Y, batch_size, acquisition)
 
@@ -163,6 +198,31 @@ class MOBO:
 
         return Y_next_mean, Y_next_std
 
+    def get_state(self):
+        '''
+        Get the internal state of the algorithm that needs to persist across optimization iterations.
+
+        Returns
+        -------
+        state: dict
+            The internal state (picklable).
+        '''
+        return {
+            'surrogate': self.surrogate_model.get_state(),
+        }
+
+    def set_state(self, state):
+        '''
+        Restore the internal state of the algorithm from previous optimization iterations.
+
+        Parameters
+        ----------
+        state: dict
+            The internal state returned by get_state().
+        '''
+        if 'surrogate' in state:
+            self.surrogate_model.set_state(state['surrogate'])
+
     def __str__(self):
         return \
             '========== Algorithm Setup ==========\n' + \
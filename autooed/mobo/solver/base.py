@@ -44,7 +44,17 @@ class Solver(ABC):
         '''
         self.problem = SurrogateProblem(self.real_problem, acquisition)
         X = self.transformation.do(X)
-        X_candidate, Y_candidate = self._solve(X, Y, batch_size)
+
+        q = acquisition.batch_size
+        if q > 1:
+            # joint batch acquisition: solve for a single solution concatenating a batch of q designs,
+            # where the initial solutions are random batches of current designs
+            X = np.array([X[np.random.choice(len(X), q, replace=len(X) < q)].flatten() for _ in range(len(X))])
+            X_candidate, Y_candidate = self._solve(X, Y, 1)
+            X_candidate, Y_candidate = X_candidate.reshape(q, -1), np.repeat(Y_candidate, q, axis=0)
+        else:
+            X_candidate, Y_candidate = self._solve(X, Y, batch_size)
+
         X_candidate = self.transformation.undo(X_candidate)
         return X_candidate, Y_candidate
 
@@ -0,0 +1,163 @@
+'''
+Batched CMA-ES that runs independent single-objective optimizations in lockstep within one process.
+'''
+
+import numpy as np
+
+
+class BatchCMAES:
+    '''
+    (mu/mu_w, lambda)-CMA-ES [1] of a batch of independent runs, whose search distributions are updated in lockstep,
+    such that the populations of all active runs are evaluated together by a single call of the objective function per generation.
+    The search is performed in the unit hypercube of the variable bounds, where sampled points are mirrored into the bounds for evaluation
+    (i.e., a periodic boundary transformation), such that the search distribution is not distorted by the bounds.
+
+    [1] N. Hansen. The CMA Evolution Strategy: A Tutorial. arXiv:1604.00772, 2016.
+    '''
+    def __init__(self, sigma=0.5, pop_size=None, max_gen=1000, tol_fun=1e-6, tol_x=1e-8, n_last=20, nth_gen=5):
+        '''
+        Initialize a batched CMA-ES.
+
+        Parameters
+        ----------
+        sigma: float
+            Initial step size relative to the range of variable bounds.
+        pop_size: int
+            Population size of each run, 4 + int(3 * ln(n_var)) by default.
+        max_gen: int
+            Maximum number of generations of each run.
+        tol_fun: float
+            Tolerance of the improvement of the best objective value every nth_gen generations for terminating a run.
+        tol_x: float
+            Tolerance of the step size along all principal axes for terminating a run.
+        n_last: int
+            Number of last improvements (every nth_gen generations) that are all within the tolerance for terminating a run.
+        nth_gen: int
+            Number of generations between two checked best objective values.
+        '''
+        self.sigma = sigma
+        self.pop_size = pop_size
+        self.max_gen = max_gen
+        self.tol_fun = tol_fun
+        self.tol_x = tol_x
+        self.n_last = n_last
+        self.nth_gen = nth_gen
+
+    def minimize(self, func, X0, xl, xu):
+        '''
+        Minimize a batch of objective functions starting from their initial solutions.
+
+        Parameters
+        ----------
+        func: function
+            Batched objective function, taking the runs' indices, shape (N,), and design variables, shape (N, n_var),
+            and returning the objective values, shape (N,), and constraint violations, shape (N,), of each design under its run.
+        X0: np.array
+            Initial solutions of all runs, shape (n_run, n_var).
+        xl: np.array
+            Lower bounds of variables, shape (n_var,).
+        xu: np.array
+            Upper bounds of variables, shape (n_var,).
+
+        Returns
+        -------
+        X_opt: np.array
+            Best solutions found by all runs, shape (n_run, n_var).
+        F_opt: np.array
+            Objective values of the best solutions, shape (n_run,).
+        '''
+        n_run, n_var = X0.shape
+        x_range = np.maximum(xu - xl, 1e-12)
+
+        # strategy parameters
+        lam = self.pop_size if self.pop_size is not None else 4 + int(3 * np.log(n_var))
+        mu = lam // 2
+        w = np.log(mu + 0.5) - np.log(np.arange(1, mu + 1))
+        w /= w.sum()
+        mueff = 1. / np.sum(w ** 2)
+        cc = (4 + mueff / n_var) / (n_var + 4 + 2 * mueff / n_var)
+        cs = (mueff + 2) / (n_var + mueff + 5)
+        c1 = 2 / ((n_var + 1.3) ** 2 + mueff)
+        cmu = min(1 - c1, 2 * (mueff - 2 + 1 / mueff) / ((n_var + 2) ** 2 + mueff))
+        damps = 1 + 2 * max(0, np.sqrt((mueff - 1) / (n_var + 1)) - 1) + cs
+        chiN = np.sqrt(n_var) * (1 - 1 / (4 * n_var) + 1 / (21 * n_var ** 2))
+        eigen_interval = max(1, int(1 / (10 * n_var * (c1 + cmu)))) # number of generations between eigendecompositions of covariance matrices
+
+        # states of all runs in the unit hypercube
+        mean = np.clip((X0 - xl) / x_range, 0, 1) # mean: shape (n_run, n_var)
+        sigma = np.full(n_run, float(self.sigma))
+        C = np.tile(np.eye(n_var), (n_run, 1, 1)) # C: shape (n_run, n_var, n_var)
+        B, D = C.copy(), np.ones((n_run, n_var)) # eigendecomposition C = B @ diag(D ** 2) @ B.T
+        pc, ps = np.zeros((n_run, n_var)), np.zeros((n_run, n_var))
+        F_hist = [[] for _ in range(n_run)] # best objective values found until each past generation
+
+        # best solutions ranked by constraint violation first and then objective value
+        run_idx = np.arange(n_run)
+        F0, CV0 = func(run_idx, xl + mean * x_range)
+        U_opt, F_opt, CV_opt = mean.copy(), np.array(F0, dtype=float), np.array(CV0, dtype=float)
+
+        active = np.ones(n_run, dtype=bool)
+        for gen in range(self.max_gen):
+            idx = np.where(active)[0]
+            if len(idx) == 0: break
+            n_active = len(idx)
+
+            # sample populations of active runs
+            if gen % eigen_interval == 0:
+                D2, B[idx] = np.linalg.eigh(C[idx])
+                D[idx] = np.sqrt(np.maximum(D2, 1e-20))
+            B_act, D_act = B[idx], D[idx] # B_act: shape (n_active, n_var, n_var), D_act: shape (n_active, n_var)
+            Z = np.random.randn(n_active, lam, n_var)
+            Y = np.einsum('kij,kj,klj->kli', B_act, D_act, Z) # Y: shape (n_active, lam, n_var)
+            U = mean[idx, None, :] + sigma[idx, None, None] * Y # U: shape (n_active, lam, n_var)
+
+            # evaluate the union of populations of active runs at once, with samples mirrored into the bounds
+            U_eval = 1 - np.abs(np.mod(U, 2) - 1)
+            F, CV = func(np.repeat(idx, lam), xl + U_eval.reshape(-1, n_var) * x_range)
+            F, CV = np.asarray(F, dtype=float).reshape(n_active, lam), np.asarray(CV, dtype=float).reshape(n_active, lam)
+
+            # rank samples by constraint violation first and then objective value
+            order = np.lexsort((F, CV), axis=-1) # order: shape (n_active, lam)
+
+            # update best solutions
+            best = order[:, 0]
+            F_best, CV_best = F[np.arange(n_active), best], CV[np.arange(n_active), best]
+            improved = (CV_best < CV_opt[idx]) | ((CV_best == CV_opt[idx]) & (F_best < F_opt[idx]))
+            U_opt[idx[improved]] = U_eval[improved, best[improved]]
+            F_opt[idx[improved]], CV_opt[idx[improved]] = F_best[improved], CV_best[improved]
+            order = order[:, :mu]
+
+            # update means
+            Y_sel = np.take_along_axis(Y, order[:, :, None], axis=1) # Y_sel: shape (n_active, mu, n_var)
+            y_w = np.einsum('m,kmv->kv', w, Y_sel)
+            mean[idx] += sigma[idx, None] * y_w
+
+            # update evolution paths
+            C_inv_sqrt_y = np.einsum('kij,kj,klj,kl->ki', B_act, 1. / D_act, B_act, y_w)
+            ps[idx] = (1 - cs) * ps[idx] + np.sqrt(cs * (2 - cs) * mueff) * C_inv_sqrt_y
+            ps_norm = np.linalg.norm(ps[idx], axis=1)
+            hsig = ps_norm / np.sqrt(1 - (1 - cs) ** (2 * (gen + 1))) / chiN < 1.4 + 2 / (n_var + 1)
+            pc[idx] = (1 - cc) * pc[idx] + (hsig * np.sqrt(cc * (2 - cc) * mueff))[:, None] * y_w
+
+            # update covariance matrices
+            rank_one = np.einsum('ki,kj->kij', pc[idx], pc[idx]) + ((1 - hsig) * cc * (2 - cc))[:, None, None] * C[idx]
+            rank_mu = np.einsum('m,kmi,kmj->kij', w, Y_sel, Y_sel)
+            C_new = (1 - c1 - cmu) * C[idx] + c1 * rank_one + cmu * rank_mu
+            C[idx] = (C_new + C_new.transpose(0, 2, 1)) / 2
+
+            # update step sizes
+            sigma[idx] *= np.exp((cs / damps) * (ps_norm / chiN - 1))
+
+            # check termination of each run, where the tolerance of objective values follows the default single-objective termination of pymoo
+            n_window = self.n_last * self.nth_gen
+            for i in idx:
+                F_hist[i].append(F_opt[i])
+                if len(F_hist[i]) > n_window and np.max(-np.diff(F_hist[i][-n_window - 1::self.nth_gen])) <= self.tol_fun: # tolerance of objective values
+                    active[i] = False
+                elif np.all(sigma[i] * np.sqrt(np.diag(C[i])) < self.tol_x) and np.all(sigma[i] * np.abs(pc[i]) < self.tol_x): # tolerance of step sizes
+                    active[i] = False
+                elif not np.all(np.isfinite(C[i])) or D[i].max() > 1e7 * D[i].min(): # ill-conditioned covariance
+                    active[i] = False
+
+        X_opt = xl + U_opt * x_range
+        return X_opt, F_opt
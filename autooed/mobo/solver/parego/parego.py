@@ -5,21 +5,23 @@ ParEGO multi-objective solver.
 import numpy as np
 from pymoo.optimize import minimize
 from pymoo.algorithms.so_cmaes import CMAES
-from multiprocess import Process, Queue, cpu_count
+from multiprocess import cpu_count
 
 from autooed.utils.sampling import lhs
+from autooed.utils.parallel import WorkerPool
 from autooed.mobo.solver.base import Solver
 from autooed.mobo.solver.parego.evaluator import ScalarizedEvaluator
+from autooed.mobo.solver.parego.batch_cmaes import BatchCMAES
 from autooed.mobo.solver.parego.decomposition import augmented_tchebicheff, AugmentedTchebicheff
 
 
-def optimization(problem, x, weights, queue):
+def optimization(problem, x, weights, seed):
     '''
     Parallel worker for single-objective CMA-ES optimization.
     '''
     evaluator = ScalarizedEvaluator(decomposition=AugmentedTchebicheff(), weights=weights)
-    res = minimize(problem, CMAES(x), evaluator=evaluator)
-    queue.put([res.X[0], res.F[0]])
+    res = minimize(problem, CMAES(x), evaluator=evaluator, seed=seed)
+    return res.X[0], res.F[0]
 
 
 class ParEGO(Solver):
@@ -27,9 +29,11 @@ class ParEGO(Solver):
     Solver based on ParEGO.
     NOTE: only compatible with Direct selection.
     '''
-    def __init__(self, problem, n_process=cpu_count(), **kwargs):
+    def __init__(self, problem, vectorized=True, n_process=cpu_count(), **kwargs):
         super().__init__(problem)
+        self.vectorized = vectorized # optimize all scalarizations by batched CMA-ES in process, otherwise by CMA-ES in parallel processes
         self.n_process = n_process
+        self.pool = WorkerPool(n_process) # persistent across iterations, the surrogate problem is shared once per iteration
 
     def _solve(self, X, Y, batch_size):
         '''
@@ -42,25 +46,21 @@ class ParEGO(Solver):
         # initial solutions
         X = np.vstack([X, lhs(X.shape[1], batch_size)])
         F = self.problem.evaluate(X, return_values_of=['F'])
+        x0s = [X[np.argmin(augmented_tchebicheff(F, weights[i]))] for i in range(batch_size)]
 
-        # optimization
-        xs, ys = [], []
-        queue = Queue()
-        n_active_process = 0
-        for i in range(batch_size):
-            x0 = X[np.argmin(augmented_tchebicheff(F, weights[i]))]
-            Process(target=optimization, args=(self.problem, x0, weights[i], queue)).start()
-            n_active_process += 1
-            if n_active_process >= self.n_process:
-                x, y = queue.get()
-                xs.append(x)
-                ys.append(y)
-                n_active_process -= 1
+        if self.vectorized:
+            # optimization of all scalarizations in lockstep, where populations of all weights are evaluated together in each generation
+            def func(run_idx, X):
+                F, CV = self.problem.evaluate(X, return_values_of=['F', 'CV'])
+                return augmented_tchebicheff(F, weights[run_idx]), CV[:, 0]
 
-        # gather result
-        for _ in range(n_active_process):
-            x, y = queue.get()
-            xs.append(x)
-            ys.append(y)
+            xs, ys = BatchCMAES().minimize(func, np.array(x0s), self.problem.xl, self.problem.xu)
+            return xs, ys[:, None]
 
+        # optimization, where each worker receives the surrogate problem once and then only the initial solution, weights and seed of each task
+        seeds = np.random.randint(2 ** 31, size=batch_size)
+        self.pool.set_state(self.problem)
+        results = self.pool.map(optimization, [(x0, w, seed) for x0, w, seed in zip(x0s, weights, seeds)])
+
+        xs, ys = zip(*results)
         return np.array(xs), np.array(ys)
@@ -4,16 +4,16 @@ ParetoDiscovery multi-objective solver.
 
 import numpy as np
 from scipy.optimize import minimize
-from scipy.linalg import null_space
 from pymoo.model.algorithm import Algorithm
 from pymoo.model.duplicate import DefaultDuplicateElimination
 from pymoo.model.individual import Individual
 from pymoo.model.initialization import Initialization
 from pymoo.optimize import minimize as minimize_ea
-from multiprocess import Process, Queue, cpu_count
+from multiprocess import cpu_count
 
 from autooed.utils.sampling import lhs
 from autooed.utils.pareto import find_pareto_front
+from autooed.utils.parallel import WorkerPool
 from autooed.mobo.solver.base import Solver
 from autooed.mobo.solver.pareto_discovery.buffer import get_buffer
 from autooed.mobo.solver.pareto_discovery.utils import propose_next_batch, propose_next_batch_without_label, get_sample_num_from_families
@@ -67,75 +67,194 @@ def _local_optimization(x, y, f, eval_func, bounds, constr_func, delta_s):
     return x_opt
 
 
-def _get_kkt_dual_variables(F, G, DF, DG):
+def _batch_local_optimization(xs, ys, fs, eval_func, bounds, delta_s, max_iter=1000, pgtol=1e-5, ftol=2.2e-9):
     '''
-    Optimizing for dual variables alpha and beta in KKT conditions, see section 4.2, proposition 4.5.
+    Local optimization of a batch of generated stochastic samples by minimizing distance to the targets, see section 6.2.3,
+    where all samples are advanced together by a projected L-BFGS with backtracking line search, such that the problem is evaluated
+    once per step for the whole batch, while convergence is checked for each sample. Only box constraints are supported.
     Input:
-        Given a design sample,
-        F: performance value, shape = (n_obj,)
-        G: active constraints, shape = (n_active_const,)
-        DF: jacobian matrix of performance, shape = (n_obj, n_var)
-        DG: jacobian matrix of active constraints, shape = (n_active_const, n_var)
-        where n_var = D, n_obj = d, n_active_const = K' in the original paper
+        xs: a batch of design samples, shape = (batch_size, n_var)
+        ys: performance of xs, shape = (batch_size, n_obj)
+        fs: relative performance to the buffer origin, shape = (batch_size, n_obj)
+        eval_func: problem's evaluation function
+        bounds: problem's lower and upper bounds, shape = (2, n_var)
+        delta_s: scaling factor for choosing reference point in local optimization, see section 6.2.3
+        max_iter: maximum number of iterations
+        pgtol: tolerance of the projected gradient (infinity norm) for convergence, the same as L-BFGS-B's default
+        ftol: tolerance of the relative reduction of objective for convergence, the same as L-BFGS-B's default
+    Output:
+        xs_opt: locally optimized samples, shape = (batch_size, n_var)
+    '''
+    lower_bound, upper_bound = np.array(bounds[0]), np.array(bounds[1])
+
+    # choose reference points z
+    f_norm = np.linalg.norm(fs, axis=1, keepdims=True)
+    s = 2.0 * fs / np.sum(fs, axis=1, keepdims=True) - 1 - fs / f_norm
+    s /= np.linalg.norm(s, axis=1, keepdims=True)
+    zs = ys + s * delta_s * f_norm
+
+    # optimization objective of eq(4) and its gradient, evaluated for a batch of samples at once
+    def fun_jac(X, Z):
+        F, DF = eval_func(X, return_values_of=['F', 'dF'])
+        if DF is None:
+            # forward finite difference in the same evaluation call
+            eps = 1e-8
+            X_fd = (X[:, None, :] + eps * np.eye(X.shape[1])).reshape(-1, X.shape[1])
+            F_fd = eval_func(X_fd, return_values_of=['F']).reshape(len(X), X.shape[1], -1)
+            DF = (F_fd - F[:, None, :]).transpose(0, 2, 1) / eps
+        diff = F - Z
+        dist = np.maximum(np.linalg.norm(diff, axis=1), 1e-12)
+        grad = np.einsum('no,nov->nv', diff / dist[:, None], DF)
+        return dist, grad
+
+    def free_mask(x, g):
+        # variables not blocked by the bounds along the negative gradient
+        return ~(((x <= lower_bound) & (g > 0)) | ((x >= upper_bound) & (g < 0)))
+
+    def lbfgs_direction(g, free, S, Y, n_mem):
+        # two-loop recursion of L-BFGS on the free variables of a batch of samples
+        q = g * free
+        m = S.shape[1]
+        valid = np.arange(m)[None, :] >= m - n_mem[:, None] # valid: shape (N, m), newest memory in the end
+        sy = np.where(valid, np.sum(S * Y, axis=2), 1.)
+        rho = np.where(valid, 1. / sy, 0.)
+        alpha = np.zeros_like(rho)
+        for j in reversed(range(m)):
+            alpha[:, j] = rho[:, j] * np.sum(S[:, j] * q, axis=1)
+            q -= alpha[:, j, None] * Y[:, j]
+        yy = np.sum(Y[:, -1] ** 2, axis=1)
+        gamma = np.where(n_mem > 0, sy[:, -1] / np.where(n_mem > 0, yy, 1.), 1.)
+        r = gamma[:, None] * q
+        for j in range(m):
+            beta = rho[:, j] * np.sum(Y[:, j] * r, axis=1)
+            r += S[:, j] * (alpha[:, j] - beta)[:, None]
+        d = -r * free
+
+        # fall back to steepest descent when the direction is not descending
+        not_descent = np.sum(d * g, axis=1) >= 0
+        d[not_descent] = -(g * free)[not_descent]
+        return d, not_descent
+
+    n_sample, n_var = xs.shape
+    n_mem_max = 10
+    x = np.clip(xs, lower_bound, upper_bound)
+    fx, gx = fun_jac(x, zs)
+    S, Y = np.zeros((n_sample, n_mem_max, n_var)), np.zeros((n_sample, n_mem_max, n_var)) # memory of L-BFGS
+    n_mem = np.zeros(n_sample, dtype=int)
+    d, _ = lbfgs_direction(gx, free_mask(x, gx), S, Y, n_mem)
+    step = 1.0 / np.maximum(np.linalg.norm(d, axis=1), 1e-12) # initial step of unit length
+    active = np.ones(n_sample, dtype=bool)
+
+    for _ in range(max_iter):
+        idx = np.where(active)[0]
+        if len(idx) == 0: break
+
+        # projected step of all active samples along their search directions
+        x_new = np.clip(x[idx] + step[idx, None] * d[idx], lower_bound, upper_bound)
+        f_new, g_new = fun_jac(x_new, zs[idx])
+        dx = x_new - x[idx]
+
+        # accept steps satisfying the armijo condition, otherwise backtrack
+        accept = f_new <= fx[idx] + 1e-4 * np.sum(gx[idx] * dx, axis=1)
+        acc, rej = idx[accept], idx[~accept]
+        step[rej] *= 0.5
+
+        # update memory of accepted samples with positive curvature
+        dg = g_new[accept] - gx[acc]
+        curv = np.sum(dx[accept] * dg, axis=1) > 1e-10 * np.sum(dg ** 2, axis=1)
+        upd = acc[curv]
+        S[upd], Y[upd] = np.roll(S[upd], -1, axis=1), np.roll(Y[upd], -1, axis=1)
+        S[upd, -1], Y[upd, -1] = dx[accept][curv], dg[curv]
+        n_mem[upd] = np.minimum(n_mem[upd] + 1, n_mem_max)
+
+        rel_reduction = (fx[acc] - f_new[accept]) / np.maximum(np.maximum(np.abs(fx[acc]), np.abs(f_new[accept])), 1.0)
+        x[acc], fx[acc], gx[acc] = x_new[accept], f_new[accept], g_new[accept]
+
+        # new search directions of accepted samples, restarting the memory when it fails to give a descent direction
+        d[acc], restart = lbfgs_direction(gx[acc], free_mask(x[acc], gx[acc]), S[acc], Y[acc], n_mem[acc])
+        n_mem[acc[restart]] = 0
+        step[acc] = np.where(restart | (n_mem[acc] == 0), 1.0 / np.maximum(np.linalg.norm(d[acc], axis=1), 1e-12), 1.0)
+
+        # check convergence of each sample
+        pg = np.max(np.abs(np.clip(x[acc] - gx[acc], lower_bound, upper_bound) - x[acc]), axis=1)
+        active[acc[(pg <= pgtol) | (rel_reduction <= ftol)]] = False
+        active[rej[step[rej] < 1e-20]] = False
+
+    return x
+
+
+def _project_simplex(V):
+    '''
+    Euclidean projection of a batch of vectors onto the probability simplex.
+    Input:
+        V: vectors to project, shape = (N, n)
     Output:
-        alpha_opt, beta_opt: optimized dual variables
+        projected vectors, shape = (N, n)
     '''
-    # NOTE: use min-norm solution for solving alpha then determine beta instead?
-    n_obj = len(F)
-    n_active_const = len(G) if G is not None else 0
+    U = -np.sort(-V, axis=1)
+    css = np.cumsum(U, axis=1) - 1.0
+    n_pos = np.sum(U - css / np.arange(1, V.shape[1] + 1) > 0, axis=1)
+    theta = css[np.arange(len(V)), n_pos - 1] / n_pos
+    return np.maximum(V - theta[:, None], 0.0)
+
 
+def _get_kkt_dual_variables(DF, DG_sign, max_iter=10000, tol=1e-10):
+    '''
+    Optimizing for dual variables alpha and beta in KKT conditions of a batch of design samples, see section 4.2, proposition 4.5.
+    Input:
+        Given a batch of design samples,
+        DF: jacobian matrices of performance, shape = (N, n_obj, n_var)
+        DG_sign: signs of the jacobian of active box constraints (1 for upper active, -1 for lower active, 0 for inactive), shape = (N, n_var)
+        where n_var = D, n_obj = d in the original paper
+        max_iter: maximum number of iterations
+        tol: tolerance of the duality gap (relative to the squared norm of DF) for convergence
+    Output:
+        alpha_opt: optimized dual variables of objectives, shape = (N, n_obj)
+        beta_opt: optimized dual variables of box constraints (0 for inactive ones), shape = (N, n_var)
+    '''
     '''
     Optimization formulation:
         To optimize the last line of (2) in section 4.2, we change it to a quadratic optization problem by:
         find x to let Ax = 0 --> min_x (Ax)^2
         where x means [alpha, beta] and A means [DF, DG].
         Constraints: alpha >= 0, beta >= 0, sum(alpha) = 1.
-        NOTE: we currently ignore the constraint beta * G = 0 because G will always be 0 with only box constraints, but add that constraint will result in poor optimization solution (?)
+        Since the active box constraints have jacobians of distinct unit vectors, beta is eliminated in closed form,
+        i.e., beta cancels the components of alpha @ DF on active bounds whose signs are opposite to the constraints,
+        then the min-norm problem of alpha on the simplex is solved for all samples together by accelerated projected gradient.
+        NOTE: we currently ignore the constraint beta * G = 0 because G will always be 0 with only box constraints
     '''
-    if n_active_const > 0: # when there are active constraints
-
-        def fun(x, n_obj=n_obj, DF=DF, DG=DG):
-            alpha, beta = x[:n_obj], x[n_obj:]
-            objective = alpha @ DF + beta @ DG
-            return 0.5 * objective @ objective
-
-        def jac(x, n_obj=n_obj, DF=DF, DG=DG):
-            alpha, beta = x[:n_obj], x[n_obj:]
-            objective = alpha @ DF + beta @ DG
-            return np.vstack([DF, DG]) @ objective
-
-        const = {'type': 'eq', 
-            'fun': lambda x, n_obj=n_obj: np.sum(x[:n_obj]) - 1.0, 
-            'jac': lambda x, n_obj=n_obj: np.concatenate([np.ones(n_obj), np.zeros_like(x[n_obj:])])}
-    
-    else: # when there's no active constraint
-        
-        def fun(x, DF=DF):
-            objective = x @ DF
-            return 0.5 * objective @ objective
-
-        def jac(x, DF=DF):
-            objective = x @ DF
-            return DF @ objective
-
-        const = {'type': 'eq', 
-                'fun': lambda x: np.sum(x) - 1.0, 
-                'jac': np.ones_like}
-
-    # specify different bounds for alpha and beta
-    bounds = np.array([[0.0, np.inf]] * (n_obj + n_active_const))
-    
-    # NOTE: we use random value to initialize alpha for now, maybe consider the location of F we can get a more accurate initialization
-    alpha_init = np.random.random(len(F))
-    alpha_init /= np.sum(alpha_init)
-    beta_init = np.zeros(n_active_const) # zero initialization for beta
-    x_init = np.concatenate([alpha_init, beta_init])
-
-    # do optimization using SLSQP
-    res = minimize(fun, x_init, method='SLSQP', jac=jac, bounds=bounds, constraints=const)
-    x_opt = res.x
-    alpha_opt, beta_opt = x_opt[:n_obj], x_opt[n_obj:]
-    return alpha_opt, beta_opt
+    n_sample, n_obj, _ = DF.shape
+
+    def residual(alpha, indices):
+        v = np.einsum('no,nov->nv', alpha, DF[indices])
+        return v * ((DG_sign[indices] == 0) | (DG_sign[indices] * v >= 0))
+
+    # lipschitz constant of the gradient bounded by the squared frobenius norm of DF
+    lipschitz = np.maximum(np.sum(DF ** 2, axis=(1, 2)), 1e-12)[:, None]
+
+    alpha = np.full((n_sample, n_obj), 1.0 / n_obj)
+    z, t = alpha.copy(), np.ones(n_sample)
+    active = np.arange(n_sample)
+    for _ in range(max_iter):
+        # accelerated projected gradient step of unconverged samples
+        grad = np.einsum('nov,nv->no', DF[active], residual(z[active], active))
+        alpha_new = _project_simplex(z[active] - grad / lipschitz[active])
+        t_new = 0.5 * (1 + np.sqrt(1 + 4 * t[active] ** 2))
+        momentum = ((t[active] - 1) / t_new)[:, None] * (alpha_new - alpha[active])
+
+        # restart the momentum when it goes against the gradient
+        restart = np.sum(grad * (alpha_new - alpha[active]), axis=1) > 0
+        momentum[restart], t_new[restart] = 0.0, 1.0
+        alpha[active], z[active], t[active] = alpha_new, alpha_new + momentum, t_new
+
+        # converged when the duality gap of frank-wolfe (an upper bound of the suboptimality) is within the tolerance
+        grad = np.einsum('nov,nv->no', DF[active], residual(alpha_new, active))
+        gap = np.sum(grad * alpha_new, axis=1) - np.min(grad, axis=1)
+        active = active[gap > tol * lipschitz[active, 0]]
+        if len(active) == 0: break
+    v = np.einsum('no,nov->nv', alpha, DF)
+    beta = np.maximum(-DG_sign * v, 0.0)
+    return alpha, beta
 
 
 def _get_active_box_const(x, bounds):
@@ -157,79 +276,74 @@ def _get_active_box_const(x, bounds):
     return active_idx, upper_active_idx, lower_active_idx
 
 
-def _get_box_const_value_jacobian_hessian(x, bounds):
+def _batch_null_space(A):
     '''
-    Getting the value, jacobian and hessian of active box constraints.
+    Null spaces of a batch of matrices with the same shape, the same as scipy.linalg.null_space of each matrix.
     Input:
-        x: a design sample, shape = (n_var,)
-        bounds: problem's lower and upper bounds, shape = (2, n_var)
+        A: matrices, shape = (N, m, n)
     Output:
-        G: value of active box constraints (always 0), shape = (n_active_const,)
-        DG: jacobian matrix of active box constraints (1/-1 at active locations, otherwise 0), shape = (n_active_const, n_var)
-        HG: hessian matrix of active box constraints (always 0), shape = (n_active_const, n_var, n_var)
+        null spaces of all matrices, list of arrays with shape = (n, n - rank)
     '''
-    # get indices of active constraints
-    active_idx, upper_active_idx, _ = _get_active_box_const(x, bounds)
-    n_active_const, n_var = len(active_idx), len(x)
-
-    if n_active_const > 0:
-        G = np.zeros(n_active_const)
-        DG = np.zeros((n_active_const, n_var))
-        for i, idx in enumerate(active_idx):
-            constraint = np.zeros(n_var)
-            if idx in upper_active_idx:
-                constraint[idx] = 1 # upper active
-            else:
-                constraint[idx] = -1 # lower active
-            DG[i] = constraint
-        HG = np.zeros((n_active_const, n_var, n_var))
-        return G, DG, HG
-    else:
-        # no active constraints
-        return None, None, None
+    _, S, Vh = np.linalg.svd(A, full_matrices=True)
+    tol = np.max(S, axis=1, initial=0.0) * np.finfo(A.dtype).eps * max(A.shape[1:])
+    ranks = np.sum(S > tol[:, None], axis=1)
+    return [vh[rank:].T.conj() for vh, rank in zip(Vh, ranks)]
 
 
-def _get_optimization_directions(x_opt, eval_func, bounds):
+def _get_optimization_directions(x_opts, eval_func, bounds):
     '''
-    Getting the directions to explore local pareto manifold.
+    Getting the directions to explore local pareto manifold of a batch of design samples.
     Input:
-        x_opt: locally optimized design sample, shape = (n_var,)
+        x_opts: locally optimized design samples, shape = (N, n_var)
         eval_func: problem's evaluation function
         bounds: problem's lower and upper bounds, shape = (2, n_var)
     Output:
-        directions: local exploration directions for alpha, beta and x (design sample)
+        directions: local exploration directions for alpha, beta and x (design sample) of each sample, list of length N
     '''
+    n_sample, n_var = x_opts.shape
+
     # evaluate the value, jacobian and hessian of performance
-    F, DF, HF = eval_func(x_opt, return_values_of=['F', 'dF', 'hF'])
-    
-    # evaluate the value, jacobian and hessian of box constraint (NOTE: assume no other types of constraints)
-    G, DG, HG = _get_box_const_value_jacobian_hessian(x_opt, bounds)
-    
-    # KKT dual variables optimization
-    alpha, beta = _get_kkt_dual_variables(F, G, DF, DG)
+    F, DF, HF = eval_func(x_opts, return_values_of=['F', 'dF', 'hF'])
+    n_obj = F.shape[1]
 
-    n_obj, n_var, n_active_const = len(F), len(x_opt), len(G) if G is not None else 0
+    # signs of jacobians of active box constraints, whose values and hessians are always 0 (NOTE: assume no other types of constraints)
+    eps = 1e-8 # epsilon value to determine 'active'
+    upper_active = bounds[1] - x_opts < eps
+    lower_active = x_opts - bounds[0] < eps
+    DG_sign = np.where(upper_active, 1.0, np.where(lower_active, -1.0, 0.0))
 
-    # compute H in eq(3) (NOTE: the two forms below are equivalent for box constraint since HG = 0)
-    if n_active_const > 0:
-        H = HF.T @ alpha + HG.T @ beta
-    else:
-        H = HF.T @ alpha
+    # KKT dual variables optimization
+    alpha, _ = _get_kkt_dual_variables(DF, DG_sign)
+
+    # compute H in eq(3) (NOTE: HG = 0 for box constraint)
+    H = np.einsum('no,novw->nvw', alpha, HF)
 
     # compute exploration directions (unnormalized) by taking the null space of image in eq(3)
     # TODO: this part is mainly copied from Adriana's implementation, to be checked
     # NOTE: seems useless to solve for d_alpha and d_beta, maybe need to consider all possible situations in null_space computation
-    alpha_const = np.concatenate([np.ones(n_obj), np.zeros(n_active_const + n_var)])
-    if n_active_const > 0:
-        comp_slack_const = np.column_stack([np.zeros((n_active_const, n_obj + n_active_const)), DG])
-        DxHx = np.vstack([alpha_const, comp_slack_const, np.column_stack([DF.T, DG.T, H])])
-    else:
-        DxHx = np.vstack([alpha_const, np.column_stack([DF.T, H])])
-    directions = null_space(DxHx)
+    # samples with the same number of active constraints are stacked for batched null space computation
+    n_active_const = np.sum(DG_sign != 0, axis=1)
+    directions = [None] * n_sample
+    for n_active in np.unique(n_active_const):
+        indices = np.where(n_active_const == n_active)[0]
+        n_batch = len(indices)
+
+        alpha_const = np.tile(np.concatenate([np.ones(n_obj), np.zeros(n_active + n_var)]), (n_batch, 1, 1))
+        if n_active > 0:
+            # jacobians of active constraints ordered by variable indices, shape = (n_batch, n_active, n_var)
+            active_idx = np.nonzero(DG_sign[indices])[1].reshape(n_batch, n_active)
+            DG = np.zeros((n_batch, n_active, n_var))
+            np.put_along_axis(DG, active_idx[:, :, None], np.take_along_axis(DG_sign[indices], active_idx, axis=1)[:, :, None], axis=2)
+            comp_slack_const = np.concatenate([np.zeros((n_batch, n_active, n_obj + n_active)), DG], axis=2)
+            DxHx = np.concatenate([alpha_const, comp_slack_const, np.concatenate([DF[indices].transpose(0, 2, 1), DG.transpose(0, 2, 1), H[indices]], axis=2)], axis=1)
+        else:
+            DxHx = np.concatenate([alpha_const, np.concatenate([DF[indices].transpose(0, 2, 1), H[indices]], axis=2)], axis=1)
+
+        for i, d in zip(indices, _batch_null_space(DxHx)):
+            # eliminate numerical error
+            d[np.abs(d) < eps] = 0.0
+            directions[i] = d
 
-    # eliminate numerical error
-    eps = 1e-8
-    directions[np.abs(directions) < eps] = 0.0
     return directions
 
 
@@ -296,49 +410,21 @@ def _first_order_approximation(x_opt, directions, bounds, constr_func, n_grid_sa
     return x_samples
 
 
-def _pareto_discover(xs, eval_func, bounds, constr_func, delta_s, origin, origin_constant, n_grid_sample, queue):
+def _constrained_local_optimization(problem, x, y, f, bounds, delta_s):
     '''
-    Local optimization and first-order approximation.
-    (We move these functions out from the ParetoDiscovery class for parallelization)
+    Local optimization of a sample under constraints other than bounds.
+    (We move this function out from the ParetoDiscovery class for parallelization)
     Input:
-        xs: a batch of samples x, shape = (batch_size, n_var)
-        eval_func: problem's evaluation function
+        problem: the surrogate problem (shared by all tasks)
+        x: a design sample, shape = (n_var,)
+        y: performance of x, shape = (n_obj,)
+        f: relative performance to the buffer origin, shape = (n_obj,)
         bounds: problem's lower and upper bounds, shape = (2, n_var)
-        constr_func: problem's constraint evaluation function
         delta_s: scaling factor for choosing reference point in local optimization, see section 6.2.3
-        origin: origin of performance buffer
-        origin_constant: when evaluted value surpasses the buffer origin, adjust the origin accordingly and subtract this constant
-        n_grid_sample: number of samples on local manifold (grid), see section 6.3.1
-        queue: the queue storing results from all processes
-    Output (stored in queue):
-        x_samples_all: all valid samples from local manifold (grid)
-        patch_ids: patch ids for all valid samples (same id when expanded from same x)
-        sample_num: number of input samples (needed for counting global patch ids)
-        new_origin: new origin point for performance buffer
+    Output:
+        x_opt: locally optimized sample
     '''
-    # evaluate samples x and adjust origin accordingly
-    ys = eval_func(xs, return_values_of=['F'])
-    new_origin = np.minimum(origin, np.min(ys, axis=0))
-    if (new_origin != origin).any():
-        new_origin -= origin_constant
-    fs = ys - new_origin
-
-    x_samples_all = []
-    patch_ids = []
-    for i, (x, y, f) in enumerate(zip(xs, ys, fs)):
-
-        # local optimization by optimizing eq(4)
-        x_opt = _local_optimization(x, y, f, eval_func, bounds, constr_func, delta_s)
-
-        # get directions to expand in local manifold
-        directions = _get_optimization_directions(x_opt, eval_func, bounds)
-
-        # get new valid samples from local manifold
-        x_samples = _first_order_approximation(x_opt, directions, bounds, constr_func, n_grid_sample)
-        x_samples_all.append(x_samples)
-        patch_ids.extend([i] * len(x_samples))
-
-    queue.put([np.vstack(x_samples_all), patch_ids, len(xs), new_origin])
+    return _local_optimization(x, y, f, problem.evaluate, bounds, problem.evaluate_constraint, delta_s)
 
 
 class ParetoDiscoveryAlgorithm(Algorithm):
@@ -362,6 +448,7 @@ class ParetoDiscoveryAlgorithm(Algorithm):
                 delta_s=0.3,
                 n_grid_sample=100,
                 n_process=cpu_count(),
+                pool=None,
                 **kwargs
                 ):
         '''
@@ -378,6 +465,7 @@ class ParetoDiscoveryAlgorithm(Algorithm):
             delta_s: scaling factor for choosing reference point in local optimization, see section 6.2.3
             n_grid_sample: number of samples on local manifold (grid), see section 6.3.1
             n_process: number of processes for parallelization
+            pool: persistent worker pool for parallelization, created with n_process workers if not given
         '''
         super().__init__(**kwargs)
         
@@ -420,6 +508,7 @@ class ParetoDiscoveryAlgorithm(Algorithm):
         self.delta_s = delta_s
         self.n_grid_sample = n_grid_sample
         self.n_process = n_process
+        self.pool = pool if pool is not None else WorkerPool(n_process)
         self.patch_id = 0
 
         self.constr_func = None
@@ -458,6 +547,10 @@ class ParetoDiscoveryAlgorithm(Algorithm):
         # evaluate population using the objective function
         self.evaluator.eval(self.problem, pop, algorithm=self)
 
+        # share the surrogate problem with the workers once for all generations, only needed by constrained local optimization
+        if self.constr_func is not None:
+            self.pool.set_state(self.problem)
+
         # NOTE: check if need survival here
         if self.survival:
             pop = self.survival.do(self.problem, pop, len(pop), algorithm=self)
@@ -487,30 +580,35 @@ class ParetoDiscoveryAlgorithm(Algorithm):
         # stochastic sampling by adding local perturbance
         xs = self._stochastic_sampling()
 
-        # parallelize core pareto discovery process by multiprocess, see _pareto_discover()
-        # including select_direction, local_optimization, first_order_approximation in above algorithm illustration
-        x_batch = np.array_split(xs, self.n_process)
-        queue = Queue()
-        process_count = 0
-        for x in x_batch:
-            if len(x) > 0:
-                p = Process(target=_pareto_discover, 
-                    args=(x, self.problem.evaluate, [self.problem.xl, self.problem.xu], self.constr_func, self.delta_s, 
-                        self.buffer.origin, self.buffer.origin_constant, self.n_grid_sample, queue))
-                p.start()
-                process_count += 1
-
-        # gather results (new samples, new patch ids, new origin of performance buffer) from parallel discovery
-        new_origin = self.buffer.origin
+        # evaluate samples x and adjust origin accordingly
+        ys = self.problem.evaluate(xs, return_values_of=['F'])
+        new_origin = np.minimum(self.buffer.origin, np.min(ys, axis=0))
+        if (new_origin != self.buffer.origin).any():
+            new_origin -= self.buffer.origin_constant
+        fs = ys - new_origin
+
+        # local optimization by optimizing eq(4), for all samples together when there are only box constraints, see _batch_local_optimization(),
+        # otherwise each sample is a task of the worker pool, see _constrained_local_optimization()
+        bounds = [self.problem.xl, self.problem.xu]
+        constrained = self.constr_func is not None
+        if constrained:
+            xs = np.array(self.pool.map(_constrained_local_optimization, [(x, y, f, bounds, self.delta_s) for x, y, f in zip(xs, ys, fs)]))
+        else:
+            xs = _batch_local_optimization(xs, ys, fs, self.problem.evaluate, bounds, self.delta_s)
+
+        # get directions to expand in local manifold of all samples together, see _get_optimization_directions()
+        directions_list = _get_optimization_directions(xs, self.problem.evaluate, bounds)
+
+        # get new valid samples from local manifold by first order approximation
+        x_samples_list = [_first_order_approximation(x, directions, bounds, self.constr_func, self.n_grid_sample) for x, directions in zip(xs, directions_list)]
+
+        # gather results (new samples, new patch ids) from parallel discovery
         x_samples_all = []
         patch_ids_all = []
-        for _ in range(process_count):
-            x_samples, patch_ids, sample_num, origin = queue.get()
-            if x_samples is not None:
-                x_samples_all.append(x_samples)
-                patch_ids_all.append(np.array(patch_ids) + self.patch_id) # assign corresponding global patch ids to samples
-                self.patch_id += sample_num
-            new_origin = np.minimum(new_origin, origin)
+        for x_samples in x_samples_list:
+            x_samples_all.append(x_samples)
+            patch_ids_all.append(np.full(len(x_samples), self.patch_id)) # assign corresponding global patch ids to samples
+            self.patch_id += 1
 
         # evalaute all new samples and adjust the origin point of buffer
         x_samples_all = np.vstack(x_samples_all)
@@ -622,7 +720,8 @@ class ParetoDiscovery(Solver):
     def __init__(self, problem, n_gen=10, pop_size=100, n_process=cpu_count(), **kwargs): # TODO: check n_gen
         super().__init__(problem)
         self.n_gen = n_gen
-        self.algo = ParetoDiscoveryAlgorithm(pop_size=pop_size, n_process=n_process)
+        self.pool = WorkerPool(n_process) # persistent across generations and iterations for constrained local optimization, the surrogate problem is shared once per iteration
+        self.algo = ParetoDiscoveryAlgorithm(pop_size=pop_size, n_process=n_process, pool=self.pool)
 
     def _solve(self, X, Y, batch_size):
         # initialize population
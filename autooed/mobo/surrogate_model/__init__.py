@@ -1,3 +1,6 @@
 from autooed.mobo.surrogate_model.gp import GaussianProcess
+from autooed.mobo.surrogate_model.sgp import SparseGaussianProcess
+from autooed.mobo.surrogate_model.rff import RandomFourierFeature
 from autooed.mobo.surrogate_model.nn import NeuralNetwork
 from autooed.mobo.surrogate_model.bnn import BayesianNeuralNetwork
+from autooed.mobo.surrogate_model.ensemble import DeepEnsemble
@@ -4,15 +4,17 @@ Surrogate model that predicts the objective values of given design variables.
 
 from abc import ABC, abstractmethod
 import numpy as np
+from multiprocess import cpu_count
 
 from autooed.utils.normalization import StandardNormalization
+from autooed.utils.cache import EvaluationCache
 
 
 class SurrogateModel(ABC):
     '''
     Base class of surrogate model.
     '''
-    def __init__(self, problem, **kwargs):
+    def __init__(self, problem, n_process=cpu_count(), max_memory_mb=1024, cache_size=10000, cache_memory_mb=64, **kwargs):
         '''
         Initialize a surrogate model.
 
@@ -20,12 +22,24 @@ class SurrogateModel(ABC):
         ----------
         problem: autooed.problem.Problem
             The optimization problem.
+        n_process: int
+            Number of processes for fitting and evaluating objectives in parallel.
+        max_memory_mb: int
+            Memory budget (in MB) of evaluation, large sets of design variables are evaluated in chunks within the budget.
+        cache_size: int
+            Maximum number of design variables whose evaluation results are cached until the next fit, 0 to disable caching.
+        cache_memory_mb: int
+            Memory budget (in MB) of cached evaluation results, separate from the evaluation budget max_memory_mb.
         '''
         self.problem = problem
+        self.n_process = n_process
+        self.max_memory_mb = max_memory_mb
         self.n_var, self.n_obj = problem.n_var, problem.n_obj
         self.bounds = np.array([problem.xl, problem.xu])
         self.transformation = problem.transformation
         self.normalization = StandardNormalization(self.bounds)
+        self.cache = EvaluationCache(cache_size, cache_memory_mb)
+        self.X_train, self.Y_train = None, None # training data of the last fit (normalized, continuous)
         self.fitted = False
 
     def fit(self, X, Y, dtype='raw'):
@@ -49,6 +63,8 @@ class SurrogateModel(ABC):
             X, Y = self.normalization.do(x=X, y=Y)
 
         self._fit(X, Y)
+        self.X_train, self.Y_train = X, Y
+        self.cache.clear()
         self.fitted = True
 
     @abstractmethod
@@ -65,6 +81,46 @@ class SurrogateModel(ABC):
         '''
         pass
 
+    def fit_fantasy(self, X, Y, dtype='raw'):
+        '''
+        Condition the fitted surrogate model on additional fantasized data (e.g., believed performance of pending evaluations),
+        with the hyperparameters and the data normalization of the last fit kept fixed.
+
+        Parameters
+        ----------
+        X: np.array
+            Fantasized design variables.
+        Y: np.array
+            Fantasized objective values.
+        '''
+        assert self.fitted, f'Surrogate model is not fitted yet'
+
+        assert dtype in ['raw', 'continuous', 'normalized'], f'Undefined data type {dtype} in surrogate fitting'
+
+        if dtype == 'raw':
+            X = self.transformation.do(X)
+            
+        if dtype == 'raw' or dtype == 'continuous':
+            X, Y = self.normalization.do(x=X, y=Y)
+
+        self._fit_fantasy(X, Y)
+        self.X_train, self.Y_train = np.vstack([self.X_train, X]), np.vstack([self.Y_train, Y])
+        self.cache.clear()
+
+    def _fit_fantasy(self, X, Y):
+        '''
+        Condition the fitted surrogate model on additional fantasized data that is normalized and continuous.
+        By default the surrogate model is refitted on the training data together with the fantasized data.
+
+        Parameters
+        ----------
+        X: np.array
+            Fantasized design variables (normalized, continuous).
+        Y: np.array
+            Fantasized objective values (normalized).
+        '''
+        self._fit(np.vstack([self.X_train, X]), np.vstack([self.Y_train, Y]))
+
     def evaluate(self, X, dtype='raw', std=False, gradient=False, hessian=False):
         '''
         Predict the performance given a set of design variables.
@@ -101,12 +157,14 @@ class SurrogateModel(ABC):
         if dtype == 'raw' or dtype == 'continuous':
             X = self.normalization.do(x=X)
         
-        out = self._evaluate(X, std, gradient, hessian)
+        out = self.cache.evaluate(lambda X: self._evaluate_chunked(X, std, gradient, hessian), X, std, gradient, hessian)
 
         out['F'] = self.normalization.undo(y=out['F'])
         if gradient: out['dF'] = self.normalization.rescale(y=out['dF'].transpose(0, 2, 1)).transpose(0, 2, 1)
+        if hessian: out['hF'] = self.normalization.rescale(y=out['hF'].transpose(0, 2, 3, 1)).transpose(0, 3, 1, 2)
         if std: out['S'] = self.normalization.rescale(y=out['S'])
         if std and gradient: out['dS'] = self.normalization.rescale(y=out['dS'].transpose(0, 2, 1)).transpose(0, 2, 1)
+        if std and hessian: out['hS'] = self.normalization.rescale(y=out['hS'].transpose(0, 2, 3, 1)).transpose(0, 3, 1, 2)
         
         return out
 
@@ -139,6 +197,225 @@ class SurrogateModel(ABC):
         '''
         pass
 
+    def _evaluate_chunked(self, X, std, gradient, hessian):
+        '''
+        Predict the performance given a set of normalized and continuous design variables, in chunks of design variables
+        whose evaluation fits in the memory budget. Results are streamed into preallocated outputs, see _evaluate() for details.
+        '''
+        chunk_size = max(1, int(self.max_memory_mb * 2 ** 20 // self._get_sample_memory(std, gradient, hessian)))
+        if len(X) <= chunk_size:
+            return self._evaluate(X, std, gradient, hessian)
+
+        n_sample = len(X)
+        shapes = {
+            'F': (n_sample, self.n_obj),
+            'dF': (n_sample, self.n_obj, self.n_var) if gradient else None,
+            'hF': (n_sample, self.n_obj, self.n_var, self.n_var) if hessian else None,
+            'S': (n_sample, self.n_obj) if std else None,
+            'dS': (n_sample, self.n_obj, self.n_var) if std and gradient else None,
+            'hS': (n_sample, self.n_obj, self.n_var, self.n_var) if std and hessian else None,
+        }
+        out = {key: None if shape is None else np.empty(shape) for key, shape in shapes.items()}
+
+        for start in range(0, n_sample, chunk_size):
+            end = min(start + chunk_size, n_sample)
+            out_chunk = self._evaluate(X[start:end], std, gradient, hessian)
+            for key in out:
+                if out[key] is not None:
+                    out[key][start:end] = out_chunk[key]
+        return out
+
+    def evaluate_objective(self, X, i, dtype='raw', gradient=False, hessian=False):
+        '''
+        Predict the mean of a single objective given a set of design variables,
+        which avoids predicting the other objectives when the surrogate model supports it.
+
+        Parameters
+        ----------
+        X: np.array
+            Input design variables.
+        i: int
+            Index of the objective.
+        gradient: bool
+            Whether to calculate the gradient of the prediction.
+        hessian: bool
+            Whether to calculate the hessian of the prediction.
+
+        Returns
+        -------
+        out: dict
+            A output dictionary containing following properties of performance:\n
+            - out['F']: mean, shape (N,)
+            - out['dF']: gradient of mean, shape (N, n_var)
+            - out['hF']: hessian of mean, shape (N, n_var, n_var)
+        '''
+        assert self.fitted, f'Surrogate model is not fitted yet'
+
+        assert dtype in ['raw', 'continuous', 'normalized'], f'Undefined data type {dtype} in surrogate evaluation'
+
+        if dtype == 'raw':
+            X = self.transformation.do(X)
+
+        if dtype == 'raw' or dtype == 'continuous':
+            X = self.normalization.do(x=X)
+
+        # evaluate in chunks within the memory budget, which is estimated conservatively for all objectives
+        chunk_size = max(1, int(self.max_memory_mb * 2 ** 20 // self._get_sample_memory(False, gradient, hessian)))
+        F, dF, hF = [], [], []
+        for start in range(0, max(len(X), 1), chunk_size):
+            F_chunk, dF_chunk, hF_chunk = self._evaluate_objective(X[start:start + chunk_size], i, gradient, hessian)
+            F.append(F_chunk); dF.append(dF_chunk); hF.append(hF_chunk)
+
+        # the normalization of objectives is an affine transformation of each objective
+        y_mean, y_scale = self.normalization.y_scaler.mean_[i], self.normalization.y_scaler.scale_[i]
+        out = {
+            'F': np.concatenate(F) * y_scale + y_mean,
+            'dF': np.concatenate(dF) * y_scale if gradient else None,
+            'hF': np.concatenate(hF) * y_scale if hessian else None,
+        }
+        return out
+
+    def _evaluate_objective(self, X, i, gradient, hessian):
+        '''
+        Predict the mean of a single objective given a set of normalized and continuous design variables.
+        By default all objectives are predicted and the i-th objective is taken.
+
+        Parameters
+        ----------
+        X: np.array
+            Input design variables (normalized, continuous).
+        i: int
+            Index of the objective.
+        gradient: bool
+            Whether to calculate the gradient of the prediction.
+        hessian: bool
+            Whether to calculate the hessian of the prediction.
+
+        Returns
+        -------
+        F, dF, hF: np.array
+            Mean of the i-th objective (normalized) and its gradient and hessian (None if not requested),
+            shape (N,), (N, n_var) and (N, n_var, n_var).
+        '''
+        out = self._evaluate(X, False, gradient, hessian)
+        return out['F'][:, i], out['dF'][:, i] if gradient else None, out['hF'][:, i] if hessian else None
+
+    def evaluate_joint(self, X, dtype='raw'):
+        '''
+        Predict the joint posterior distribution of the performance over batches of design variables.
+
+        Parameters
+        ----------
+        X: np.array
+            Input batches of design variables, shape (N, q, n_var).
+
+        Returns
+        -------
+        F: np.array
+            Posterior mean of objectives, shape (N, q, n_obj).
+        C: np.array
+            Posterior covariance of each objective between designs in the same batch, shape (N, n_obj, q, q).
+        '''
+        assert self.fitted, f'Surrogate model is not fitted yet'
+
+        assert dtype in ['raw', 'continuous', 'normalized'], f'Undefined data type {dtype} in surrogate evaluation'
+
+        n_batch, q = X.shape[:2]
+        X = X.reshape(n_batch * q, -1)
+
+        if dtype == 'raw':
+            X = self.transformation.do(X)
+
+        if dtype == 'raw' or dtype == 'continuous':
+            X = self.normalization.do(x=X)
+
+        F, C = self._evaluate_joint(X.reshape(n_batch, q, -1))
+
+        F = self.normalization.undo(y=F.reshape(n_batch * q, -1)).reshape(n_batch, q, -1)
+        C = self.normalization.rescale(y=self.normalization.rescale(y=C.transpose(0, 2, 3, 1))).transpose(0, 3, 1, 2)
+
+        return F, C
+
+    def _evaluate_joint(self, X):
+        '''
+        Predict the joint posterior distribution of the performance over batches of normalized and continuous design variables,
+        only supported by surrogate models with a joint posterior (e.g., Gaussian process).
+
+        Parameters
+        ----------
+        X: np.array
+            Input batches of design variables (normalized, continuous), shape (N, q, n_var).
+
+        Returns
+        -------
+        F: np.array
+            Posterior mean of objectives (normalized), shape (N, q, n_obj).
+        C: np.array
+            Posterior covariance of each objective (normalized), shape (N, n_obj, q, q).
+        '''
+        raise NotImplementedError(f'Joint posterior is not supported by {self.__class__.__name__}')
+
+    def _evaluate_joint_torch(self, X):
+        '''
+        Differentiable version of _evaluate_joint() on torch tensors, for derivatives of joint batch acquisition functions by autograd.
+
+        Parameters
+        ----------
+        X: torch.Tensor
+            Input batches of design variables (normalized, continuous), shape (N, q, n_var).
+
+        Returns
+        -------
+        F: torch.Tensor
+            Posterior mean of objectives (normalized), shape (N, q, n_obj).
+        C: torch.Tensor
+            Posterior covariance of each objective (normalized), shape (N, n_obj, q, q).
+        '''
+        raise NotImplementedError(f'Differentiable joint posterior is not supported by {self.__class__.__name__}')
+
+    def _get_sample_memory(self, std, gradient, hessian):
+        '''
+        Estimate the peak memory usage (in bytes) of evaluating a single design variable.
+
+        Parameters
+        ----------
+        std: bool
+            Whether to calculate the standard deviation of the prediction.
+        gradient: bool
+            Whether to calculate the gradient of the prediction.
+        hessian: bool
+            Whether to calculate the hessian of the prediction.
+
+        Returns
+        -------
+        int
+            Estimated memory usage in bytes.
+        '''
+        size = 1 + (self.n_var if gradient else 0) + (self.n_var ** 2 if hessian else 0)
+        return 8 * self.n_obj * size * (2 if std else 1)
+
+    def get_state(self):
+        '''
+        Get the internal state of the surrogate model that needs to persist across optimization iterations.
+
+        Returns
+        -------
+        state: dict
+            The internal state (should be picklable).
+        '''
+        return {}
+
+    def set_state(self, state):
+        '''
+        Restore the internal state of the surrogate model from previous optimization iterations.
+
+        Parameters
+        ----------
+        state: dict
+            The internal state returned by get_state().
+        '''
+        pass
+
     def predict(self, X, dtype='raw', std=False):
         '''
         '''
@@ -4,8 +4,9 @@ Bayesian neural network surrogate model.
 
 import numpy as np
 import torch
+from multiprocess import cpu_count
 
-from autooed.mobo.surrogate_model.nn import NeuralNetwork, jacobian, hessian
+from autooed.mobo.surrogate_model.nn import NeuralNetwork, batch_jacobian, batch_hessian
 
 
 class BayesianRegression:
@@ -102,7 +103,8 @@ class BayesianNeuralNetwork(NeuralNetwork):
         Scalable Bayesian Optimization Using Deep Neural Networks
         Proc. of ICML'15
     '''
-    def __init__(self, problem, hidden_size=50, hidden_layers=3, activation='tanh', lr=1e-3, weight_decay=1e-4, n_epoch=100, **kwargs):
+    def __init__(self, problem, hidden_size=50, hidden_layers=3, activation='tanh', lr=1e-3, weight_decay=1e-4, n_epoch=100, 
+        multi_head=False, batch_size=256, val_ratio=0.0, patience=10, n_process=cpu_count(), max_memory_mb=1024, cache_size=10000, cache_memory_mb=64, **kwargs):
         '''
         Initialize a Bayesian neural network as surrogate model.
 
@@ -121,19 +123,43 @@ class BayesianNeuralNetwork(NeuralNetwork):
         weight_decay: float
             Weight decay.
         n_epoch: int
-            Number of training epochs.
+            Maximum number of training epochs.
+        multi_head: bool
+            Whether to train a single network with shared hidden layers and a linear output head for each objective,
+            instead of a separate network for each objective.
+        batch_size: int
+            Size of mini-batches.
+        val_ratio: float
+            Ratio of data held out for early stopping, 0 to disable early stopping (also disabled if fewer than MIN_N_VAL data would be held out).
+        patience: int
+            Number of epochs without improvement of held-out loss before early stopping.
+        n_process: int
+            Number of processes for training networks of different objectives in parallel.
+        max_memory_mb: int
+            Memory budget (in MB) of evaluation, large sets of design variables are evaluated in chunks within the budget.
+        cache_size: int
+            Maximum number of design variables whose evaluation results are cached until the next fit, 0 to disable caching.
+        cache_memory_mb: int
+            Memory budget (in MB) of cached evaluation results, separate from the evaluation budget max_memory_mb.
         '''
-        super().__init__(problem, hidden_size, hidden_layers, activation, lr, weight_decay, n_epoch)
+        super().__init__(problem, hidden_size, hidden_layers, activation, lr, weight_decay, n_epoch, 
+            multi_head, batch_size, val_ratio, patience, n_process, max_memory_mb, cache_size, cache_memory_mb)
 
-        self.regressor = [BayesianRegression()] * self.n_obj
+        self.regressor = [BayesianRegression() for _ in range(self.n_obj)]
 
     def _fit(self, X, Y):
         super()._fit(X, Y)
         
+        # basis functions change after training, so the regressors are fitted from the prior
+        self.regressor = [BayesianRegression() for _ in range(self.n_obj)]
         for i in range(self.n_obj):
-            phi = self.net[i].basis_func(torch.FloatTensor(X)).data.numpy()
+            phi = self._basis_func(torch.FloatTensor(X), i).data.numpy()
             self.regressor[i].fit(phi, Y[:, i])
     
+    def _forward_objective(self, X, i):
+        # predictive mean of the bayesian regression on the basis functions
+        return torch.matmul(self._basis_func(X, i), torch.FloatTensor(self.regressor[i].w_mean)).unsqueeze(1)
+
     def _evaluate(self, X, std, gradient, hessian):
         F, dF, hF = [], [], [] # mean
         S, dS, hS = [], [], [] # std
@@ -143,7 +169,7 @@ class BayesianNeuralNetwork(NeuralNetwork):
 
         for i in range(self.n_obj):
 
-            phi = self.net[i].basis_func(X)
+            phi = self._basis_func(X, i)
 
             w_mean = torch.FloatTensor(self.regressor[i].w_mean)
             w_cov = torch.FloatTensor(self.regressor[i].w_cov)
@@ -160,19 +186,19 @@ class BayesianNeuralNetwork(NeuralNetwork):
             if not (gradient or hessian): continue
 
             if gradient:
-                dy_mean = jacobian(y_mean, X)
+                dy_mean = batch_jacobian(y_mean, X)
                 dF.append(dy_mean.numpy())
 
                 if std:
-                    dy_std = jacobian(y_std, X)
+                    dy_std = batch_jacobian(y_std, X)
                     dS.append(dy_std.numpy())
 
             if hessian:
-                hy_mean = hessian(y_mean, X)
+                hy_mean = batch_hessian(y_mean, X)
                 hF.append(hy_mean.numpy())
 
                 if std:
-                    hy_std = hessian(y_std, X)
+                    hy_std = batch_hessian(y_std, X)
                     hS.append(hy_std.numpy())
         
         F = np.stack(F, axis=1)
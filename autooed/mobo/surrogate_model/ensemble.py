@@ -0,0 +1,103 @@
+'''
+Deep ensemble surrogate model.
+'''
+
+import torch
+from multiprocess import cpu_count
+
+from autooed.mobo.surrogate_model.nn import NeuralNetwork, MLP, batch_jacobian, batch_hessian
+
+
+class DeepEnsemble(NeuralNetwork):
+    '''
+    Simple and Scalable Predictive Uncertainty Estimation using Deep Ensembles [1]: 
+    an ensemble of randomly initialized neural networks trained in parallel processes, 
+    where the predictive mean and standard deviation come from the spread of ensemble members.
+
+    [1] B. Lakshminarayanan, A. Pritzel, C. Blundell.
+        Simple and Scalable Predictive Uncertainty Estimation using Deep Ensembles
+        Proc. of NeurIPS'17
+    '''
+    def __init__(self, problem, n_member=5, hidden_size=50, hidden_layers=3, activation='tanh', lr=1e-3, weight_decay=1e-4, n_epoch=100, 
+        batch_size=256, val_ratio=0.0, patience=10, n_process=cpu_count(), max_memory_mb=1024, cache_size=10000, cache_memory_mb=64, **kwargs):
+        '''
+        Initialize a deep ensemble as surrogate model.
+
+        Parameters
+        ----------
+        problem: autooed.problem.Problem
+            The optimization problem.
+        n_member: int
+            Number of neural networks in the ensemble.
+        hidden_size: int
+            Size of the hidden layer of the neural networks.
+        hidden_layers: int
+            Number of hidden layers of the neural networks.
+        activation: str
+            Type of activation function.
+        lr: float
+            Learning rate.
+        weight_decay: float
+            Weight decay.
+        n_epoch: int
+            Maximum number of training epochs.
+        batch_size: int
+            Size of mini-batches.
+        val_ratio: float
+            Ratio of data held out for early stopping, 0 to disable early stopping (also disabled if fewer than MIN_N_VAL data would be held out).
+        patience: int
+            Number of epochs without improvement of held-out loss before early stopping.
+        n_process: int
+            Number of processes for training ensemble members in parallel.
+        max_memory_mb: int
+            Memory budget (in MB) of evaluation, large sets of design variables are evaluated in chunks within the budget.
+        cache_size: int
+            Maximum number of design variables whose evaluation results are cached until the next fit, 0 to disable caching.
+        cache_memory_mb: int
+            Memory budget (in MB) of cached evaluation results, separate from the evaluation budget max_memory_mb.
+        '''
+        super().__init__(problem, hidden_size, hidden_layers, activation, lr, weight_decay, n_epoch, 
+            True, batch_size, val_ratio, patience, n_process, max_memory_mb, cache_size, cache_memory_mb)
+
+        # each member is a multi-head network predicting all objectives
+        self.net = [MLP(n_in=self.n_var, n_out=self.n_obj, hidden_sizes=(hidden_size,) * hidden_layers, activation=activation) for _ in range(n_member)]
+        self.optimizer_state = [None] * n_member
+
+    def _get_targets(self, Y):
+        return [Y] * len(self.net)
+
+    def _forward_members(self, X):
+        '''
+        Predict the objective values of all ensemble members in a single batched forward pass, shape (n_member, N, n_obj).
+        '''
+        n_layer = len(self.net[0].fc)
+        h = X.expand(len(self.net), *X.shape) # h: shape (n_member, N, n_var)
+        for i in range(n_layer):
+            W = torch.stack([net.fc[i].weight for net in self.net]) # W: shape (n_member, n_out, n_in)
+            b = torch.stack([net.fc[i].bias for net in self.net]).unsqueeze(1) # b: shape (n_member, 1, n_out)
+            h = torch.baddbmm(b, h, W.transpose(1, 2))
+            if i < n_layer - 1:
+                h = self.net[0].ac(h)
+        return h
+
+    def _forward_objective(self, X, i):
+        return self._forward_members(X)[:, :, i:i + 1].mean(dim=0)
+
+    def _evaluate(self, X, std, gradient, hessian):
+        X = torch.FloatTensor(X)
+        X.requires_grad = True
+
+        F_members = self._forward_members(X)
+        F = F_members.mean(dim=0)
+        S = F_members.std(dim=0, unbiased=False)
+
+        dF = batch_jacobian(F, X).numpy() if gradient else None
+        hF = batch_hessian(F, X).numpy() if hessian else None
+        dS = batch_jacobian(S, X).numpy() if std and gradient else None
+        hS = batch_hessian(S, X).numpy() if std and hessian else None
+
+        F = F.detach().numpy()
+        S = S.detach().numpy() if std else None
+
+        out = {'F': F, 'dF': dF, 'hF': hF, 'S': S, 'dS': dS, 'hS': hS}
+        return out
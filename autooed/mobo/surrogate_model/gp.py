@@ -4,22 +4,25 @@ Gaussian process surrogate model.
 
 import numpy as np
 import math
+import torch
 from sklearn.gaussian_process import GaussianProcessRegressor
 from sklearn.gaussian_process.kernels import RBF, ConstantKernel
 from sklearn.gaussian_process.kernels import Matern as MaternKernel, _check_length_scale
 from sklearn.utils.optimize import _check_optimize_result
 from scipy.optimize import minimize
-from scipy.linalg import solve_triangular
+from scipy.linalg import solve_triangular, cholesky, cho_solve
 from scipy.spatial.distance import pdist, cdist, squareform
 from scipy.special import kv, gamma
+from multiprocess import cpu_count
 
 from autooed.mobo.surrogate_model.base import SurrogateModel
 from autooed.utils.operand import safe_divide
+from autooed.utils.parallel import process_map, thread_map
 
 
 class Matern(MaternKernel):
     '''
-    Customized version of Matern kernel to avoid numerical error.
+    Customized version of Matern kernel to avoid numerical error, with closed-form hyperparameter gradients for any nu.
     '''
     def __call__(self, X, Y=None, eval_gradient=False):
         X = np.atleast_2d(X)
@@ -42,7 +45,7 @@ class Matern(MaternKernel):
             K = dists * math.sqrt(5)
             K = (1. + K + K ** 2 / 3.0) * np.exp(-K)
         else:  # general case; expensive to evaluate
-            K = dists
+            K = dists.copy()
             K[K == 0.0] += np.finfo(float).eps  # strict zeros result in nan
             tmp = (math.sqrt(2 * self.nu) * K)
             K.fill((2 ** (1. - self.nu)) / gamma(self.nu))
@@ -60,33 +63,32 @@ class Matern(MaternKernel):
                 K_gradient = np.empty((X.shape[0], X.shape[0], 0))
                 return K, K_gradient
 
-            # We need to recompute the pairwise dimension-wise distances
-            if self.anisotropic:
-                D = (X[:, np.newaxis, :] - X[np.newaxis, :, :])**2 \
-                    / (length_scale ** 2)
-            else:
-                D = squareform(dists**2)[:, :, np.newaxis]
-
+            # gradient w.r.t. the log length scale of each dimension is G * D,
+            # where D is the squared scaled distance along that dimension
             if self.nu == 0.5:
-                K_gradient = safe_divide(K[..., np.newaxis] * D,
-                    np.sqrt(D.sum(2))[:, :, np.newaxis])
-                K_gradient[~np.isfinite(K_gradient)] = 0
+                G = safe_divide(np.exp(-dists), dists)
             elif self.nu == 1.5:
-                K_gradient = \
-                    3 * D * np.exp(-np.sqrt(3 * D.sum(-1)))[..., np.newaxis]
+                G = 3 * np.exp(-math.sqrt(3) * dists)
             elif self.nu == 2.5:
-                tmp = np.sqrt(5 * D.sum(-1))[..., np.newaxis]
-                K_gradient = 5.0 / 3.0 * D * (tmp + 1) * np.exp(-tmp)
+                tmp = math.sqrt(5) * dists
+                G = 5.0 / 3.0 * (1 + tmp) * np.exp(-tmp)
             else:
-                # approximate gradient numerically
-                def f(theta):  # helper function
-                    return self.clone_with_theta(theta)(X, Y)
-                return K, _approx_fprime(self.theta, f, 1e-10)
+                # d/dz (z^nu * K_nu(z)) = -z^nu * K_(nu-1)(z), gradient vanishes at zero distance
+                tmp = math.sqrt(2 * self.nu) * dists
+                nonzero = tmp > 0
+                G = np.zeros_like(dists)
+                G[nonzero] = 2 * self.nu * (2 ** (1. - self.nu)) / gamma(self.nu) * \
+                    tmp[nonzero] ** (self.nu - 1) * kv(self.nu - 1, tmp[nonzero])
+            G = squareform(G)
 
             if not self.anisotropic:
-                return K, K_gradient[:, :].sum(-1)[:, :, np.newaxis]
-            else:
-                return K, K_gradient
+                return K, (G * squareform(dists ** 2))[:, :, np.newaxis]
+
+            # fill the gradient dimension by dimension to avoid temporaries of shape (n, n, n_var)
+            K_gradient = np.empty((X.shape[0], X.shape[0], X.shape[1]))
+            for i in range(X.shape[1]):
+                K_gradient[:, :, i] = G * squareform(pdist(X[:, i:i + 1] / length_scale[i], metric='sqeuclidean'))
+            return K, K_gradient
         else:
             return K
 
@@ -101,11 +103,215 @@ def constrained_optimization(obj_func, initial_theta, bounds):
     return opt_res.x, opt_res.fun
 
 
+class RestartedOptimization:
+    '''
+    Constrained optimization with additional random restarts running in parallel processes, the best optimum is kept.
+    '''
+    def __init__(self, n_restarts=0, n_process=1):
+        '''
+        Parameters
+        ----------
+        n_restarts: int
+            Number of random restarts besides the optimization from the initial theta.
+        n_process: int
+            Number of processes for running the restarts in parallel.
+        '''
+        self.n_restarts = n_restarts
+        self.n_process = n_process
+
+    def __call__(self, obj_func, initial_theta, bounds):
+        thetas = [initial_theta] + [np.random.uniform(bounds[:, 0], bounds[:, 1]) for _ in range(self.n_restarts)]
+        args = [(obj_func, theta, bounds) for theta in thetas]
+        results = process_map(constrained_optimization, args, self.n_process)
+        return min(results, key=lambda result: result[1])
+
+
+def match_rows(X_prev, X):
+    '''
+    Find the row indices of X_prev in X, return None if any row of X_prev is missing in X.
+    '''
+    row_map = {}
+    for i, x in enumerate(X):
+        row_map.setdefault(x.tobytes(), []).append(i)
+
+    indices = []
+    for x in X_prev:
+        candidates = row_map.get(x.tobytes())
+        if not candidates:
+            return None
+        indices.append(candidates.pop(0))
+    return np.array(indices, dtype=int)
+
+
+def cholesky_append(L, K_cross, K_new):
+    '''
+    Extend the lower Cholesky factor L of K to the Cholesky factor of [[K, K_cross], [K_cross.T, K_new]] by a block (rank-k) update.
+
+    Parameters
+    ----------
+    L: np.array
+        Lower Cholesky factor of the previous kernel matrix, shape (n, n).
+    K_cross: np.array
+        Kernel matrix between previous and new data, shape (n, k).
+    K_new: np.array
+        Kernel matrix of new data, shape (k, k).
+
+    Returns
+    -------
+    L_new: np.array
+        Lower Cholesky factor of the extended kernel matrix, shape (n + k, n + k).
+    '''
+    n, k = K_cross.shape
+    B = solve_triangular(L, K_cross, lower=True)
+    C = cholesky(K_new - B.T @ B, lower=True)
+    L_new = np.zeros((n + k, n + k))
+    L_new[:n, :n] = L
+    L_new[n:, :n] = B.T
+    L_new[n:, n:] = C
+    return L_new
+
+
+def fit_fixed(gp, X, y, theta):
+    '''
+    Condition a Gaussian process on data with fixed kernel hyperparameters. 
+    If the previous training data is a subset of the current data, the previous Cholesky factor is extended by a block update,
+    otherwise the Cholesky factor is recomputed from scratch.
+
+    Parameters
+    ----------
+    gp: sklearn.gaussian_process.GaussianProcessRegressor
+        The Gaussian process to condition.
+    X: np.array
+        Input design variables (normalized, continuous).
+    y: np.array
+        Input objective values of a single objective (normalized).
+    theta: np.array
+        Fixed kernel hyperparameters (log-transformed).
+
+    Returns
+    -------
+    lml: float
+        Log marginal likelihood per sample under the fixed hyperparameters.
+    '''
+    prev_indices = None
+    if hasattr(gp, 'kernel_') and np.array_equal(gp.kernel_.theta, theta):
+        prev_indices = match_rows(gp.X_train_, X)
+    else:
+        gp.kernel_ = gp.kernel.clone_with_theta(theta)
+
+    try:
+        if prev_indices is None:
+            K = gp.kernel_(X)
+            K[np.diag_indices_from(K)] += gp.alpha
+            L = cholesky(K, lower=True)
+        else:
+            new_indices = np.setdiff1d(np.arange(len(X)), prev_indices)
+            order = np.concatenate([prev_indices, new_indices])
+            X, y = X[order], y[order]
+            X_new = X[len(prev_indices):]
+            if len(X_new) > 0:
+                K_new = gp.kernel_(X_new)
+                K_new[np.diag_indices_from(K_new)] += gp.alpha
+                L = cholesky_append(gp.L_, gp.kernel_(gp.X_train_, X_new), K_new)
+            else:
+                L = gp.L_
+    except np.linalg.LinAlgError:
+        return -np.inf
+
+    gp.X_train_, gp.y_train_ = np.copy(X), np.copy(y)
+    gp._y_train_mean, gp._y_train_std = np.zeros(1), 1.0
+    gp.L_ = L
+    gp.alpha_ = cho_solve((L, True), y)
+    gp.log_marginal_likelihood_value_ = -0.5 * y.dot(gp.alpha_) - np.log(np.diag(L)).sum() - 0.5 * len(X) * np.log(2 * np.pi)
+    return gp.log_marginal_likelihood_value_ / len(X)
+
+
+def fit_gp(gp, X, y, theta, lml, optimize, refit_tol):
+    '''
+    Fit a Gaussian process, either by full hyperparameter optimization or by conditioning on data with fixed hyperparameters.
+
+    Parameters
+    ----------
+    gp: sklearn.gaussian_process.GaussianProcessRegressor
+        The Gaussian process to fit.
+    X: np.array
+        Input design variables (normalized, continuous).
+    y: np.array
+        Input objective values of a single objective (normalized).
+    theta: np.array
+        Kernel hyperparameters from the last full optimization (None if not optimized before).
+    lml: float
+        Log marginal likelihood per sample right after the last full optimization.
+    optimize: bool
+        Whether to run full hyperparameter optimization.
+    refit_tol: float
+        Tolerance of the drop of log marginal likelihood (per sample) under fixed hyperparameters before forcing a full hyperparameter optimization.
+
+    Returns
+    -------
+    gp: sklearn.gaussian_process.GaussianProcessRegressor
+        The fitted Gaussian process.
+    theta: np.array
+        Kernel hyperparameters from the last full optimization.
+    lml: float
+        Log marginal likelihood per sample right after the last full optimization.
+    '''
+    if not optimize and theta is not None:
+        if lml - fit_fixed(gp, X, y, theta) <= refit_tol:
+            return gp, theta, lml
+
+    # warm start from the last optimized hyperparameters
+    if theta is not None:
+        gp.kernel = gp.kernel.clone_with_theta(theta)
+
+    gp.fit(X, y)
+    return gp, gp.kernel_.theta.copy(), gp.log_marginal_likelihood_value_ / len(X)
+
+
+def stationary_kernel(theta, nu, X1, X2, lib=np):
+    '''
+    Evaluate the kernel c1 * k(||(x1 - x2) / ell||) + c2 of the Gaussian process between batched inputs, by numpy or torch,
+    where the distance has zero gradient at zero (instead of nan) such that the kernel is differentiable by torch autograd.
+
+    Parameters
+    ----------
+    theta: np.array
+        Kernel hyperparameters (log-transformed), in the order of c1, length scales and c2.
+    nu: int
+        The parameter nu controlling the type of the Matern kernel. Choices are 1, 3, 5 and -1 (RBF).
+    X1: np.array or torch.Tensor
+        Input design variables (normalized, continuous), shape (..., n1, n_var).
+    X2: np.array or torch.Tensor
+        Input design variables (normalized, continuous), shape (..., n2, n_var).
+    lib: module
+        Array library of the inputs, numpy or torch.
+
+    Returns
+    -------
+    K: np.array or torch.Tensor
+        Kernel matrices, shape (..., n1, n2).
+    '''
+    c1, ell, c2 = np.exp(theta[0]), lib.asarray(np.exp(theta[1:-1])), np.exp(theta[-1])
+    d2 = (((X1[..., :, None, :] - X2[..., None, :, :]) / ell) ** 2).sum(-1)
+    nonzero = d2 > 0
+    d = lib.sqrt(lib.where(nonzero, d2, lib.ones_like(d2))) * nonzero
+
+    if nu == 1:
+        k = lib.exp(-d)
+    elif nu == 3:
+        k = (1 + np.sqrt(3) * d) * lib.exp(-np.sqrt(3) * d)
+    elif nu == 5:
+        k = (1 + np.sqrt(5) * d + 5. / 3 * d2) * lib.exp(-np.sqrt(5) * d)
+    else: # RBF
+        k = lib.exp(-0.5 * d2)
+    return c1 * k + c2
+
+
 class GaussianProcess(SurrogateModel):
     '''
     Gaussian process.
     '''
-    def __init__(self, problem, nu=1, **kwargs):
+    def __init__(self, problem, nu=1, refit_interval=1, refit_tol=0.1, n_restarts=0, n_process=cpu_count(), max_memory_mb=1024, cache_size=10000, cache_memory_mb=64, **kwargs):
         '''
         Initialize a Gaussian process.
 
@@ -115,10 +321,30 @@ class GaussianProcess(SurrogateModel):
             The optimization problem.
         nu: int
             The parameter nu controlling the type of the Matern kernel. Choices are 1, 3, 5 and -1.
+        refit_interval: int
+            Number of fits between two full hyperparameter optimizations, in between the fitted hyperparameters are kept fixed 
+            and the Cholesky factor is extended incrementally with the new data (also across rebuilt models through get_state() and set_state()).
+        refit_tol: float
+            Tolerance of the drop of log marginal likelihood (per sample) under fixed hyperparameters before forcing a full hyperparameter optimization.
+        n_restarts: int
+            Number of random restarts of the hyperparameter optimization, besides the one warm-started from the last optimum.
+        n_process: int
+            Number of processes for fitting objectives and running the random restarts in parallel.
+        max_memory_mb: int
+            Memory budget (in MB) of evaluation, large sets of design variables are evaluated in chunks within the budget.
+        cache_size: int
+            Maximum number of design variables whose evaluation results are cached until the next fit, 0 to disable caching.
+        cache_memory_mb: int
+            Memory budget (in MB) of cached evaluation results, separate from the evaluation budget max_memory_mb.
         '''
-        super().__init__(problem)
+        super().__init__(problem, n_process, max_memory_mb, cache_size, cache_memory_mb)
         
         self.nu = nu
+        self.refit_interval = refit_interval
+        self.refit_tol = refit_tol
+        self.n_fit = 0 # number of fits so far
+        self.thetas = [None] * self.n_obj # hyperparameters from the last full optimization
+        self.lmls = [None] * self.n_obj # log marginal likelihood per sample right after the last full optimization
         self.gps = []
 
         for _ in range(self.n_obj):
@@ -131,115 +357,217 @@ class GaussianProcess(SurrogateModel):
                 main_kernel + \
                 ConstantKernel(constant_value=1e-2, constant_value_bounds=(np.exp(-6), np.exp(0)))
             
-            gp = GaussianProcessRegressor(kernel=kernel, optimizer=constrained_optimization)
+            gp = GaussianProcessRegressor(kernel=kernel, optimizer=RestartedOptimization(n_restarts, n_process))
             self.gps.append(gp)
 
     def _fit(self, X, Y):
-        for i, gp in enumerate(self.gps):
-            gp.fit(X, Y[:, i])
-        
-    def _evaluate(self, X, std, gradient, hessian):
-        F, dF, hF = [], [], [] # mean
-        S, dS, hS = [], [], [] # std
+        optimize = self.n_fit % self.refit_interval == 0
 
-        for gp in self.gps:
+        # fit objectives in parallel processes only when hyperparameter optimization is needed
+        n_process = self.n_process if optimize else 1
+        args = [(gp, X, Y[:, i], self.thetas[i], self.lmls[i], optimize, self.refit_tol) for i, gp in enumerate(self.gps)]
+        results = process_map(fit_gp, args, n_process)
+        self.gps, self.thetas, self.lmls = map(list, zip(*results))
 
-            # mean
-            K = gp.kernel_(X, gp.X_train_) # K: shape (N, N_train)
-            y_mean = K.dot(gp.alpha_)
-            
-            F.append(y_mean) # y_mean: shape (N,)
+        self.n_fit += 1
 
-            if std:
-                if gp._K_inv is None:
-                    L_inv = solve_triangular(gp.L_.T,
-                                                np.eye(gp.L_.shape[0]))
-                    gp._K_inv = L_inv.dot(L_inv.T)
+    def _fit_fantasy(self, X, Y):
+        # the sparse posterior cannot be extended, fall back to refitting
+        if any(gp.L_ is None for gp in self.gps):
+            return super()._fit_fantasy(X, Y)
+
+        # extend the Cholesky factors with fixed hyperparameters, without any hyperparameter optimization
+        Ls = []
+        for gp in self.gps:
+            K_new = gp.kernel_(X)
+            K_new[np.diag_indices_from(K_new)] += gp.alpha
+            try:
+                Ls.append(cholesky_append(gp.L_, gp.kernel_(gp.X_train_, X), K_new))
+            except np.linalg.LinAlgError: # e.g., fantasized data duplicates the training data
+                return super()._fit_fantasy(X, Y)
+
+        for i, (gp, L) in enumerate(zip(self.gps, Ls)):
+            gp.X_train_, gp.y_train_ = np.vstack([gp.X_train_, X]), np.concatenate([gp.y_train_, Y[:, i]])
+            gp.L_ = L
+            gp.alpha_ = cho_solve((L, True), gp.y_train_)
+
+    def get_state(self):
+        # the conditioned training data and Cholesky factors are kept only if the next fit is with fixed hyperparameters,
+        # such that it can extend the factors incrementally even when the Gaussian processes are rebuilt
+        # (otherwise the factors are recomputed by the hyperparameter optimization and not worth storing)
+        fitted = all(hasattr(gp, 'kernel_') and getattr(gp, 'L_', None) is not None for gp in self.gps)
+        reused = self.refit_interval > 1 and self.n_fit % self.refit_interval != 0
+        return {
+            'nu': self.nu,
+            'n_fit': self.n_fit,
+            'thetas': [None if theta is None else theta.copy() for theta in self.thetas],
+            'lmls': list(self.lmls),
+            'posteriors': [{
+                'theta': gp.kernel_.theta.copy(),
+                'X_train': gp.X_train_.copy(),
+                'y_train': gp.y_train_.copy(),
+                'L': gp.L_.copy(),
+            } for gp in self.gps] if fitted and reused else None,
+        }
+
+    def set_state(self, state):
+        if state.get('nu') != self.nu or len(state.get('thetas', [])) != self.n_obj: return
+        for theta, gp in zip(state['thetas'], self.gps):
+            if theta is not None and len(theta) != gp.kernel.n_dims: return
+        self.n_fit = state['n_fit']
+        self.thetas = [None if theta is None else np.array(theta) for theta in state['thetas']]
+        self.lmls = list(state['lmls'])
+
+        posteriors = state.get('posteriors')
+        if posteriors is None or len(posteriors) != self.n_obj: return
+        for posterior, gp in zip(posteriors, self.gps):
+            if len(posterior['theta']) != gp.kernel.n_dims or posterior['X_train'].shape[1] != self.n_var: return
+        for posterior, gp in zip(posteriors, self.gps):
+            gp.kernel_ = gp.kernel.clone_with_theta(posterior['theta'])
+            gp.X_train_, gp.y_train_ = np.array(posterior['X_train']), np.array(posterior['y_train'])
+            gp._y_train_mean, gp._y_train_std = np.zeros(1), 1.0
+            gp.L_ = np.array(posterior['L'])
+            gp.alpha_ = cho_solve((gp.L_, True), gp.y_train_)
+
+    def _project(self, gp, K):
+        '''
+        Project kernel columns by the inverse Cholesky factor of the training kernel matrix, 
+        such that the posterior variance reduction is the squared norm of the projection.
+
+        Parameters
+        ----------
+        gp: sklearn.gaussian_process.GaussianProcessRegressor
+            The fitted Gaussian process.
+        K: np.array
+            Kernel matrix between training data and query points, shape (N_train, ...).
+
+        Returns
+        -------
+        np.array
+            The projected kernel matrix L^-1 @ K, same shape as K.
+        '''
+        return solve_triangular(gp.L_, K, lower=True, check_finite=False)
 
-                y_var = gp.kernel_.diag(X)
-                y_var -= np.einsum("ij,ij->i",
-                                    np.dot(K, gp._K_inv), K)
+    def _project_torch(self, gp, K):
+        '''
+        Differentiable version of _project() for torch tensors.
 
-                y_var_negative = y_var < 0
-                if np.any(y_var_negative):
-                    y_var[y_var_negative] = 0.0
+        Parameters
+        ----------
+        gp: sklearn.gaussian_process.GaussianProcessRegressor
+            The fitted Gaussian process.
+        K: torch.tensor
+            Kernel matrix between training data and query points, shape (N_train, N).
+
+        Returns
+        -------
+        torch.tensor
+            The projected kernel matrix L^-1 @ K, same shape as K.
+        '''
+        return torch.linalg.solve_triangular(torch.from_numpy(gp.L_), K, upper=False)
 
-                y_std = np.sqrt(y_var)
+    def _evaluate_single(self, gp, X, std, gradient, hessian):
+        '''
+        Predict the performance of a single objective given a set of normalized and continuous design variables.
 
-                S.append(y_std) # y_std: shape (N,)
+        Returns
+        -------
+        y_mean, dy_mean, hy_mean, y_std, dy_std, hy_std: np.array
+            Mean, std and their derivatives of a single objective, None if not requested.
+        '''
+        y_std, dy_mean, hy_mean, dy_std, hy_std = None, None, None, None, None
 
-            if not (gradient or hessian): continue
+        # mean
+        K = gp.kernel_(X, gp.X_train_) # K: shape (N, N_train)
+        y_mean = K.dot(gp.alpha_) # y_mean: shape (N,)
+        
+        if std:
+            V = self._project(gp, K.T) # V: shape (N_train, N)
+            y_var = gp.kernel_.diag(X) - np.sum(V ** 2, axis=0)
+            y_var = np.maximum(y_var, 0) # y_var: shape (N,)
+            y_std = np.sqrt(y_var) # y_std: shape (N,)
+
+        if not (gradient or hessian):
+            return y_mean, None, None, y_std, None, None
+
+        ell = np.exp(gp.kernel_.theta[1:-1]) # ell: shape (n_var,)
+        sf2 = np.exp(gp.kernel_.theta[0]) # sf2: shape (1,)
+        d = np.expand_dims(cdist(X / ell, gp.X_train_ / ell), 2) # d: shape (N, N_train, 1)
+        X_, X_train_ = np.expand_dims(X, 1), np.expand_dims(gp.X_train_, 0)
+        dd_N = X_ - X_train_ # numerator
+        dd_D = d * ell ** 2 # denominator
+        dd = safe_divide(dd_N, dd_D) # dd: shape (N, N_train, n_var)
+
+        if self.nu == 1:
+            dK = -sf2 * np.exp(-d) * dd
+
+        elif self.nu == 3:
+            dK = -3 * sf2 * np.exp(-np.sqrt(3) * d) * d * dd
+
+        elif self.nu == 5:
+            dK = -5. / 3 * sf2 * np.exp(-np.sqrt(5) * d) * (1 + np.sqrt(5) * d) * d * dd
+
+        else: # RBF
+            dK = -sf2 * np.exp(-0.5 * d ** 2) * d * dd
+
+        dK_T = dK.transpose(0, 2, 1) # dK: shape (N, N_train, n_var), dK_T: shape (N, n_var, N_train)
+
+        if std:
+            # reuse the triangular solves of kernel derivatives for both gradient and hessian of std
+            dK_ = dK.transpose(1, 0, 2) # dK_: shape (N_train, N, n_var)
+            dV = self._project(gp, dK_.reshape(len(dK_), -1)).reshape(dK_.shape) # dV: shape (N_train, N, n_var)
+            dy_var = -2 * np.einsum('ji,jik->ik', V, dV) # dy_var: shape (N, n_var)
+            dy_std = 0.5 * safe_divide(dy_var, np.expand_dims(y_std, 1)) # dy_std: shape (N, n_var)
+            
+        if gradient:
+            dy_mean = dK_T @ gp.alpha_ # gp.alpha_: shape (N_train,), dy_mean: shape (N, n_var)
 
-            ell = np.exp(gp.kernel_.theta[1:-1]) # ell: shape (n_var,)
-            sf2 = np.exp(gp.kernel_.theta[0]) # sf2: shape (1,)
-            d = np.expand_dims(cdist(X / ell, gp.X_train_ / ell), 2) # d: shape (N, N_train, 1)
-            X_, X_train_ = np.expand_dims(X, 1), np.expand_dims(gp.X_train_, 0)
-            dd_N = X_ - X_train_ # numerator
-            dd_D = d * ell ** 2 # denominator
-            dd = safe_divide(dd_N, dd_D) # dd: shape (N, N_train, n_var)
+        if hessian:
+            d = np.expand_dims(d, 3) # d: shape (N, N_train, 1, 1)
+            dd2 = np.expand_dims(dd, 3) * np.expand_dims(dd, 2) # dd2: shape (N, N_train, n_var, n_var)
+            dd = np.expand_dims(dd, 2) # dd: shape (N, N_train, 1, n_var)
+            hd_N = d * np.expand_dims(np.eye(len(ell)), (0, 1)) - np.expand_dims(X_ - X_train_, 3) * dd # numerator
+            hd_D = d ** 2 * np.expand_dims(ell ** 2, (0, 1, 3)) # denominator
+            hd = safe_divide(hd_N, hd_D) # hd: shape (N, N_train, n_var, n_var)
 
             if self.nu == 1:
-                dK = -sf2 * np.exp(-d) * dd
+                hK = -sf2 * np.exp(-d) * (hd - dd2)
 
             elif self.nu == 3:
-                dK = -3 * sf2 * np.exp(-np.sqrt(3) * d) * d * dd
+                hK = -3 * sf2 * np.exp(-np.sqrt(3) * d) * (d * hd + (1 - np.sqrt(3) * d) * dd2)
 
             elif self.nu == 5:
-                dK = -5. / 3 * sf2 * np.exp(-np.sqrt(5) * d) * (1 + np.sqrt(5) * d) * d * dd
+                hK = -5. / 3 * sf2 * np.exp(-np.sqrt(5) * d) * (-5 * d ** 2 * dd2 + (1 + np.sqrt(5) * d) * (dd2 + d * hd))
 
             else: # RBF
-                dK = -sf2 * np.exp(-0.5 * d ** 2) * d * dd
-
-            dK_T = dK.transpose(0, 2, 1) # dK: shape (N, N_train, n_var), dK_T: shape (N, n_var, N_train)
-                
-            if gradient:
-                dy_mean = dK_T @ gp.alpha_ # gp.alpha_: shape (N_train,)
-                dF.append(dy_mean) # dy_mean: shape (N, n_var)
-
-                # TODO: check
-                if std:
-                    K = np.expand_dims(K, 1) # K: shape (N, 1, N_train)
-                    K_Ki = K @ gp._K_inv # gp._K_inv: shape (N_train, N_train), K_Ki: shape (N, 1, N_train)
-                    dK_Ki = dK_T @ gp._K_inv # dK_Ki: shape (N, n_var, N_train)
-
-                    dy_var = -np.sum(dK_Ki * K + K_Ki * dK_T, axis=2) # dy_var: shape (N, n_var)
-                    dy_std = 0.5 * safe_divide(dy_var, y_std) # dy_std: shape (N, n_var)
-                    dS.append(dy_std)
-
-            if hessian:
-                d = np.expand_dims(d, 3) # d: shape (N, N_train, 1, 1)
-                dd = np.expand_dims(dd, 2) # dd: shape (N, N_train, 1, n_var)
-                hd_N = d * np.expand_dims(np.eye(len(ell)), (0, 1)) - np.expand_dims(X_ - X_train_, 3) * dd # numerator
-                hd_D = d ** 2 * np.expand_dims(ell ** 2, (0, 1, 3)) # denominator
-                hd = safe_divide(hd_N, hd_D) # hd: shape (N, N_train, n_var, n_var)
+                hK = -sf2 * np.exp(-0.5 * d ** 2) * ((1 - d ** 2) * dd2 + d * hd)
 
-                if self.nu == 1:
-                    hK = -sf2 * np.exp(-d) * (hd - dd ** 2)
+            hK_T = hK.transpose(0, 2, 3, 1) # hK: shape (N, N_train, n_var, n_var), hK_T: shape (N, n_var, n_var, N_train)
 
-                elif self.nu == 3:
-                    hK = -3 * sf2 * np.exp(-np.sqrt(3) * d) * (d * hd + (1 - np.sqrt(3) * d) * dd ** 2)
+            hy_mean = hK_T @ gp.alpha_ # hy_mean: shape (N, n_var, n_var)
 
-                elif self.nu == 5:
-                    hK = -5. / 3 * sf2 * np.exp(-np.sqrt(5) * d) * (-5 * d ** 2 * dd ** 2 + (1 + np.sqrt(5) * d) * (dd ** 2 + d * hd))
-
-                else: # RBF
-                    hK = -sf2 * np.exp(-0.5 * d ** 2) * ((1 - d ** 2) * dd ** 2 + d * hd)
-
-                hK_T = hK.transpose(0, 2, 3, 1) # hK: shape (N, N_train, n_var, n_var), hK_T: shape (N, n_var, n_var, N_train)
+            if std:
+                hK_ = hK.transpose(1, 0, 2, 3) # hK_: shape (N_train, N, n_var, n_var)
+                hV = self._project(gp, hK_.reshape(len(hK_), -1)).reshape(hK_.shape) # hV: shape (N_train, N, n_var, n_var)
+                hy_var = -2 * (np.einsum('jik,jil->ikl', dV, dV) + np.einsum('ji,jikl->ikl', V, hV)) # hy_var: shape (N, n_var, n_var)
+                hy_std = 0.5 * safe_divide(hy_var - 2 * np.expand_dims(dy_std, 2) * np.expand_dims(dy_std, 1), np.expand_dims(y_std, (1, 2))) # hy_std: shape (N, n_var, n_var)
 
-                hy_mean = hK_T @ gp.alpha_ # hy_mean: shape (N, n_var, n_var)
-                hF.append(hy_mean)
+        if not gradient: dy_std = None
+        return y_mean, dy_mean, hy_mean, y_std, dy_std, hy_std
 
-                # TODO: check
-                if std:
-                    K = np.expand_dims(K, 2) # K: shape (N, 1, 1, N_train)
-                    dK = np.expand_dims(dK_T, 2) # dK: shape (N, n_var, 1, N_train)
-                    dK_Ki = np.expand_dims(dK_Ki, 2) # dK_Ki: shape (N, n_var, 1, N_train)
-                    hK_Ki = hK_T @ gp._K_inv # hK_Ki: shape (N, n_var, n_var, N_train)
+    def _get_sample_memory(self, std, gradient, hessian):
+        # about 8 temporary tensors of shape (N_train, n_var ** 2) per sample for hessian, (N_train, n_var) for gradient
+        # or (N_train,) otherwise, for each objective evaluated concurrently
+        size = self.n_var ** 2 if hessian else self.n_var if gradient else 1
+        n_thread = min(self.n_process, self.n_obj)
+        return 8 * 8 * len(self.gps[0].X_train_) * size * n_thread
 
-                    hy_var = -np.sum(hK_Ki * K + 2 * dK_Ki * dK + K_Ki * hK_T, axis=3) # hy_var: shape (N, n_var, n_var)
-                    hy_std = 0.5 * safe_divide(hy_var * y_std - dy_var * dy_std, y_var) # hy_std: shape (N, n_var, n_var)
-                    hS.append(hy_std)
+    def _evaluate(self, X, std, gradient, hessian):
+        # evaluate objectives in parallel threads only when the computation is large enough
+        size = len(X) * len(self.gps[0].X_train_) * (self.n_var ** 2 if hessian else self.n_var if gradient else 1)
+        n_thread = self.n_process if size > 1e6 else 1
+        results = thread_map(self._evaluate_single, [(gp, X, std, gradient, hessian) for gp in self.gps], n_thread)
+        F, dF, hF, S, dS, hS = zip(*results)
 
         F = np.stack(F, axis=1)
         dF = np.stack(dF, axis=1) if gradient else None
@@ -251,3 +579,39 @@ class GaussianProcess(SurrogateModel):
 
         out = {'F': F, 'dF': dF, 'hF': hF, 'S': S, 'dS': dS, 'hS': hS}
         return out
+
+    def _evaluate_objective(self, X, i, gradient, hessian):
+        F, dF, hF, _, _, _ = self._evaluate_single(self.gps[i], X, False, gradient, hessian)
+        return F, dF, hF
+
+    def _evaluate_joint(self, X):
+        n_batch, q, n_var = X.shape
+        X_flat = X.reshape(n_batch * q, n_var)
+
+        F = np.empty((n_batch, q, self.n_obj))
+        C = np.empty((n_batch, self.n_obj, q, q))
+        for i, gp in enumerate(self.gps):
+            K = gp.kernel_(X_flat, gp.X_train_) # K: shape (N * q, N_train)
+            F[:, :, i] = K.dot(gp.alpha_).reshape(n_batch, q)
+
+            # posterior covariance within each batch is K_qq - V^T V, with one triangular solve for all batches
+            V = self._project(gp, K.T).T.reshape(n_batch, q, -1) # V: shape (N, q, N_train)
+            K_joint = stationary_kernel(gp.kernel_.theta, self.nu, X, X) # K_joint: shape (N, q, q)
+            C[:, i] = K_joint - V @ V.transpose(0, 2, 1)
+
+        return F, C
+
+    def _evaluate_joint_torch(self, X):
+        X_flat = X.reshape(-1, X.shape[-1])
+
+        F, C = [], []
+        for gp in self.gps:
+            X_train, alpha = torch.from_numpy(gp.X_train_), torch.from_numpy(gp.alpha_)
+            K = stationary_kernel(gp.kernel_.theta, self.nu, X_flat, X_train, lib=torch) # K: shape (N * q, N_train)
+            F.append((K @ alpha).reshape(X.shape[:2]))
+
+            V = self._project_torch(gp, K.T).T.reshape(*X.shape[:2], -1) # V: shape (N, q, N_train)
+            K_joint = stationary_kernel(gp.kernel_.theta, self.nu, X, X, lib=torch) # K_joint: shape (N, q, q)
+            C.append(K_joint - V @ V.transpose(1, 2))
+
+        return torch.stack(F, dim=-1), torch.stack(C, dim=1)
@@ -3,11 +3,18 @@ Neural network surrogate model.
 '''
 
 import numpy as np
+from copy import deepcopy
 import torch
 import torch.nn as nn
 import torch.optim as optim
+from torch.utils.data import DataLoader, TensorDataset
+from multiprocess import cpu_count
 
 from autooed.mobo.surrogate_model.base import SurrogateModel
+from autooed.utils.parallel import process_map
+
+
+MIN_N_VAL = 10 # minimum number of held-out data for early stopping, below which all data is used for training
 
 
 class MLP(nn.Module):
@@ -57,10 +64,11 @@ class MLP(nn.Module):
         return x
 
 
-def jacobian(outputs, inputs, create_graph=False):
+def batch_jacobian(outputs, inputs, create_graph=False):
     '''
     Compute the jacobian of `outputs` with respect to `inputs`.
     NOTE: here the `outputs` and `inputs` are batched data, meaning that there's no correlation between individuals in a batch.
+    Therefore the gradient of the sum of an output element over the batch gives the gradients of all individuals at once.
 
     Parameters
     ----------
@@ -77,15 +85,17 @@ def jacobian(outputs, inputs, create_graph=False):
         Jacobian of outputs w.r.t. inputs.
     '''
     batch_size, output_shape, input_shape = outputs.shape[0], outputs.shape[1:], inputs.shape[1:]
+    outputs = outputs.reshape(batch_size, -1)
     jacs = []
-    for i in range(batch_size):
-        for output in outputs[i].view(-1):
-            jac = torch.autograd.grad(output, inputs, grad_outputs=None, allow_unused=True, retain_graph=True, create_graph=create_graph)[0][i]
-            jacs.append(jac)
-    return torch.stack(jacs).reshape((batch_size,) + output_shape + input_shape)
+    for j in range(outputs.shape[1]):
+        jac = torch.autograd.grad(outputs[:, j].sum(), inputs, grad_outputs=None, allow_unused=True, retain_graph=True, create_graph=create_graph)[0]
+        if jac is None: # outputs independent of inputs
+            jac = torch.zeros_like(inputs)
+        jacs.append(jac)
+    return torch.stack(jacs, dim=1).reshape((batch_size,) + output_shape + input_shape)
 
 
-def hessian(outputs, inputs):
+def batch_hessian(outputs, inputs):
     '''
     Compute the hessian of `outputs` with respect to `inputs`.
 
@@ -101,15 +111,94 @@ def hessian(outputs, inputs):
     torch.tensor
         Hessian of outputs w.r.t. inputs.
     '''
-    grad_inputs = jacobian(outputs, inputs, create_graph=True)
-    return jacobian(grad_inputs, inputs)
+    grad_inputs = batch_jacobian(outputs, inputs, create_graph=True)
+    return batch_jacobian(grad_inputs, inputs)
+
+
+def train_net(net, optimizer_state, lr, weight_decay, criterion, X, Y, n_epoch, batch_size, val_ratio, patience, seed):
+    '''
+    Train a neural network with mini-batches and early stopping on held-out loss.
+
+    Parameters
+    ----------
+    net: torch.nn.Module
+        The neural network to train.
+    optimizer_state: dict
+        State dict of the Adam optimizer from previous training (None if trained from scratch).
+    lr: float
+        Learning rate.
+    weight_decay: float
+        Weight decay.
+    criterion: torch.nn.Module
+        The loss function.
+    X: torch.tensor
+        Input design variables (normalized, continuous).
+    Y: torch.tensor
+        Input objective values (normalized), shape (N, n_out).
+    n_epoch: int
+        Maximum number of training epochs.
+    batch_size: int
+        Size of mini-batches.
+    val_ratio: float
+        Ratio of data held out for early stopping, early stopping is disabled if fewer than MIN_N_VAL data would be held out.
+    patience: int
+        Number of epochs without improvement of held-out loss before early stopping.
+    seed: int
+        Random seed of torch for the held-out split and mini-batch shuffling.
+
+    Returns
+    -------
+    net: torch.nn.Module
+        The trained neural network.
+    optimizer_state: dict
+        State dict of the Adam optimizer after training.
+    '''
+    # NOTE: forked workers inherit the same torch random state, so each network is trained with its own seed drawn by the parent
+    torch.manual_seed(seed)
+
+    # NOTE: the optimizer is passed by its state dict since torch optimizers cannot be pickled across processes
+    optimizer = optim.Adam(net.parameters(), lr=lr, weight_decay=weight_decay)
+    if optimizer_state is not None:
+        optimizer.load_state_dict(optimizer_state)
+        for group in optimizer.param_groups:
+            group.update(lr=lr, weight_decay=weight_decay)
+
+    n_val = int(len(X) * val_ratio)
+    if n_val < MIN_N_VAL: n_val = 0 # too few held-out data for a reliable early stopping signal
+    perm = torch.randperm(len(X))
+    X_val, Y_val = X[perm[:n_val]], Y[perm[:n_val]]
+    loader = DataLoader(TensorDataset(X[perm[n_val:]], Y[perm[n_val:]]), batch_size=batch_size, shuffle=True)
+
+    best_loss, best_state, n_wait = np.inf, None, 0
+    for _ in range(n_epoch):
+        for X_batch, Y_batch in loader:
+            loss = criterion(net(X_batch), Y_batch)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+        if n_val == 0: continue
+
+        # early stopping
+        with torch.no_grad():
+            val_loss = criterion(net(X_val), Y_val).item()
+        if val_loss < best_loss:
+            best_loss, best_state, n_wait = val_loss, deepcopy(net.state_dict()), 0
+        else:
+            n_wait += 1
+            if n_wait >= patience: break
+
+    if best_state is not None:
+        net.load_state_dict(best_state)
+    return net, optimizer.state_dict()
 
 
 class NeuralNetwork(SurrogateModel):
     '''
     Simple neural network
     '''
-    def __init__(self, problem, hidden_size=50, hidden_layers=3, activation='tanh', lr=1e-3, weight_decay=1e-4, n_epoch=100, **kwargs):
+    def __init__(self, problem, hidden_size=50, hidden_layers=3, activation='tanh', lr=1e-3, weight_decay=1e-4, n_epoch=100, 
+        multi_head=False, batch_size=256, val_ratio=0.0, patience=10, n_process=cpu_count(), max_memory_mb=1024, cache_size=10000, cache_memory_mb=64, **kwargs):
         '''
         Initialize a neural network as surrogate model.
 
@@ -128,44 +217,87 @@ class NeuralNetwork(SurrogateModel):
         weight_decay: float
             Weight decay.
         n_epoch: int
-            Number of training epochs.
+            Maximum number of training epochs.
+        multi_head: bool
+            Whether to train a single network with shared hidden layers and a linear output head for each objective,
+            instead of a separate network for each objective.
+        batch_size: int
+            Size of mini-batches.
+        val_ratio: float
+            Ratio of data held out for early stopping, 0 to disable early stopping (also disabled if fewer than MIN_N_VAL data would be held out).
+        patience: int
+            Number of epochs without improvement of held-out loss before early stopping.
+        n_process: int
+            Number of processes for training networks of different objectives in parallel.
+        max_memory_mb: int
+            Memory budget (in MB) of evaluation, large sets of design variables are evaluated in chunks within the budget.
+        cache_size: int
+            Maximum number of design variables whose evaluation results are cached until the next fit, 0 to disable caching.
+        cache_memory_mb: int
+            Memory budget (in MB) of cached evaluation results, separate from the evaluation budget max_memory_mb.
         '''
-        super().__init__(problem)
+        super().__init__(problem, n_process, max_memory_mb, cache_size, cache_memory_mb)
 
-        self.net = [MLP(n_in=self.n_var, n_out=1, hidden_sizes=(hidden_size,) * hidden_layers, activation=activation) for _ in range(self.n_obj)]
+        hidden_sizes = (hidden_size,) * hidden_layers
+        if multi_head:
+            self.net = [MLP(n_in=self.n_var, n_out=self.n_obj, hidden_sizes=hidden_sizes, activation=activation)]
+        else:
+            self.net = [MLP(n_in=self.n_var, n_out=1, hidden_sizes=hidden_sizes, activation=activation) for _ in range(self.n_obj)]
+        self.multi_head = multi_head
         self.criterion = nn.MSELoss()
-        self.optimizer = [optim.Adam(net.parameters(), lr=lr, weight_decay=weight_decay) for net in self.net]
+        self.optimizer_state = [None] * len(self.net)
+        self.lr = lr
+        self.weight_decay = weight_decay
         self.n_epoch = n_epoch
+        self.batch_size = batch_size
+        self.val_ratio = val_ratio
+        self.patience = patience
+
+    def _get_targets(self, Y):
+        '''
+        Get the training targets of each network.
+        '''
+        return [Y] if self.multi_head else [Y[:, i:i + 1] for i in range(self.n_obj)]
 
     def _fit(self, X, Y):
         X, Y = torch.FloatTensor(X), torch.FloatTensor(Y)
-        for i in range(self.n_obj):
-            for _ in range(self.n_epoch):
-                Y_pred = self.net[i](X)[:, 0]
-                loss = self.criterion(Y_pred, Y[:, i])
-                self.optimizer[i].zero_grad()
-                loss.backward()
-                self.optimizer[i].step()
+        seeds = np.random.randint(2 ** 31, size=len(self.net))
+        args = [(net, optimizer_state, self.lr, self.weight_decay, self.criterion, X, Y_net, self.n_epoch, self.batch_size, self.val_ratio, self.patience, seed) \
+            for net, optimizer_state, Y_net, seed in zip(self.net, self.optimizer_state, self._get_targets(Y), seeds)]
+        results = process_map(train_net, args, self.n_process)
+        self.net, self.optimizer_state = map(list, zip(*results))
+
+    def _forward(self, X):
+        '''
+        Predict the objective values of all objectives, shape (N, n_obj).
+        '''
+        if self.multi_head:
+            return self.net[0](X)
+        return torch.cat([net(X) for net in self.net], dim=1)
+
+    def _forward_objective(self, X, i):
+        '''
+        Predict the objective values of the i-th objective, shape (N, 1).
+        '''
+        if self.multi_head:
+            return self.net[0](X)[:, i:i + 1]
+        return self.net[i](X)
+
+    def _basis_func(self, X, i):
+        '''
+        Compute the output of the last hidden layer for the i-th objective.
+        '''
+        return self.net[0 if self.multi_head else i].basis_func(X)
 
     def _evaluate(self, X, std, gradient, hessian):
-        F, dF, hF = [], [], []
         n_sample = X.shape[0] if len(X.shape) > 1 else 1
         X = torch.FloatTensor(X)
         X.requires_grad = True
 
-        F = [self.net[i](X)[:, 0] for i in range(self.n_obj)]
-
-        if gradient:
-            dF = [jacobian(f, X).numpy() for f in F]
-        
-        if hessian:
-            hF = [hessian(f, X).numpy() for f in F]
-
-        F = [f.detach().numpy() for f in F]
-        
-        F = np.stack(F, axis=1)
-        dF = np.stack(dF, axis=1) if gradient else None
-        hF = np.stack(hF, axis=1) if hessian else None
+        F = self._forward(X)
+        dF = batch_jacobian(F, X).numpy() if gradient else None
+        hF = batch_hessian(F, X).numpy() if hessian else None
+        F = F.detach().numpy()
 
         S = np.zeros((n_sample, self.n_obj)) if std else None
         dS = np.zeros((n_sample, self.n_obj, self.n_var)) if std and gradient else None
@@ -173,3 +305,28 @@ class NeuralNetwork(SurrogateModel):
         
         out = {'F': F, 'dF': dF, 'hF': hF, 'S': S, 'dS': dS, 'hS': hS}
         return out
+
+    def _evaluate_objective(self, X, i, gradient, hessian):
+        X = torch.FloatTensor(X)
+        X.requires_grad = True
+
+        F = self._forward_objective(X, i)
+        dF = batch_jacobian(F, X)[:, 0].numpy() if gradient else None
+        hF = batch_hessian(F, X)[:, 0].numpy() if hessian else None
+        F = F[:, 0].detach().numpy()
+        return F, dF, hF
+
+    def get_state(self):
+        return {
+            'net': [net.state_dict() for net in self.net],
+            'optimizer_state': list(self.optimizer_state),
+        }
+
+    def set_state(self, state):
+        # warm start only if the network architectures match
+        if len(state.get('net', [])) != len(self.net): return
+        for net, net_state in zip(self.net, state['net']):
+            if {k: v.shape for k, v in net.state_dict().items()} != {k: v.shape for k, v in net_state.items()}: return
+        for net, net_state in zip(self.net, state['net']):
+            net.load_state_dict(net_state)
+        self.optimizer_state = list(state['optimizer_state'])
@@ -0,0 +1,225 @@
+'''
+Random Fourier feature surrogate model.
+'''
+
+import numpy as np
+import torch
+from scipy.linalg import solve_triangular, cholesky, cho_solve
+from scipy.stats.distributions import chi2
+from scipy.stats import norm
+from multiprocess import cpu_count
+
+from autooed.utils.sampling import lhs
+from autooed.utils.operand import safe_divide
+from autooed.mobo.surrogate_model.gp import GaussianProcess
+
+
+class RandomFourierFeature(GaussianProcess):
+    '''
+    Bayesian linear regression on random Fourier features of the Gaussian process kernel [1], for experiments with a huge amount of evaluated data,
+    where the fitting cost grows linearly with the number of data and the prediction cost is independent of it.
+    The kernel hyperparameters are transferred from a Gaussian process fitted on a random subsample of the data.
+
+    [1] A. Rahimi, B. Recht. Random Features for Large-Scale Kernel Machines. NeurIPS 2007.
+    '''
+    def __init__(self, problem, nu=1, n_feature=500, n_subsample=500, refit_interval=1, refit_tol=0.1, n_restarts=0, n_process=cpu_count(), max_memory_mb=1024, cache_size=10000, cache_memory_mb=64, **kwargs):
+        '''
+        Initialize a random Fourier feature surrogate model.
+
+        Parameters
+        ----------
+        problem: autooed.problem.Problem
+            The optimization problem.
+        nu: int
+            The parameter nu controlling the type of the Matern kernel. Choices are 1, 3, 5 and -1.
+        n_feature: int
+            Number of random Fourier features (spectral points).
+        n_subsample: int
+            Number of randomly subsampled data for fitting the Gaussian process whose kernel hyperparameters are transferred.
+        refit_interval: int
+            Number of fits between two full hyperparameter optimizations, in between the fitted hyperparameters are kept fixed.
+        refit_tol: float
+            Tolerance of the drop of log marginal likelihood (per sample) under fixed hyperparameters before forcing a full hyperparameter optimization.
+        n_restarts: int
+            Number of random restarts of the hyperparameter optimization, besides the one warm-started from the last optimum.
+        n_process: int
+            Number of processes for fitting objectives and running the random restarts in parallel.
+        max_memory_mb: int
+            Memory budget (in MB) of fitting and evaluation, large sets of data are processed in chunks within the budget.
+        cache_size: int
+            Maximum number of design variables whose evaluation results are cached until the next fit, 0 to disable caching.
+        cache_memory_mb: int
+            Memory budget (in MB) of cached evaluation results, separate from the evaluation budget max_memory_mb.
+        '''
+        super().__init__(problem, nu=nu, refit_interval=refit_interval, refit_tol=refit_tol, n_restarts=n_restarts, n_process=n_process, max_memory_mb=max_memory_mb, cache_size=cache_size, cache_memory_mb=cache_memory_mb)
+
+        self.M = n_feature
+        self.n_subsample = n_subsample
+        self.W_bases, self.b_bases = None, None # standardized spectral points and phases, fixed across fits
+        self.Ws, self.bs, self.factors, self.sn2s = None, None, None, None
+        self.As, self.rs = None, None # sufficient statistics of the feature weight posterior
+        self.Ls, self.weight_means = None, None
+
+    def _sample_spectral_points(self):
+        '''
+        Sample the spectral points of a standardized kernel (unit length scale) of all objectives.
+        '''
+        W_bases, bs = [], []
+        for _ in range(self.n_obj):
+            sw1, sw2 = lhs(self.n_var, self.M), lhs(self.n_var, self.M)
+            if self.nu > 0:
+                W = norm.ppf(sw1) * np.sqrt(self.nu / chi2.ppf(sw2, df=self.nu))
+            else:
+                W = norm.ppf(sw1)
+            W_bases.append(W)
+            bs.append(2 * np.pi * lhs(1, self.M)[:, 0])
+        self.W_bases, self.b_bases = np.array(W_bases), np.array(bs) # W_bases: shape (n_obj, M, n_var), b_bases: shape (n_obj, M)
+
+    def _calc_features(self, X):
+        '''
+        Calculate the random Fourier features of all objectives.
+
+        Parameters
+        ----------
+        X: np.array
+            Input design variables (normalized, continuous), shape (N, n_var).
+
+        Returns
+        -------
+        phi: np.array
+            Random Fourier features (with a constant feature in the end), shape (n_obj, N, M + 1).
+        W_X_b: np.array
+            Phases of the features, shape (n_obj, N, M + 1).
+        '''
+        W_X_b = np.einsum('nv,omv->onm', X, self.Ws) + self.bs[:, None, :]
+        phi = self.factors[:, None, :] * np.cos(W_X_b)
+        return phi, W_X_b
+
+    def _get_chunk_size(self):
+        # about 4 temporary arrays of shape (n_obj, M + 1) per data
+        return max(1, int(self.max_memory_mb * 2 ** 20 // (8 * 4 * self.n_obj * (self.M + 1))))
+
+    def _accumulate(self, X, Y):
+        '''
+        Accumulate the sufficient statistics phi.T @ phi and phi.T @ y of data in chunks, then update the posterior of feature weights.
+        '''
+        chunk_size = self._get_chunk_size()
+        for start in range(0, len(X), chunk_size):
+            phi, _ = self._calc_features(X[start:start + chunk_size])
+            self.As += phi.transpose(0, 2, 1) @ phi
+            self.rs += np.einsum('onm,no->om', phi, Y[start:start + chunk_size])
+
+        # posterior of feature weights: mean A^-1 @ phi.T @ y, covariance sn2 * A^-1, where A = phi.T @ phi + sn2 * I
+        self.Ls = np.array([cholesky(A, lower=True) for A in self.As]) # Ls: shape (n_obj, M + 1, M + 1)
+        self.weight_means = np.array([cho_solve((L, True), r) for L, r in zip(self.Ls, self.rs)]) # weight_means: shape (n_obj, M + 1)
+
+    def _fit(self, X, Y):
+        # transfer kernel hyperparameters from the Gaussian process fitted on a subsample
+        if len(X) > self.n_subsample:
+            indices = np.random.choice(len(X), self.n_subsample, replace=False)
+            super()._fit(X[indices], Y[indices])
+        else:
+            super()._fit(X, Y)
+
+        thetas = np.array([gp.kernel_.theta for gp in self.gps]) # thetas: shape (n_obj, n_theta)
+        ells = np.exp(thetas[:, 1:-1]) # ells: shape (n_obj, n_var)
+        c1s, c2s = np.exp(thetas[:, 0]), np.exp(thetas[:, -1]) # c1s, c2s: shape (n_obj,)
+        self.sn2s = np.full(self.n_obj, 1e-6) # small noise for numerical stability, as the kernel is noise-free
+
+        if self.W_bases is None:
+            self._sample_spectral_points()
+
+        # kernel c1 * k(x, x') + c2 is approximated by M random cosine features and a constant feature,
+        # where the constant feature has zero spectral point and zero phase
+        self.Ws = np.concatenate([self.W_bases / ells[:, None, :], np.zeros((self.n_obj, 1, self.n_var))], axis=1) # Ws: shape (n_obj, M + 1, n_var)
+        self.bs = np.concatenate([self.b_bases, np.zeros((self.n_obj, 1))], axis=1) # bs: shape (n_obj, M + 1)
+        self.factors = np.concatenate([np.tile(np.sqrt(2. * c1s / self.M)[:, None], (1, self.M)), np.sqrt(c2s)[:, None]], axis=1) # factors: shape (n_obj, M + 1)
+
+        self.As = self.sn2s[:, None, None] * np.eye(self.M + 1)
+        self.rs = np.zeros((self.n_obj, self.M + 1))
+        self._accumulate(X, Y)
+
+    def _fit_fantasy(self, X, Y):
+        # rank-k update of the posterior of feature weights with fixed features
+        self._accumulate(X, Y)
+
+    def _evaluate(self, X, std, gradient, hessian):
+        phi, W_X_b = self._calc_features(X) # phi: shape (n_obj, N, M + 1)
+
+        F = np.einsum('onm,om->no', phi, self.weight_means) # F: shape (N, n_obj)
+
+        dF, hF = None, None
+        if gradient or (std and hessian):
+            dphi = -self.factors[:, None, :, None] * np.sin(W_X_b)[:, :, :, None] * self.Ws[:, None, :, :] # dphi: shape (n_obj, N, M + 1, n_var)
+
+        if gradient:
+            dF = np.einsum('onmv,om->nov', dphi, self.weight_means) # dF: shape (N, n_obj, n_var)
+
+        if hessian:
+            hF = -np.einsum('onm,om,omv,omw->novw', phi, self.weight_means, self.Ws, self.Ws, optimize=True) # hF: shape (N, n_obj, n_var, n_var)
+
+        S, dS, hS = None, None, None
+        if std:
+            S = np.empty((len(X), self.n_obj))
+            if gradient: dS = np.empty((len(X), self.n_obj, self.n_var))
+            if hessian: hS = np.empty((len(X), self.n_obj, self.n_var, self.n_var))
+
+            for i, (L, sn2) in enumerate(zip(self.Ls, self.sn2s)):
+                # variance sn2 * phi.T @ A^-1 @ phi = sn2 * ||L^-1 @ phi||^2
+                V = solve_triangular(L, phi[i].T, lower=True, check_finite=False) # V: shape (M + 1, N)
+                y_std = np.sqrt(sn2 * np.sum(V ** 2, axis=0))
+                S[:, i] = y_std
+
+                if not (gradient or hessian): continue
+                G = solve_triangular(L, dphi[i].transpose(1, 0, 2).reshape(self.M + 1, -1), lower=True, check_finite=False).reshape(self.M + 1, len(X), self.n_var) # G: shape (M + 1, N, n_var)
+                dy_var = 2 * sn2 * np.einsum('mn,mnv->nv', V, G)
+                dy_std = 0.5 * safe_divide(dy_var, y_std[:, None])
+                if gradient: dS[:, i] = dy_std
+
+                if hessian:
+                    # the second derivatives of features are -phi * w @ w.T
+                    U = solve_triangular(L.T, V, lower=False, check_finite=False) # U: shape (M + 1, N), U = A^-1 @ phi
+                    hy_var = 2 * sn2 * (np.einsum('mnv,mnw->nvw', G, G) - np.einsum('mn,nm,mv,mw->nvw', U, phi[i], self.Ws[i], self.Ws[i], optimize=True))
+                    hS[:, i] = 0.5 * safe_divide(hy_var - 2 * dy_std[:, :, None] * dy_std[:, None, :], y_std[:, None, None])
+
+        out = {'F': F, 'dF': dF, 'hF': hF, 'S': S, 'dS': dS, 'hS': hS}
+        return out
+
+    def _evaluate_objective(self, X, i, gradient, hessian):
+        W_X_b = X @ self.Ws[i].T + self.bs[i] # W_X_b: shape (N, M + 1)
+        weights = self.factors[i] * self.weight_means[i] # weights: shape (M + 1,)
+
+        F = np.cos(W_X_b) @ weights # F: shape (N,)
+        dF = -(np.sin(W_X_b) * weights) @ self.Ws[i] if gradient else None # dF: shape (N, n_var)
+        hF = -np.einsum('nm,mv,mw->nvw', np.cos(W_X_b) * weights, self.Ws[i], self.Ws[i], optimize=True) if hessian else None # hF: shape (N, n_var, n_var)
+        return F, dF, hF
+
+    def _get_sample_memory(self, std, gradient, hessian):
+        # about 4 temporary arrays of shape (M + 1, n_var ** 2) per sample for hessian, (M + 1, n_var) for gradient, or (M + 1,) otherwise, for each objective
+        size = self.n_var ** 2 if hessian else self.n_var if gradient else 1
+        return 8 * 4 * (self.M + 1) * size * self.n_obj
+
+    def _evaluate_joint(self, X):
+        n_batch, q, n_var = X.shape
+        phi, _ = self._calc_features(X.reshape(n_batch * q, n_var)) # phi: shape (n_obj, N * q, M + 1)
+
+        F = np.einsum('onm,om->no', phi, self.weight_means).reshape(n_batch, q, self.n_obj)
+        C = np.empty((n_batch, self.n_obj, q, q))
+        for i, (L, sn2) in enumerate(zip(self.Ls, self.sn2s)):
+            V = solve_triangular(L, phi[i].T, lower=True, check_finite=False).reshape(self.M + 1, n_batch, q)
+            C[:, i] = sn2 * np.einsum('mbq,mbr->bqr', V, V)
+
+        return F, C
+
+    def _evaluate_joint_torch(self, X):
+        n_batch, q, n_var = X.shape
+        Ws, bs, factors = torch.from_numpy(self.Ws), torch.from_numpy(self.bs), torch.from_numpy(self.factors)
+        phi = factors[:, None, :] * torch.cos(torch.einsum('nv,omv->onm', X.reshape(n_batch * q, n_var), Ws) + bs[:, None, :]) # phi: shape (n_obj, N * q, M + 1)
+
+        F = torch.einsum('onm,om->no', phi, torch.from_numpy(self.weight_means)).reshape(n_batch, q, self.n_obj)
+        C = []
+        for i, (L, sn2) in enumerate(zip(self.Ls, self.sn2s)):
+            V = torch.linalg.solve_triangular(torch.from_numpy(L), phi[i].T, upper=False).reshape(self.M + 1, n_batch, q)
+            C.append(sn2 * torch.einsum('mbq,mbr->bqr', V, V))
+
+        return F, torch.stack(C, dim=1)
@@ -0,0 +1,114 @@
+'''
+Sparse Gaussian process surrogate model with inducing points.
+'''
+
+import numpy as np
+import torch
+from sklearn.gaussian_process import GaussianProcessRegressor
+from scipy.linalg import solve_triangular, cholesky, eigh
+from multiprocess import cpu_count
+
+from autooed.mobo.surrogate_model.gp import GaussianProcess
+
+
+class SparseGaussianProcessRegressor(GaussianProcessRegressor):
+    '''
+    Gaussian process regressor with the fully independent training conditional (FITC) approximation [1].
+    The inducing points are a random subset of the training data, on which the kernel hyperparameters are optimized exactly,
+    then the posterior is conditioned on the whole training data through the inducing points.
+    After fitting, X_train_ stores the inducing points and the posterior has a similar form as an exact Gaussian process:
+    mean = K(X, Z) @ alpha_, var = K(X, X) - ||P_ @ K(Z, X)||^2.
+
+    [1] E. Snelson, Z. Ghahramani. Sparse Gaussian Processes using Pseudo-inputs. NeurIPS 2006.
+    '''
+    def __init__(self, kernel=None, alpha=1e-10, optimizer='fmin_l_bfgs_b', n_restarts_optimizer=0, normalize_y=False,
+        copy_X_train=True, random_state=None, n_inducing=300, noise=1e-6):
+        '''
+        Parameters
+        ----------
+        n_inducing: int
+            Number of inducing points, exact Gaussian process is fitted if the number of training data is not larger than it.
+        noise: float
+            Noise variance added to the diagonal correction and the inducing kernel matrix for numerical stability.
+        '''
+        super().__init__(kernel=kernel, alpha=alpha, optimizer=optimizer, n_restarts_optimizer=n_restarts_optimizer,
+            normalize_y=normalize_y, copy_X_train=copy_X_train, random_state=random_state)
+        self.n_inducing = n_inducing
+        self.noise = noise
+
+    def fit(self, X, y):
+        if len(X) <= self.n_inducing:
+            return super().fit(X, y)
+
+        # optimize hyperparameters on the inducing points
+        indices = np.random.choice(len(X), self.n_inducing, replace=False)
+        Z = X[indices]
+        super().fit(Z, y[indices])
+
+        # condition on the whole training data through the inducing points
+        K_uu = self.kernel_(Z)
+        K_uu[np.diag_indices_from(K_uu)] += self.noise
+        L_uu = cholesky(K_uu, lower=True)
+        V = solve_triangular(L_uu, self.kernel_(Z, X), lower=True) # V: shape (n_inducing, N)
+        lam = np.maximum(self.kernel_.diag(X) - np.sum(V ** 2, axis=0), 0) + self.noise # lam: shape (N,)
+        V /= np.sqrt(lam)
+
+        B = V @ V.T
+        B[np.diag_indices_from(B)] += 1.0
+        L_B = cholesky(B, lower=True)
+        beta = solve_triangular(L_B, V @ (y / np.sqrt(lam)), lower=True)
+
+        # K_uu^-1 - (K_uu + K_uf @ diag(lam)^-1 @ K_fu)^-1 = L_uu^-T @ (I - B^-1) @ L_uu^-1 = P_.T @ P_
+        b, Q = eigh(B)
+        L_uu_inv = solve_triangular(L_uu, np.eye(self.n_inducing), lower=True)
+
+        self.X_train_, self.y_train_ = np.copy(Z), np.copy(y[indices])
+        self.alpha_ = solve_triangular(L_uu.T, solve_triangular(L_B.T, beta, lower=False), lower=False)
+        self.P_ = np.expand_dims(np.sqrt(np.maximum(1 - 1 / b, 0)), 1) * (Q.T @ L_uu_inv)
+        self.L_ = None
+        return self
+
+
+class SparseGaussianProcess(GaussianProcess):
+    '''
+    Sparse Gaussian process with inducing points, for experiments with a large amount of evaluated data.
+    '''
+    def __init__(self, problem, nu=1, n_inducing=300, noise=1e-6, n_restarts=0, n_process=cpu_count(), max_memory_mb=1024, cache_size=10000, cache_memory_mb=64, **kwargs):
+        '''
+        Initialize a sparse Gaussian process.
+
+        Parameters
+        ----------
+        problem: autooed.problem.Problem
+            The optimization problem.
+        nu: int
+            The parameter nu controlling the type of the Matern kernel. Choices are 1, 3, 5 and -1.
+        n_inducing: int
+            Number of inducing points.
+        noise: float
+            Noise variance added for numerical stability of the sparse approximation.
+        n_restarts: int
+            Number of random restarts of the hyperparameter optimization, besides the one warm-started from the last optimum.
+        n_process: int
+            Number of processes for fitting objectives and running the random restarts in parallel.
+        max_memory_mb: int
+            Memory budget (in MB) of evaluation, large sets of design variables are evaluated in chunks within the budget.
+        cache_size: int
+            Maximum number of design variables whose evaluation results are cached until the next fit, 0 to disable caching.
+        cache_memory_mb: int
+            Memory budget (in MB) of cached evaluation results, separate from the evaluation budget max_memory_mb.
+        '''
+        # hyperparameters are cheap to optimize on inducing points, so they are optimized in every fit
+        super().__init__(problem, nu=nu, refit_interval=1, n_restarts=n_restarts, n_process=n_process, max_memory_mb=max_memory_mb, cache_size=cache_size, cache_memory_mb=cache_memory_mb)
+
+        self.gps = [SparseGaussianProcessRegressor(kernel=gp.kernel, optimizer=gp.optimizer, n_inducing=n_inducing, noise=noise) for gp in self.gps]
+
+    def _project(self, gp, K):
+        if gp.L_ is None: # sparse posterior
+            return gp.P_ @ K
+        return super()._project(gp, K)
+
+    def _project_torch(self, gp, K):
+        if gp.L_ is None: # sparse posterior
+            return torch.from_numpy(gp.P_) @ K
+        return super()._project_torch(gp, K)
@@ -24,9 +24,12 @@ class SurrogateProblem(Problem):
         self.problem = problem
         self.transformation = problem.transformation
         self.acquisition = acquisition
+
+        # for joint batch acquisition, each solution concatenates the design variables of a batch of designs
+        self.batch_size = acquisition.batch_size
         super().__init__(
-            n_var=problem.n_var, n_obj=problem.n_obj, n_constr=problem.n_constr, 
-            xl=problem.xl, xu=problem.xu
+            n_var=problem.n_var * self.batch_size, n_obj=acquisition.n_obj, n_constr=problem.n_constr * self.batch_size, 
+            xl=np.tile(problem.xl, self.batch_size), xu=np.tile(problem.xu, self.batch_size)
         )
 
     def _evaluate(self, X, out, *args, gradient, hessian, **kwargs):
@@ -48,8 +51,8 @@ class SurrogateProblem(Problem):
         out['F'], out['dF'], out['hF'] = self.acquisition.evaluate(X, dtype='continuous', gradient=gradient, hessian=hessian)
         
         # evaluate cheap constraints by real problem
-        X_raw = self.transformation.undo(X)
-        out['G'] = np.array([self.problem.evaluate_constraint(x_raw) for x_raw in X_raw])
+        X_raw = self.transformation.undo(X.reshape(-1, self.problem.n_var))
+        out['G'] = np.array([self.problem.evaluate_constraint(x_raw) for x_raw in X_raw]).reshape(len(X), -1)
 
     def evaluate(self, X, *args, return_values_of="auto", return_as_dictionary=False, **kwargs):
         '''
@@ -179,6 +182,15 @@ class SurrogateProblem(Problem):
         G: np.array
             Constraint violations (<=0 means satisfying constraints, >0 means violating constraints).
         '''
+        if self.batch_size > 1:
+            # evaluate each design of the batches separately and concatenate the constraints
+            X_raw = self.transformation.undo(X.reshape(-1, self.problem.n_var))
+            G = np.array([self.problem.evaluate_constraint(x) for x in X_raw])
+            if None in G:
+                return None
+            else:
+                return G.reshape(X.shape[:-1] + (-1,))
+
         X = self.transformation.undo(X)
 
         if X.ndim == 1:
@@ -4,6 +4,7 @@ Agents that talk to algorithms and database for data loading, evaluation and opt
 
 import os
 import numpy as np
+from time import time
 from multiprocessing import Lock
 
 from autooed.problem import build_problem
@@ -71,7 +72,7 @@ class LoadAgent:
                 '_Y_pred_mean': [f'_{name}_pred_mean' for name in self.problem_cfg['obj_name']],
                 '_Y_pred_std': [f'_{name}_pred_std' for name in self.problem_cfg['obj_name']],
                 'pareto': 'pareto', 'batch': 'batch', 
-                '_order': '_order', '_hypervolume': '_hypervolume',
+                '_order': '_order', '_hypervolume': '_hypervolume', '_duration': '_duration',
             }
 
             # mapping from problem domains to data types in database
@@ -94,6 +95,7 @@ class LoadAgent:
                 'batch': int,
                 '_order': int,
                 '_hypervolume': float,
+                '_duration': float,
             }
 
         elif config != self.problem_cfg: # update in the middle
@@ -202,6 +204,12 @@ class LoadAgent:
         '''
         return self.db.check_inited_table_exist(name=self.table_name)
 
+    def check_duration_exist(self):
+        '''
+        Check if the database table records evaluation duration (not recorded by tables created in earlier versions).
+        '''
+        return '_duration' in self.db.get_column_names(self.table_name)
+
     def load(self, keys, rowid=None):
         '''
         Load data from the database table.
@@ -348,7 +356,7 @@ class EvaluateAgent(LoadAgent):
     Main functions: evaluation
     '''
 
-    def update_evaluation(self, Y, rowids):
+    def update_evaluation(self, Y, rowids, duration=None):
         '''
         Update evaluation results to the database.
 
@@ -358,16 +366,22 @@ class EvaluateAgent(LoadAgent):
             Updated evaluated performance.
         rowids: list
             Row numbers of the evaluated performance.
+        duration: list
+            Evaluation duration (wall time in seconds) of the evaluated performance, None if not measured.
         '''
-        # update data (Y, status, _order)
+        # update data (Y, status, _order, _duration)
         status = ['evaluated'] * len(rowids)
         with self.lock:
             prev_order = self.load('_order')
             valid_idx = prev_order >= 0
             max_order = np.max(prev_order[valid_idx]) + 1 if valid_idx.any() else 0
             order = np.arange(max_order, max_order + len(rowids))
-            self.db.update_multiple_data(table=self.table_name, column=self._map_key(['Y', 'status', '_order'], flatten=True), 
-                data=[Y, status, order], rowid=rowids, transform=True)
+            keys, data = ['Y', 'status', '_order'], [Y, status, order]
+            if duration is not None and self.check_duration_exist():
+                keys.append('_duration')
+                data.append(duration)
+            self.db.update_multiple_data(table=self.table_name, column=self._map_key(keys, flatten=True), 
+                data=data, rowid=rowids, transform=True)
 
             # update data (hypervolume)
             self._update_hypervolume(rowids)
@@ -399,14 +413,16 @@ class EvaluateAgent(LoadAgent):
         self.db.update_data(table=self.table_name, column=['status'], data=['evaluating'], rowid=rowid)
 
         # run evaluation
+        start_time = time()
         if eval_func is None:
             problem_name = self.problem_cfg['name']
             y_next = evaluate(problem_name, x_next)
         else:
             y_next = np.array(eval_func(x_next))
+        duration = time() - start_time
 
         # update evaluation result to database
-        self.update_evaluation(np.atleast_2d(y_next), [rowid])
+        self.update_evaluation(np.atleast_2d(y_next), [rowid], duration=[duration])
 
     '''
     Statistics
@@ -699,17 +715,26 @@ class OptimizeAgent(EvaluateAgent):
         '''
         # read current data from database
         X, Y = self.load(['X', 'Y'])
+        duration = self.load('_duration').reshape(-1) if self.check_duration_exist() else None
         valid_idx = self._get_valid_idx(Y)
         if len(valid_idx) < len(Y):
             X, Y = X[valid_idx], Y[valid_idx]
+            if duration is not None: duration = duration[valid_idx]
             invalid_idx = self._get_invalid_idx(Y)
             X_busy = X[invalid_idx]
         else:
             X_busy = None
 
+        # load optimizer state from previous iterations
+        state = self.db.query_state(self.table_name)
+        if state is None: state = {}
+
         # optimize for best X_next
         config = self.get_config()
-        X_next, (Y_pred_mean, Y_pred_std) = optimize_predict(config, X, Y, X_busy, batch_size=batch_size)
+        X_next, (Y_pred_mean, Y_pred_std) = optimize_predict(config, X, Y, X_busy, batch_size=batch_size, state=state, cost=duration)
+
+        # save optimizer state for next iterations
+        self.db.update_state(self.table_name, state)
 
         # insert optimization and prediction result to database
         if Y_pred_mean is not None and Y_pred_std is not None:
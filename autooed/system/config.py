@@ -240,6 +240,8 @@ def complete_config(config, check=False):
     
     if 'surrogate' not in algo_cfg or algo_cfg['surrogate'] is None:
         algo_cfg['surrogate'] = {}
+    else:
+        algo_cfg['surrogate'].update({'n_process': algo_cfg['n_process']})
 
     if 'acquisition' not in algo_cfg or algo_cfg['acquisition'] is None:
         algo_cfg['acquisition'] = {}
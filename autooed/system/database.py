@@ -5,6 +5,7 @@ Database related tools.
 import os
 import sys
 import sqlite3
+import pickle
 import numpy as np
 import yaml
 from multiprocessing import Lock, Process, Queue, Value
@@ -27,6 +28,11 @@ table_descriptions = {
         config text not null
         ''',
 
+    '_state': '''
+        name varchar(50) not null primary key,
+        state blob not null
+        ''',
+
 }
 
 
@@ -313,6 +319,7 @@ class Database:
 
             # in case not removed completely
             self.execute(f'delete from _config where name="{name}"')
+            self.execute(f'delete from _state where name="{name}"')
             self.execute(f'delete from _empty_table where name="{name}"')
 
             self.execute(f'insert into _empty_table values ("{name}")')
@@ -353,7 +360,7 @@ class Database:
             description.append(f'"_{obj_name}_pred_mean" float')
             description.append(f'"_{obj_name}_pred_std" float')
         description += ['pareto boolean', 'batch int not null']
-        description += ['_order int default -1', '_hypervolume float']
+        description += ['_order int default -1', '_hypervolume float', '_duration float']
         
         with SafeLock(self.lock):
             self.execute(f'create table "{name}" ({",".join(description)})')
@@ -375,6 +382,7 @@ class Database:
             if self.check_inited_table_exist(name):
                 self.execute(f'drop table "{name}"')
                 self.execute(f'delete from _config where name="{name}"')
+                self.execute(f'delete from _state where name="{name}"')
                 self.commit()
             elif self.check_table_exist(name, block=False):
                 self.execute(f'delete from _empty_table where name="{name}"')
@@ -436,6 +444,47 @@ class Database:
             config = yaml.load(config_str[0], Loader=yaml.FullLoader)
             return config
 
+    '''
+    state
+    '''
+
+    def update_state(self, name, state):
+        '''
+        Update the optimizer state of a database table.
+
+        Parameters
+        ----------
+        name: str
+            Name of the database table.
+        state: dict
+            Optimizer state to update.
+        '''
+        state_bytes = pickle.dumps(state)
+        with SafeLock(self.lock):
+            self.execute('insert or replace into _state (name, state) values (?, ?)', [name, state_bytes])
+            self.commit()
+
+    def query_state(self, name):
+        '''
+        Query the optimizer state of a given database table.
+
+        Parameters
+        ----------
+        name: str
+            Name of the database table.
+
+        Returns
+        -------
+        dict
+            Queried optimizer state (None if not found).
+        '''
+        state_bytes = self.execute(f'select state from _state where name="{name}"', fetchone=True)
+        if state_bytes is None:
+            return None
+        else:
+            state = pickle.loads(state_bytes[0])
+            return state
+
     '''
     basic operations
     '''
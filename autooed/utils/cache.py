@@ -0,0 +1,116 @@
+'''
+Caching tools for repeated evaluations.
+'''
+
+from collections import OrderedDict
+import numpy as np
+
+
+class EvaluationCache:
+    '''
+    Least-recently-used (LRU) cache of row-wise evaluation results, where each row of the input array is cached independently,
+    keyed by the bytes of the row and the requested outputs. Hit/miss counters are kept across invalidations to measure the saved work.
+    '''
+    def __init__(self, max_size=10000, max_memory_mb=64):
+        '''
+        Initialize an evaluation cache.
+
+        Parameters
+        ----------
+        max_size: int
+            Maximum number of cached rows, 0 to disable caching.
+        max_memory_mb: int
+            Maximum memory (in MB) of cached results.
+        '''
+        self.max_size = max_size
+        self.max_memory_mb = max_memory_mb
+        self.entries = OrderedDict()
+        self.n_byte = 0
+        self.n_hit, self.n_miss = 0, 0
+
+    def __getstate__(self):
+        # cached results are not transferred to other processes
+        state = self.__dict__.copy()
+        state['entries'], state['n_byte'] = OrderedDict(), 0
+        return state
+
+    def clear(self):
+        '''
+        Invalidate all cached results, e.g., when the evaluated model is refitted.
+        '''
+        self.entries.clear()
+        self.n_byte = 0
+
+    def info(self):
+        '''
+        Get the statistics of the cache.
+
+        Returns
+        -------
+        info: dict
+            Number of hit rows, missed rows, cached rows and cached bytes.
+        '''
+        return dict(n_hit=self.n_hit, n_miss=self.n_miss, n_entry=len(self.entries), n_byte=self.n_byte)
+
+    def evaluate(self, func, X, *flags):
+        '''
+        Evaluate a function on the rows of an input array, where only the rows missing in the cache are passed to the function.
+
+        Parameters
+        ----------
+        func: function
+            Function to evaluate, which takes an array of shape (N, ...) and returns a dictionary of arrays of shape (N, ...) or None.
+        X: np.array
+            Input array.
+        flags: bool
+            Options of the requested outputs, which are part of the cache key.
+
+        Returns
+        -------
+        out: dict
+            Output dictionary of the function.
+        '''
+        if self.max_size == 0 or len(X) > self.max_size:
+            self.n_miss += len(X)
+            return func(X)
+
+        X = np.ascontiguousarray(X, dtype=float)
+        keys = [(flags, x.tobytes()) for x in X]
+        hit = np.array([key in self.entries for key in keys], dtype=bool)
+        hit_indices, miss_indices = np.where(hit)[0], np.where(~hit)[0]
+        self.n_hit += len(hit_indices)
+        self.n_miss += len(miss_indices)
+
+        out_miss = func(X[miss_indices]) if len(miss_indices) > 0 else None
+
+        if len(hit_indices) == 0:
+            out = out_miss
+        else:
+            for i in hit_indices:
+                self.entries.move_to_end(keys[i])
+            rows_hit = [self.entries[keys[i]] for i in hit_indices]
+
+            out = {}
+            for name, row in rows_hit[0].items():
+                if row is None:
+                    out[name] = None
+                    continue
+                out[name] = np.empty((len(X),) + row.shape, dtype=row.dtype)
+                out[name][hit_indices] = np.stack([row_hit[name] for row_hit in rows_hit])
+                if out_miss is not None:
+                    out[name][miss_indices] = out_miss[name]
+
+        # store copies of rows to avoid aliasing with the returned arrays
+        for j, i in enumerate(miss_indices):
+            row = {name: None if val is None else val[j].copy() for name, val in out_miss.items()}
+            if keys[i] in self.entries: # duplicated rows in the input
+                self.n_byte -= sum(val.nbytes for val in self.entries[keys[i]].values() if val is not None)
+            self.entries[keys[i]] = row
+            self.n_byte += sum(val.nbytes for val in row.values() if val is not None)
+
+        max_byte = self.max_memory_mb * 2 ** 20
+        while len(self.entries) > self.max_size or self.n_byte > max_byte:
+            _, row = self.entries.popitem(last=False)
+            self.n_byte -= sum(val.nbytes for val in row.values() if val is not None)
+
+        return out
@@ -0,0 +1,367 @@
+'''
+Parallel computation tools.
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+import io
+import os
+import queue
+import traceback
+import weakref
+import dill
+import numpy as np
+import torch
+from threadpoolctl import threadpool_limits
+from multiprocess import Pool, Process, Queue, cpu_count, current_process, resource_tracker
+from multiprocess.shared_memory import SharedMemory
+
+
+def limit_threads(n_thread):
+    '''
+    Limit the number of threads used by BLAS/OpenMP and torch in the current process.
+
+    Parameters
+    ----------
+    n_thread: int
+        Maximum number of threads.
+    '''
+    threadpool_limits(limits=n_thread)
+    torch.set_num_threads(n_thread)
+
+
+def process_map(func, args_list, n_process):
+    '''
+    Apply a function to a list of arguments in parallel processes, where each worker process uses its share of CPU threads.
+    Falls back to serial computation when only one process is needed or when called from a daemon worker process.
+
+    Parameters
+    ----------
+    func: function
+        Function to apply (should be picklable).
+    args_list: list
+        List of argument tuples to apply the function to.
+    n_process: int
+        Maximum number of processes.
+
+    Returns
+    -------
+    list
+        Results of the function calls, in the order of args_list.
+    '''
+    n_process = min(n_process, len(args_list))
+    if n_process <= 1 or current_process().daemon:
+        return [func(*args) for args in args_list]
+
+    n_thread = max(1, cpu_count() // n_process)
+    with Pool(n_process, initializer=limit_threads, initargs=(n_thread,)) as pool:
+        return pool.starmap(func, args_list)
+
+
+def thread_map(func, args_list, n_thread):
+    '''
+    Apply a function to a list of arguments in parallel threads, where BLAS/OpenMP threads are shared evenly among the threads.
+
+    Parameters
+    ----------
+    func: function
+        Function to apply.
+    args_list: list
+        List of argument tuples to apply the function to.
+    n_thread: int
+        Maximum number of threads.
+
+    Returns
+    -------
+    list
+        Results of the function calls, in the order of args_list.
+    '''
+    n_thread = min(n_thread, len(args_list))
+    if n_thread <= 1:
+        return [func(*args) for args in args_list]
+
+    with threadpool_limits(limits=max(1, cpu_count() // n_thread)), ThreadPoolExecutor(n_thread) as executor:
+        return list(executor.map(lambda args: func(*args), args_list))
+
+
+class _SharedPickler(dill.Pickler):
+    '''
+    Pickler that leaves the data of large numpy arrays out of the pickle stream, to be placed in shared memory.
+    '''
+    min_nbytes = 1024
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.arrays, self.array_ids = [], {}
+
+    def persistent_id(self, obj):
+        if type(obj) is not np.ndarray or obj.dtype.hasobject or obj.nbytes < self.min_nbytes:
+            return None
+        if id(obj) not in self.array_ids:
+            self.array_ids[id(obj)] = len(self.arrays)
+            self.arrays.append(obj)
+        return self.array_ids[id(obj)]
+
+
+class _SharedUnpickler(dill.Unpickler):
+    '''
+    Unpickler that restores large numpy arrays as read-only views of shared memory without copying.
+    '''
+    def __init__(self, file, buffer, array_meta):
+        super().__init__(file)
+        self.buffer, self.array_meta = buffer, array_meta
+        self.arrays = {}
+
+    def persistent_load(self, pid):
+        if pid not in self.arrays:
+            offset, dtype, shape, order = self.array_meta[pid]
+            self.arrays[pid] = np.ndarray(shape, dtype=dtype, buffer=self.buffer, offset=offset, order=order)
+        return self.arrays[pid]
+
+
+def _dump_shared_state(state):
+    '''
+    Serialize the state into a new shared memory block, laid out as [pickle stream | aligned array data | array metadata].
+
+    Returns
+    -------
+    shm: multiprocess.shared_memory.SharedMemory
+        The shared memory block.
+    header: tuple
+        Size of the pickle stream, offset and size of the array metadata.
+    '''
+    file = io.BytesIO()
+    pickler = _SharedPickler(file)
+    pickler.dump(state)
+    stream = file.getvalue()
+
+    align = lambda n: -(-n // 64) * 64
+    array_meta, offset = [], align(len(stream))
+    for array in pickler.arrays:
+        order = 'F' if array.flags.f_contiguous and not array.flags.c_contiguous else 'C'
+        array_meta.append((offset, array.dtype.str, array.shape, order))
+        offset = align(offset + array.nbytes)
+    meta = dill.dumps(array_meta)
+
+    shm = SharedMemory(create=True, size=offset + len(meta))
+    shm.buf[:len(stream)] = stream
+    for array, (array_offset, _, _, order) in zip(pickler.arrays, array_meta):
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf, offset=array_offset, order=order)[...] = array
+    shm.buf[offset:offset + len(meta)] = meta
+    return shm, (len(stream), offset, len(meta))
+
+
+def _load_shared_state(name, header):
+    '''
+    Load the state from a shared memory block, where large arrays are read-only views of the block.
+    '''
+    shm = SharedMemory(name=name) # registered to the resource tracker shared with the creating process, which owns and unlinks the block
+    n_stream, meta_offset, n_meta = header
+    array_meta = dill.loads(bytes(shm.buf[meta_offset:meta_offset + n_meta]))
+    unpickler = _SharedUnpickler(io.BytesIO(bytes(shm.buf[:n_stream])), shm.buf.toreadonly(), array_meta)
+    return unpickler.load(), shm
+
+
+def _worker_loop(task_queue, result_queue, n_thread):
+    '''
+    Main loop of a persistent worker process, which reloads the shared state only when its version changes.
+    '''
+    limit_threads(n_thread)
+    version, state, shm = None, None, None
+    while True:
+        task = task_queue.get()
+        if task is None: break
+        task_version, name, header, func, index, args = task
+        try:
+            if task_version != version:
+                state = None
+                if shm is not None:
+                    try:
+                        shm.close()
+                    except BufferError: # views of the old state are still referenced, released by garbage collection
+                        pass
+                state, shm = _load_shared_state(name, header)
+                version = task_version
+            result_queue.put((index, True, func(state, *args)))
+        except Exception:
+            result_queue.put((index, False, traceback.format_exc()))
+
+
+def _terminate_workers(resources):
+    '''
+    Kill the worker processes of a worker pool and discard its queues, e.g., after a worker died with unfinished tasks.
+    '''
+    for worker in resources['workers']:
+        if worker.is_alive():
+            worker.terminate()
+        worker.join()
+    for q in (resources['task_queue'], resources['result_queue']):
+        if q is not None:
+            q.close()
+            q.cancel_join_thread()
+    resources.update(workers=[], task_queue=None, result_queue=None)
+
+
+def _shutdown(resources):
+    '''
+    Stop the worker processes and release the shared memory of a worker pool.
+    '''
+    if os.getpid() != resources['pid']: return # owned by the creating process only
+    for _ in resources['workers']:
+        resources['task_queue'].put(None)
+    for worker in resources['workers']:
+        worker.join()
+    resources['workers'] = []
+    if resources['shm'] is not None:
+        resources['shm'].close()
+        resources['shm'].unlink()
+        resources['shm'] = None
+
+
+class WorkerPool:
+    '''
+    Long-lived pool of worker processes sharing a common state (e.g., the surrogate problem of the current iteration).
+    The state is serialized once per update into shared memory, where large numpy arrays are mapped by the workers without copying,
+    such that tasks are dispatched as lightweight messages instead of pickling the state for each task.
+    Falls back to serial computation when only one process is needed or when created from a daemon worker process.
+    '''
+    # interval (in seconds) of checking whether the worker processes are still alive while waiting for results
+    poll_interval = 1.0
+
+    def __init__(self, n_process):
+        '''
+        Initialize a worker pool, where worker processes are started lazily at the first map.
+
+        Parameters
+        ----------
+        n_process: int
+            Number of worker processes.
+        '''
+        self.n_process = n_process
+        self.state = None
+        self.version, self.shared_version = 0, None
+        self.header = None
+        self.resources = {'pid': os.getpid(), 'workers': [], 'task_queue': None, 'result_queue': None, 'shm': None}
+        self.finalizer = None
+
+    @property
+    def serial(self):
+        return self.n_process <= 1 or current_process().daemon
+
+    def _start(self):
+        '''
+        Start the worker processes, where each worker uses its share of CPU threads.
+        '''
+        # workers share the resource tracker of this process (also when restarted), such that attaching to the shared memory
+        # registers the block only once and it is unregistered once when unlinked by this process
+        resource_tracker.ensure_running()
+
+        task_queue, result_queue = Queue(), Queue()
+        n_thread = max(1, cpu_count() // self.n_process)
+        for _ in range(self.n_process):
+            worker = Process(target=_worker_loop, args=(task_queue, result_queue, n_thread), daemon=True)
+            worker.start()
+            self.resources['workers'].append(worker)
+        self.resources.update(task_queue=task_queue, result_queue=result_queue)
+
+        # released when the pool is garbage collected or at exit
+        if self.finalizer is None:
+            self.finalizer = weakref.finalize(self, _shutdown, self.resources)
+
+    def set_state(self, state):
+        '''
+        Set the state shared by all tasks until the next update.
+
+        Parameters
+        ----------
+        state: object
+            The shared state (picklable by dill).
+        '''
+        self.state = state
+        self.version += 1
+
+    def _share_state(self):
+        '''
+        Serialize the current state into a new shared memory block and release the previous one.
+        '''
+        shm, self.header = _dump_shared_state(self.state)
+        if self.resources['shm'] is not None:
+            self.resources['shm'].close()
+            self.resources['shm'].unlink()
+        self.resources['shm'] = shm
+        self.shared_version = self.version
+
+    def map(self, func, args_list):
+        '''
+        Apply a function to a list of arguments in the worker processes, with the shared state as the first argument.
+
+        Parameters
+        ----------
+        func: function
+            Function to apply, in the form of func(state, *args) (should be picklable).
+            Large arrays in the state are read-only in the worker processes.
+        args_list: list
+            List of argument tuples to apply the function to.
+
+        Returns
+        -------
+        list
+            Results of the function calls, in the order of args_list.
+        '''
+        if self.serial or len(args_list) <= 1:
+            return [func(self.state, *args) for args in args_list]
+
+        if not self.resources['workers']:
+            self._start()
+        if self.shared_version != self.version:
+            self._share_state()
+
+        name = self.resources['shm'].name
+        for index, args in enumerate(args_list):
+            self.resources['task_queue'].put((self.version, name, self.header, func, index, args))
+
+        results = [None] * len(args_list)
+        errors = []
+        for _ in range(len(args_list)):
+            index, success, result = self._get_result()
+            if success:
+                results[index] = result
+            else:
+                errors.append(result)
+        if errors:
+            raise RuntimeError(f'Task failed in worker process:\n{errors[0]}')
+        return results
+
+    def _get_result(self):
+        '''
+        Wait for the next result from the worker processes.
+        If a worker process dies (e.g., killed by the OS or crashed in native code), its task would never return,
+        so the workers are terminated to be restarted at the next map and an error is raised.
+        '''
+        while True:
+            try:
+                return self.resources['result_queue'].get(timeout=self.poll_interval)
+            except queue.Empty:
+                dead = [worker for worker in self.resources['workers'] if not worker.is_alive()]
+                if dead:
+                    exitcodes = [worker.exitcode for worker in dead]
+                    _terminate_workers(self.resources)
+                    raise RuntimeError(f'Worker process died unexpectedly (exit codes {exitcodes}), the worker pool is restarted at the next map')
+
+    def close(self):
+        '''
+        Stop the worker processes and release the shared memory.
+        '''
+        if self.finalizer is not None:
+            self.finalizer()
+            self.finalizer = None
+
+    def __deepcopy__(self, memo):
+        # the pool is a handle of processes rather than a value, which is shared by copies of its owner (e.g., algorithms copied by pymoo)
+        return self
+
+    def __getstate__(self):
+        # worker processes and shared memory are owned by the creating process only
+        return {'n_process': self.n_process}
+
+    def __setstate__(self, state):
+        self.__init__(state['n_process'])
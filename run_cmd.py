@@ -1,4 +1,5 @@
 import numpy as np
+from time import time
 
 from autooed.problem import build_problem
 from autooed.mobo import build_algorithm
@@ -9,6 +10,18 @@ from autooed.utils.plot import plot_performance_space, plot_performance_metric
 from arguments import get_args
 
 
+def evaluate(problem, X):
+    '''
+    Evaluate designs and measure the evaluation duration (wall time in seconds) of each design.
+    '''
+    Y, C = [], []
+    for x in X:
+        start_time = time()
+        Y.append(problem.evaluate_objective(x))
+        C.append(time() - start_time)
+    return np.array(Y), np.array(C)
+
+
 if __name__ == '__main__':
 
     # load arguments
@@ -27,20 +40,21 @@ if __name__ == '__main__':
 
     # generate initial random samples
     X = generate_random_initial_samples(problem, args.n_init_sample)
-    Y = np.array([problem.evaluate_objective(x) for x in X])
+    Y, C = evaluate(problem, X)
 
     # optimization
     while len(X) < args.n_total_sample:
 
         # propose design samples
-        X_next = algorithm.optimize(X, Y, None, args.batch_size)
+        X_next = algorithm.optimize(X, Y, None, args.batch_size, C)
 
         # evaluate proposed samples
-        Y_next = np.array([problem.evaluate_objective(x) for x in X_next])
+        Y_next, C_next = evaluate(problem, X_next)
 
         # combine into dataset
         X = np.vstack([X, X_next])
         Y = np.vstack([Y, Y_next])
+        C = np.concatenate([C, C_next])
 
         print(f'{len(X)}/{args.n_total_sample} complete')
 
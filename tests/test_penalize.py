@@ -0,0 +1,51 @@
+'''
+Finite-difference checks of the derivatives of penalized acquisition functions.
+'''
+
+import numpy as np
+import pytest
+
+from autooed.problem import build_problem
+from autooed.mobo.surrogate_model import GaussianProcess
+from autooed.mobo.acquisition import ExpectedImprovement, LocalPenalization, HardLocalPenalization
+
+
+def finite_difference(func, X, eps=1e-6):
+    '''
+    Central finite difference of func (N, n_var) -> (N, ...) w.r.t. each variable, shape (N, ..., n_var).
+    '''
+    dF = []
+    for i in range(X.shape[1]):
+        dX = np.zeros_like(X)
+        dX[:, i] = eps
+        dF.append((func(X + dX) - func(X - dX)) / (2 * eps))
+    return np.stack(dF, axis=-1)
+
+
+@pytest.mark.parametrize('penalized_acq', [LocalPenalization, HardLocalPenalization])
+def test_penalized_derivatives(penalized_acq):
+    np.random.seed(0)
+
+    # bounds of VLMOP2 are [-2, 2], such that continuous and normalized derivatives differ
+    problem = build_problem('VLMOP2')
+    X = np.random.uniform(problem.xl, problem.xu, size=(20, problem.n_var))
+    Y = np.array([problem.evaluate_objective(x) for x in X])
+
+    surrogate_model = GaussianProcess(problem, n_process=1)
+    surrogate_model.fit(X, Y)
+    acquisition = penalized_acq(ExpectedImprovement(surrogate_model))
+    X_busy = np.random.uniform(problem.xl, problem.xu, size=(2, problem.n_var))
+    acquisition.fit(X, Y, X_busy=X_busy)
+
+    # query points near the busy points, where the penalty is significant
+    X_query = np.repeat(X_busy, 3, axis=0) + np.random.normal(scale=0.3, size=(6, problem.n_var))
+    X_query = np.clip(X_query, problem.xl + 0.1, problem.xu - 0.1) # away from the bounds for finite difference
+
+    # derivatives of acquisition functions are w.r.t. normalized design variables
+    normalization = surrogate_model.normalization
+    F, dF, hF = acquisition.evaluate(X_query, dtype='continuous', gradient=True, hessian=True)
+    dF_fd = finite_difference(lambda X: acquisition.evaluate(normalization.undo(x=X), dtype='continuous')[0], normalization.do(x=X_query))
+    hF_fd = finite_difference(lambda X: acquisition.evaluate(normalization.undo(x=X), dtype='continuous', gradient=True)[1], normalization.do(x=X_query))
+
+    assert np.allclose(dF, dF_fd, rtol=1e-3, atol=1e-6)
+    assert np.allclose(hF, hF_fd, rtol=1e-3, atol=1e-5)
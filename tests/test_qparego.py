@@ -0,0 +1,44 @@
+'''
+Finite-difference checks of the derivatives of qParEGO on exact and sparse Gaussian process posteriors.
+'''
+
+import numpy as np
+import pytest
+
+from autooed.problem import build_problem
+from autooed.mobo.surrogate_model import GaussianProcess, SparseGaussianProcess
+from autooed.mobo.acquisition import qParEGO
+from test_penalize import finite_difference
+
+
+@pytest.mark.parametrize('surrogate_model_cls, kwargs', [
+    (GaussianProcess, {}),
+    (SparseGaussianProcess, {'n_inducing': 20}), # sparse posterior with more training data than inducing points
+])
+def test_qparego_derivatives(surrogate_model_cls, kwargs):
+    np.random.seed(0)
+
+    problem = build_problem('VLMOP2')
+    X = np.random.uniform(problem.xl, problem.xu, size=(200, problem.n_var))
+    Y = np.array([problem.evaluate_objective(x) for x in X])
+
+    surrogate_model = surrogate_model_cls(problem, n_process=1, **kwargs)
+    surrogate_model.fit(X, Y)
+    acquisition = qParEGO(surrogate_model)
+    acquisition.fit(X, Y)
+    q = 2
+    acquisition.set_batch_size(q)
+
+    X_query = np.random.uniform(np.tile(problem.xl, q) + 0.1, np.tile(problem.xu, q) - 0.1, size=(5, q * problem.n_var))
+    F, dF, hF = acquisition.evaluate(X_query, dtype='continuous', gradient=True, hessian=True)
+
+    # derivatives are w.r.t. normalized design variables
+    normalization = surrogate_model.normalization
+    undo = lambda X: normalization.undo(x=X.reshape(-1, problem.n_var)).reshape(len(X), -1)
+    X_norm = normalization.do(x=X_query.reshape(-1, problem.n_var)).reshape(len(X_query), -1)
+    F_undo = lambda X: acquisition._evaluate(undo(X), False, False)[0]
+    dF_undo = lambda X: acquisition._evaluate(undo(X), True, False)[1]
+
+    assert np.allclose(F, F_undo(X_norm))
+    assert np.allclose(dF, finite_difference(F_undo, X_norm), rtol=1e-3, atol=1e-6)
+    assert np.allclose(hF, finite_difference(dF_undo, X_norm), rtol=1e-3, atol=1e-5)